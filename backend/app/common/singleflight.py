@@ -0,0 +1,43 @@
+"""
+Keyed single-flight for async fetches.
+
+Concurrent callers asking for the same key share one in-flight task instead of
+each starting its own GEE computation or HTTP call. The key is forgotten as
+soon as the task finishes, so this coalesces duplicate work but never caches
+results. Shared by Kharda + Solar backends.
+"""
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one task."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Await `func(*args, **kwargs)`, or the call already running under `key`.
+        A caller being cancelled does not cancel the shared task.
+        """
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._forget, key))
+        else:
+            print(f"[INFO] {self.name}: joining in-flight request {key}")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved when every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,262 @@
+"""
+Block-level grouping of Kharda panels for coarse GEE reductions.
+
+Panels are clustered once (k-means on projected centroids, ~PANEL_BLOCK_SIZE
+panels per block) and each block's geometry is the union of its member panel
+polygons, so a block mean only covers panel pixels. Blocks are persisted to
+asset/solar_panel_blocks.geojson together with a hash of the panel file and
+rebuilt only when the panels change.
+
+Reduction levels:
+    panel - one feature per panel (default, unchanged behaviour)
+    block - one feature per block
+    farm  - a single feature covering every panel
+"""
+import os
+import json
+import math
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Dict, List, Any
+
+import ee
+import numpy as np
+from shapely.geometry import shape, mapping
+from shapely.ops import unary_union
+
+from app.kharda.panels import PROJECT_ROOT, PanelRegistry, get_panel_registry
+
+BLOCKS_PATH = PROJECT_ROOT / "asset" / "solar_panel_blocks.geojson"
+PANEL_BLOCK_SIZE = int(os.getenv("PANEL_BLOCK_SIZE", 32))
+KMEANS_ITERATIONS = 50
+
+LEVEL_PANEL = 'panel'
+LEVEL_BLOCK = 'block'
+LEVEL_FARM = 'farm'
+REDUCTION_LEVELS = (LEVEL_PANEL, LEVEL_BLOCK, LEVEL_FARM)
+FARM_UNIT_ID = 'farm'
+
+
+def _file_digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _kmeans(points: np.ndarray, k: int) -> np.ndarray:
+    """Deterministic k-means; returns the cluster label of each point."""
+    # Seed with evenly spaced points along a north-to-south, west-to-east sweep
+    order = np.lexsort((points[:, 0], -points[:, 1]))
+    seeds = order[np.linspace(0, len(points) - 1, k).astype(int)]
+    centers = points[seeds].copy()
+    labels = np.zeros(len(points), dtype=int)
+    for iteration in range(KMEANS_ITERATIONS):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(k):
+            members = points[labels == cluster]
+            if len(members):
+                centers[cluster] = members.mean(axis=0)
+    return labels
+
+
+def build_panel_blocks(registry: PanelRegistry, block_size: int = PANEL_BLOCK_SIZE) -> Dict[str, Any]:
+    """Cluster the registry's polygon panels into blocks and return a FeatureCollection."""
+    records = [
+        r for r in registry.records()
+        if r.valid and r.centroid is not None
+        and (r.geometry or {}).get('type') in ('Polygon', 'MultiPolygon')
+    ]
+    if not records:
+        return {'type': 'FeatureCollection', 'features': []}
+
+    lat0 = sum(r.centroid[1] for r in records) / len(records)
+    lon_scale = math.cos(math.radians(lat0))
+    points = np.array([[r.centroid[0] * lon_scale, r.centroid[1]] for r in records])
+    k = max(1, math.ceil(len(records) / max(1, block_size)))
+    labels = _kmeans(points, k)
+
+    clusters: Dict[int, List] = {}
+    for record, label in zip(records, labels):
+        clusters.setdefault(int(label), []).append(record)
+
+    # Name blocks in reading order (north to south, then west to east)
+    def cluster_key(members):
+        lat = sum(m.centroid[1] for m in members) / len(members)
+        lon = sum(m.centroid[0] for m in members) / len(members)
+        return (-round(lat, 5), lon)
+
+    features = []
+    for index, members in enumerate(sorted(clusters.values(), key=cluster_key), start=1):
+        block_id = f"B{index:03d}"
+        geometry = unary_union([shape(m.geometry) for m in members])
+        features.append({
+            'type': 'Feature',
+            'id': block_id,
+            'geometry': mapping(geometry),
+            'properties': {
+                'block_id': block_id,
+                'panel_ids': sorted(m.panel_id for m in members),
+                'panel_count': len(members),
+            },
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+class PanelBlocks:
+    """Persisted panel-to-block grouping with cached EE feature collections."""
+
+    def __init__(self, registry: PanelRegistry, path: Path = BLOCKS_PATH):
+        self.registry = registry
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._version = None
+        self._geojson: Dict[str, Any] = {}
+        self._panel_to_block: Dict[int, str] = {}
+        self._members: Dict[str, List[int]] = {}
+        self._block_fc = None
+        self._farm_fc = None
+
+    def _load_or_build(self) -> Dict[str, Any]:
+        source_hash = _file_digest(self.registry.path)
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    stored = json.load(f)
+                if stored.get('source_hash') == source_hash and stored.get('block_size') == PANEL_BLOCK_SIZE:
+                    return stored
+            except Exception as e:
+                print(f"[WARN] Could not read panel blocks from {self.path}: {e}")
+
+        geojson = build_panel_blocks(self.registry)
+        geojson['source_hash'] = source_hash
+        geojson['block_size'] = PANEL_BLOCK_SIZE
+        try:
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(geojson, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            print(f"[INFO] Persisted {len(geojson['features'])} panel blocks to {self.path}")
+        except OSError as e:
+            print(f"[WARN] Could not persist panel blocks: {e}")
+        return geojson
+
+    def _ensure_loaded(self):
+        version = self.registry.version
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            geojson = self._load_or_build()
+            panel_to_block = {}
+            members = {}
+            for feature in geojson.get('features', []):
+                props = feature.get('properties', {})
+                block_id = props.get('block_id')
+                members[block_id] = list(props.get('panel_ids', []))
+                for panel_id in members[block_id]:
+                    panel_to_block[panel_id] = block_id
+            self._geojson = geojson
+            self._panel_to_block = panel_to_block
+            self._members = members
+            self._block_fc = None
+            self._farm_fc = None
+            self._version = version
+
+    @property
+    def geojson(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return self._geojson
+
+    def block_for_panel(self, panel_id) -> Optional[str]:
+        self._ensure_loaded()
+        return self._panel_to_block.get(panel_id)
+
+    def members(self) -> Dict[str, List[int]]:
+        self._ensure_loaded()
+        return dict(self._members)
+
+    def feature_collection(self, level: str):
+        """
+        Return (ee.FeatureCollection, unit_ids) for a reduction level.
+
+        The snapshot aggregators key their results by the `panel_id` property,
+        so block and farm features carry their unit id in that property.
+        """
+        if level == LEVEL_PANEL:
+            return self.registry.feature_collection()
+        self._ensure_loaded()
+        with self._lock:
+            if self._block_fc is None:
+                features = [
+                    ee.Feature(ee.Geometry(f['geometry']), {'panel_id': f['properties']['block_id']})
+                    for f in self._geojson.get('features', [])
+                ]
+                self._block_fc = (ee.FeatureCollection(features), list(self._members.keys())) if features else (None, [])
+            if level == LEVEL_BLOCK:
+                return self._block_fc
+
+            if self._farm_fc is None:
+                block_fc, _ = self._block_fc
+                if block_fc is None:
+                    self._farm_fc = (None, [])
+                else:
+                    farm_feature = ee.Feature(block_fc.geometry(), {'panel_id': FARM_UNIT_ID})
+                    self._farm_fc = (ee.FeatureCollection([farm_feature]), [FARM_UNIT_ID])
+            return self._farm_fc
+
+    def unit_geometry(self, level: str, unit_id):
+        """ee.Geometry of a single panel, block or the whole farm."""
+        if level == LEVEL_PANEL:
+            record = self.registry.get(unit_id)
+            if record is None:
+                raise KeyError(f"Panel {unit_id} not found in polygons")
+            return record.ee_geometry
+        if level == LEVEL_FARM:
+            farm_fc, _ = self.feature_collection(LEVEL_FARM)
+            if farm_fc is None:
+                raise KeyError("No panel blocks available")
+            return farm_fc.geometry()
+        self._ensure_loaded()
+        for feature in self._geojson.get('features', []):
+            if feature['properties']['block_id'] == unit_id:
+                return ee.Geometry(feature['geometry'])
+        raise KeyError(f"Block {unit_id} not found")
+
+    def units_for_panels(self, level: str, panel_ids: List[int]) -> Dict[Any, List[int]]:
+        """Map requested panels onto the units of `level`, preserving request order."""
+        if level == LEVEL_PANEL:
+            return {panel_id: [panel_id] for panel_id in panel_ids}
+        if level == LEVEL_FARM:
+            return {FARM_UNIT_ID: list(self.registry.panel_ids())}
+        self._ensure_loaded()
+        if not panel_ids:
+            return self.members()
+        units: Dict[Any, List[int]] = {}
+        for panel_id in panel_ids:
+            block_id = self._panel_to_block.get(panel_id)
+            if block_id is not None:
+                units.setdefault(block_id, self._members[block_id])
+        return units
+
+
+_blocks: Optional[PanelBlocks] = None
+_blocks_lock = threading.Lock()
+
+
+def get_panel_blocks() -> PanelBlocks:
+    """Return the process-wide panel block grouping."""
+    global _blocks
+    if _blocks is None:
+        with _blocks_lock:
+            if _blocks is None:
+                _blocks = PanelBlocks(get_panel_registry())
+    return _blocks
@@ -3,9 +3,11 @@ SQLite database module for storing historical panel data.
 """
 import sqlite3
 import os
+import threading
+from itertools import islice
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta, date as date_type
+from typing import Optional, List, Dict, Any, Tuple, Iterable
 from contextlib import contextmanager
 
 # DB is in the backend root, which is 3 levels up from here (app/kharda/database.py)
@@ -16,27 +18,593 @@ DB_PATH = BASE_DIR / "solar_farm_data.db"
 TIMESERIES_PARAMETERS = ['LST', 'SWIR', 'NDVI', 'NDWI', 'VISIBLE']
 # Parameters with special structure
 SPECIAL_PARAMETERS = ['SOILING']
+# Stay under SQLite's default bound-parameter limit for IN (...) queries
+MAX_QUERY_PARAMETERS = 900
+# Rows per transaction for the bulk upserts
+WRITE_CHUNK_SIZE = int(os.getenv("DB_WRITE_CHUNK_SIZE", 5000))
+
+# Connection tuning (see apply_pragmas)
+SQLITE_BUSY_TIMEOUT_S = float(os.getenv("SQLITE_BUSY_TIMEOUT_S", 10))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", 256))
+
+# Retention: whole years of raw time series that ended more than this many
+# days ago are compacted into weekly aggregates by compact_timeseries()
+TIMESERIES_RAW_RETENTION_DAYS = int(os.getenv("TIMESERIES_RAW_RETENTION_DAYS", 730))
+WEEKLY_TABLE = 'timeseries_weekly'
+
+
+def apply_pragmas(conn: sqlite3.Connection):
+    """
+    WAL lets API readers run alongside the migration/ingest writer;
+    synchronous=NORMAL is durable across app crashes in WAL mode and skips an
+    fsync per commit. mmap and a larger page cache keep hot time-series pages
+    in memory, and temp b-trees (ORDER BY / GROUP BY) stay off disk.
+    Incremental auto-vacuum (only takes effect on new files, before WAL is
+    enabled) lets dropped partitions be released without rewriting the file.
+    """
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size={-SQLITE_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
 
 
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(str(DB_PATH))
+    """Get a new, tuned database connection (caller closes it)."""
+    conn = sqlite3.connect(
+        str(DB_PATH),
+        timeout=SQLITE_BUSY_TIMEOUT_S,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        # Pooled connections are only used by their owning thread, but are
+        # closed from the shutdown hook
+        check_same_thread=False,
+    )
     conn.row_factory = sqlite3.Row  # Enable column access by name
+    apply_pragmas(conn)
     return conn
 
 
+_local = threading.local()
+# (db path, parameter name) -> (parameter_id, unit)
+_parameter_cache: Dict[Tuple[str, str], Tuple[int, str]] = {}
+# (db path, year) -> raw partition table, or None once compacted
+_partition_cache: Dict[Tuple[str, int], Optional[str]] = {}
+_pool: Dict[int, sqlite3.Connection] = {}
+_pool_lock = threading.Lock()
+
+
+def _close_quietly(conn: sqlite3.Connection):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _thread_connection() -> sqlite3.Connection:
+    """The calling thread's persistent connection, opened on first use."""
+    conn = getattr(_local, 'conn', None)
+    # Not in the pool any more if close_db_connections() ran on another thread
+    if conn is not None and _local.path == str(DB_PATH) and _pool.get(threading.get_ident()) is conn:
+        return conn
+    if conn is not None:
+        _close_quietly(conn)
+
+    conn = get_db_connection()
+    _local.conn = conn
+    _local.path = str(DB_PATH)
+    _local.depth = 0
+    with _pool_lock:
+        # Drop connections owned by threads that have exited
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in _pool if i not in alive]:
+            _close_quietly(_pool.pop(ident))
+        _pool[threading.get_ident()] = conn
+    return conn
+
+
+def close_db_connections():
+    """Close every pooled connection (call on shutdown)."""
+    with _pool_lock:
+        for conn in _pool.values():
+            _close_quietly(conn)
+        _pool.clear()
+    _local.conn = None
+
+
 @contextmanager
 def get_db():
-    """Context manager for database connections."""
-    conn = get_db_connection()
+    """
+    Context manager yielding the calling thread's pooled connection. The
+    outermost block commits on success and rolls back on error; nested
+    blocks share its transaction.
+    """
+    conn = _thread_connection()
+    outermost = _local.depth == 0
+    _local.depth += 1
     try:
         yield conn
-        conn.commit()
+        if outermost:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if outermost:
+            conn.rollback()
+            # A rolled-back transaction may have registered parameters or partitions
+            _parameter_cache.clear()
+            _partition_cache.clear()
         raise
     finally:
-        conn.close()
+        _local.depth -= 1
+
+
+# Time-series days are stored as integer days since 1970-01-01
+EPOCH_ORDINAL = date_type(1970, 1, 1).toordinal()
+# julianday('1970-01-01'), for converting legacy TEXT dates inside SQLite
+EPOCH_JULIANDAY = 2440587.5
+
+
+def date_to_day(value: str) -> int:
+    """'YYYY-MM-DD' (a longer ISO timestamp is truncated) -> days since epoch."""
+    return date_type.fromisoformat(value[:10]).toordinal() - EPOCH_ORDINAL
+
+
+def day_to_date(day: int) -> str:
+    """Days since epoch -> 'YYYY-MM-DD'."""
+    return date_type.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+def _table_type(cursor, name: str) -> Optional[str]:
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _day_year(day: int) -> int:
+    return date_type.fromordinal(day + EPOCH_ORDINAL).year
+
+
+def partition_days(year: int) -> Tuple[int, int]:
+    """Inclusive (first_day, last_day) epoch days of a yearly partition."""
+    return (
+        date_type(year, 1, 1).toordinal() - EPOCH_ORDINAL,
+        date_type(year, 12, 31).toordinal() - EPOCH_ORDINAL,
+    )
+
+
+def partition_name(year: int) -> str:
+    return f"timeseries_{int(year)}"
+
+
+def list_partitions(conn) -> List[Tuple[int, bool]]:
+    """(year, compacted) of every time-series partition, oldest first."""
+    rows = conn.execute("SELECT year, compacted FROM timeseries_partitions ORDER BY year").fetchall()
+    return [(row[0], bool(row[1])) for row in rows]
+
+
+def _create_timeseries_schema(cursor):
+    """
+    Compact time-series layout: one parameter row holds the name and unit,
+    and values are clustered by (parameter, panel, day) in WITHOUT ROWID
+    tables, so a panel's range scan reads adjacent pages and the primary key
+    is the only copy of the row.
+
+    Rows are partitioned by calendar year into timeseries_<year> tables
+    (created on first write, see _ensure_partition). Reads are routed to the
+    partitions their range overlaps; `timeseries` is a UNION ALL view over
+    the raw partitions for ad-hoc SQL and whole-history scans. Years compacted
+    by the retention policy keep weekly aggregates in timeseries_weekly
+    instead. `panel_timeseries` is a read-only view with the original columns.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS parameters (
+            parameter_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            unit TEXT NOT NULL DEFAULT ''
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS timeseries_partitions (
+            year INTEGER PRIMARY KEY,
+            compacted INTEGER NOT NULL DEFAULT 0,
+            compacted_at TEXT
+        )
+    """)
+    # week_day is the Monday starting the week, clipped to the partition's
+    # first day so a bucket never spans two years
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WEEKLY_TABLE} (
+            parameter_id INTEGER NOT NULL,
+            panel_id INTEGER NOT NULL,
+            week_day INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            sum REAL NOT NULL,
+            sum_sq REAL NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            PRIMARY KEY (parameter_id, panel_id, week_day)
+        ) WITHOUT ROWID
+    """)
+    if _table_type(cursor, 'timeseries') is None:
+        _rebuild_timeseries_view(cursor)
+    cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS panel_timeseries AS
+        SELECT t.panel_id AS panel_id,
+               p.name AS parameter,
+               date(t.day + {EPOCH_JULIANDAY}) AS date,
+               t.value AS value,
+               p.unit AS unit
+        FROM timeseries t
+        JOIN parameters p ON p.parameter_id = t.parameter_id
+    """)
+
+
+def _rebuild_timeseries_view(cursor):
+    """Point the `timeseries` view at the current raw partitions."""
+    years = [row[0] for row in cursor.execute(
+        "SELECT year FROM timeseries_partitions WHERE compacted = 0 ORDER BY year"
+    ).fetchall()]
+    if years:
+        body = "\nUNION ALL\n".join(
+            f"SELECT parameter_id, panel_id, day, value FROM {partition_name(year)}" for year in years
+        )
+    else:
+        body = "SELECT NULL AS parameter_id, NULL AS panel_id, NULL AS day, NULL AS value WHERE 0"
+    cursor.execute("DROP VIEW IF EXISTS timeseries")
+    cursor.execute(f"CREATE VIEW timeseries AS {body}")
+
+
+def _ensure_partition(cursor, year: int, triggers: bool = True) -> Optional[str]:
+    """
+    Name of the raw partition for `year`, created (with its rollup triggers
+    unless `triggers` is False) on first use; None once the year has been
+    compacted.
+    """
+    key = (str(DB_PATH), year)
+    if key in _partition_cache:
+        return _partition_cache[key]
+
+    table = partition_name(year)
+    row = cursor.execute("SELECT compacted FROM timeseries_partitions WHERE year = ?", (year,)).fetchone()
+    if row is not None and row[0]:
+        table = None
+    elif row is None:
+        first_day, last_day = partition_days(year)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                parameter_id INTEGER NOT NULL,
+                panel_id INTEGER NOT NULL,
+                day INTEGER NOT NULL CHECK (day BETWEEN {first_day} AND {last_day}),
+                value REAL NOT NULL,
+                PRIMARY KEY (parameter_id, panel_id, day)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("INSERT INTO timeseries_partitions (year) VALUES (?)", (year,))
+        _rebuild_timeseries_view(cursor)
+
+    if table is not None and triggers:
+        _create_partition_triggers(cursor, table)
+    if table is None or triggers:
+        _partition_cache[key] = table
+    return table
+
+
+def _copy_into_partitions(cursor, source_sql: str) -> int:
+    """Copy (parameter_id, panel_id, day, value) rows selected by `source_sql` into the yearly partitions."""
+    first_day, last_day = cursor.execute(f"SELECT MIN(day), MAX(day) FROM ({source_sql})").fetchone()
+    if first_day is None:
+        return 0
+    copied = 0
+    for year in range(_day_year(first_day), _day_year(last_day) + 1):
+        table = _ensure_partition(cursor, year, triggers=False)
+        # Rows are inserted in primary-key order so each b-tree is built sequentially
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO {table} (parameter_id, panel_id, day, value)
+            SELECT parameter_id, panel_id, day, value FROM ({source_sql})
+            WHERE day BETWEEN ? AND ?
+            ORDER BY parameter_id, panel_id, day
+        """, partition_days(year))
+        copied += cursor.rowcount
+    return copied
+
+
+def migrate_timeseries_schema(cursor) -> int:
+    """
+    Move rows from the legacy panel_timeseries table (TEXT parameter/date/unit
+    per row, autoincrement id, secondary index) or from an unpartitioned
+    `timeseries` table into the yearly partitions, in place and in the
+    caller's transaction. Returns the number of rows moved; 0 if the database
+    already uses the partitioned layout.
+    """
+    legacy = _table_type(cursor, 'panel_timeseries') == 'table'
+    unpartitioned = _table_type(cursor, 'timeseries') == 'table'
+    if not legacy and not unpartitioned:
+        _create_timeseries_schema(cursor)
+        return 0
+
+    print("[INFO] Migrating time series to yearly WITHOUT ROWID partitions...")
+    if legacy:
+        cursor.execute("ALTER TABLE panel_timeseries RENAME TO panel_timeseries_legacy")
+    else:
+        # The compatibility view is recreated over the partitioned layout
+        cursor.execute("DROP VIEW IF EXISTS panel_timeseries")
+    if unpartitioned:
+        cursor.execute("ALTER TABLE timeseries RENAME TO timeseries_unpartitioned")
+    _partition_cache.clear()
+    _create_timeseries_schema(cursor)
+
+    moved = 0
+    if legacy:
+        cursor.execute("""
+            INSERT OR IGNORE INTO parameters (name, unit)
+            SELECT parameter, MAX(unit) FROM panel_timeseries_legacy
+            GROUP BY parameter ORDER BY parameter
+        """)
+        moved += _copy_into_partitions(cursor, f"""
+            SELECT p.parameter_id AS parameter_id, l.panel_id AS panel_id,
+                   CAST(julianday(substr(l.date, 1, 10)) - {EPOCH_JULIANDAY} AS INTEGER) AS day,
+                   l.value AS value
+            FROM panel_timeseries_legacy l
+            JOIN parameters p ON p.name = l.parameter
+        """)
+        cursor.execute("DROP TABLE panel_timeseries_legacy")
+    if unpartitioned:
+        moved += _copy_into_partitions(cursor, "SELECT parameter_id, panel_id, day, value FROM timeseries_unpartitioned")
+        cursor.execute("DROP TABLE timeseries_unpartitioned")
+    _parameter_cache.clear()
+    print(f"[INFO] Migrated {moved} time-series rows")
+    return moved
+
+
+# SQL for the calendar month (YYYYMM) of an integer `day` expression
+def _month_sql(day_expr: str) -> str:
+    return f"CAST(strftime('%Y%m', {day_expr} + {EPOCH_JULIANDAY}) AS INTEGER)"
+
+
+def _month_days_sql(day_expr: str) -> str:
+    """SQL `BETWEEN a AND b` bounds (inclusive days) of the month containing `day_expr`."""
+    start = f"CAST(julianday({day_expr} + {EPOCH_JULIANDAY}, 'start of month') - {EPOCH_JULIANDAY} AS INTEGER)"
+    end = f"CAST(julianday({day_expr} + {EPOCH_JULIANDAY}, 'start of month', '+1 month') - {EPOCH_JULIANDAY} AS INTEGER) - 1"
+    return f"{start} AND {end}"
+
+
+# Rollup tables: name -> (key columns, key expressions over a timeseries row,
+# filter selecting the raw rows of the same key)
+ROLLUPS = {
+    'panel_monthly_rollup': (
+        ('parameter_id', 'panel_id', 'month'),
+        ('{r}parameter_id', '{r}panel_id', _month_sql('{r}day')),
+        "parameter_id = {r}parameter_id AND panel_id = {r}panel_id AND day BETWEEN " + _month_days_sql('{r}day'),
+    ),
+    'farm_daily_rollup': (
+        ('parameter_id', 'day'),
+        ('{r}parameter_id', '{r}day'),
+        "parameter_id = {r}parameter_id AND day = {r}day",
+    ),
+    'farm_monthly_rollup': (
+        ('parameter_id', 'month'),
+        ('{r}parameter_id', _month_sql('{r}day')),
+        "parameter_id = {r}parameter_id AND day BETWEEN " + _month_days_sql('{r}day'),
+    ),
+}
+
+
+def _create_rollup_schema(cursor):
+    """
+    count / sum / sum of squares / min / max per (parameter, panel, month)
+    and per (parameter, day|month) for the whole farm. Triggers on every
+    raw partition keep them current inside the writing transaction, so the
+    rollups never disagree with the raw rows. Raw deletes (retention) are
+    deliberately not subtracted; the rollups keep the full history.
+    Tables created here for the first time are filled from existing rows.
+    """
+    created = []
+    for name, (columns, _, _) in ROLLUPS.items():
+        if _table_type(cursor, name) is None:
+            created.append(name)
+        key_columns = ', '.join(f"{column} INTEGER NOT NULL" for column in columns)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                {key_columns},
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sum_sq REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                PRIMARY KEY ({', '.join(columns)})
+            ) WITHOUT ROWID
+        """)
+
+    for year, compacted in list_partitions(cursor):
+        if not compacted:
+            _create_partition_triggers(cursor, partition_name(year))
+    for name in created:
+        rebuild_rollup(cursor, name)
+
+
+def _create_partition_triggers(cursor, table: str):
+    """Rollup and statistics maintenance triggers on one raw partition."""
+    # Upserts that update an existing row fire UPDATE triggers, not this one
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_stats_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO timeseries_stats (parameter_id, row_count, min_day, max_day)
+            VALUES (NEW.parameter_id, 1, NEW.day, NEW.day)
+            ON CONFLICT (parameter_id) DO UPDATE SET
+                row_count = row_count + 1,
+                min_day = MIN(min_day, excluded.min_day),
+                max_day = MAX(max_day, excluded.max_day);
+            INSERT OR IGNORE INTO stats_panels (dataset, panel_id) VALUES ('timeseries', NEW.panel_id);
+        END
+    """)
+
+    for name, (columns, key_exprs, raw_filter) in ROLLUPS.items():
+        new_keys = ', '.join(expr.format(r='NEW.') for expr in key_exprs)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_{name}_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {name} ({', '.join(columns)}, count, sum, sum_sq, min, max)
+                VALUES ({new_keys}, 1, NEW.value, NEW.value * NEW.value, NEW.value, NEW.value)
+                ON CONFLICT ({', '.join(columns)}) DO UPDATE SET
+                    count = count + 1,
+                    sum = sum + excluded.sum,
+                    sum_sq = sum_sq + excluded.sum_sq,
+                    min = MIN(min, excluded.min),
+                    max = MAX(max, excluded.max);
+            END
+        """)
+
+        # An extremum that is replaced by a less extreme value is recomputed
+        # from the raw rows; a day or month never spans two partitions
+        match = ' AND '.join(f"{column} = {expr.format(r='NEW.')}" for column, expr in zip(columns, key_exprs))
+        raw = raw_filter.format(r='NEW.')
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_{name}_update AFTER UPDATE OF value ON {table}
+            WHEN OLD.value IS NOT NEW.value
+            BEGIN
+                UPDATE {name} SET
+                    sum = sum + NEW.value - OLD.value,
+                    sum_sq = sum_sq + NEW.value * NEW.value - OLD.value * OLD.value,
+                    min = CASE
+                        WHEN NEW.value <= min THEN NEW.value
+                        WHEN OLD.value > min THEN min
+                        ELSE (SELECT MIN(value) FROM {table} WHERE {raw})
+                    END,
+                    max = CASE
+                        WHEN NEW.value >= max THEN NEW.value
+                        WHEN OLD.value < max THEN max
+                        ELSE (SELECT MAX(value) FROM {table} WHERE {raw})
+                    END
+                WHERE {match};
+            END
+        """)
+
+
+def rebuild_rollup(cursor, name: str):
+    """
+    Recompute one rollup table from the raw time-series rows. Years already
+    compacted into weekly aggregates are no longer included.
+    """
+    columns, key_exprs, _ = ROLLUPS[name]
+    raw_keys = ', '.join(expr.format(r='') for expr in key_exprs)
+    cursor.execute(f"DELETE FROM {name}")
+    cursor.execute(f"""
+        INSERT INTO {name} ({', '.join(columns)}, count, sum, sum_sq, min, max)
+        SELECT {raw_keys}, COUNT(*), SUM(value), SUM(value * value), MIN(value), MAX(value)
+        FROM timeseries
+        GROUP BY {', '.join(str(i + 1) for i in range(len(columns)))}
+    """)
+
+
+# Counters kept by _create_stats_schema's triggers
+STATS_COUNTERS = ('soiling_rows', 'timeseries_panels', 'soiling_panels')
+
+
+def _create_stats_schema(cursor):
+    """
+    Materialized figures for get_data_statistics, kept current by triggers
+    in the writing transaction (see also _create_partition_triggers):
+
+        timeseries_stats  rows and first/last day per parameter
+        stats_panels      distinct panels per dataset ('timeseries', 'soiling')
+        stats_counters    soiling row count and the distinct panel counts
+
+    Panels and first/last days are not removed when a year is compacted,
+    since its weekly aggregates still cover them. Tables created here for the
+    first time are filled with a full recount.
+    """
+    created = _table_type(cursor, 'stats_counters') is None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS timeseries_stats (
+            parameter_id INTEGER PRIMARY KEY,
+            row_count INTEGER NOT NULL,
+            min_day INTEGER NOT NULL,
+            max_day INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_panels (
+            dataset TEXT NOT NULL,
+            panel_id INTEGER NOT NULL,
+            PRIMARY KEY (dataset, panel_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.executemany("INSERT OR IGNORE INTO stats_counters (name) VALUES (?)", [(n,) for n in STATS_COUNTERS])
+
+    # INSERT OR IGNORE of a known panel does not fire this
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS stats_panels_insert AFTER INSERT ON stats_panels
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = NEW.dataset || '_panels';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS panel_soiling_stats_insert AFTER INSERT ON panel_soiling
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'soiling_rows';
+            INSERT OR IGNORE INTO stats_panels (dataset, panel_id) VALUES ('soiling', NEW.panel_id);
+        END
+    """)
+
+    if created:
+        rebuild_statistics(cursor)
+
+
+def _recount_statistics(cursor) -> Tuple[List[tuple], Dict[str, int]]:
+    """
+    Full-table recount: ([(parameter_id, row_count, min_day, max_day)],
+    {counter: value}). Weekly aggregates contribute days and panels but no rows.
+    """
+    per_parameter = [tuple(row) for row in cursor.execute(f"""
+        SELECT parameter_id, SUM(n), MIN(day), MAX(day)
+        FROM (
+            SELECT parameter_id, 1 AS n, day FROM timeseries
+            UNION ALL
+            SELECT parameter_id, 0 AS n, week_day AS day FROM {WEEKLY_TABLE}
+        )
+        GROUP BY parameter_id
+    """).fetchall()]
+    counters = {
+        'soiling_rows': cursor.execute("SELECT COUNT(*) FROM panel_soiling").fetchone()[0],
+        'timeseries_panels': cursor.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT panel_id FROM timeseries
+                UNION
+                SELECT panel_id FROM {WEEKLY_TABLE}
+            )
+        """).fetchone()[0],
+        'soiling_panels': cursor.execute("SELECT COUNT(DISTINCT panel_id) FROM panel_soiling").fetchone()[0],
+    }
+    return per_parameter, counters
+
+
+def rebuild_statistics(cursor):
+    """Recompute the materialized statistics from the data tables."""
+    per_parameter, counters = _recount_statistics(cursor)
+    cursor.execute("DELETE FROM timeseries_stats")
+    cursor.executemany("""
+        INSERT INTO timeseries_stats (parameter_id, row_count, min_day, max_day)
+        VALUES (?, ?, ?, ?)
+    """, per_parameter)
+    cursor.execute("DELETE FROM stats_panels")
+    cursor.execute(f"""
+        INSERT INTO stats_panels (dataset, panel_id)
+        SELECT 'timeseries', panel_id FROM timeseries
+        UNION
+        SELECT 'timeseries', panel_id FROM {WEEKLY_TABLE}
+        UNION
+        SELECT 'soiling', panel_id FROM panel_soiling
+    """)
+    # Overwrites the counts the stats_panels trigger added above
+    cursor.executemany("UPDATE stats_counters SET value = ? WHERE name = ?",
+                       [(value, name) for name, value in counters.items()])
 
 
 def init_database():
@@ -44,19 +612,10 @@ def init_database():
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Table for time series data (LST, SWIR, NDVI, NDWI, VISIBLE)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS panel_timeseries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                panel_id INTEGER NOT NULL,
-                parameter TEXT NOT NULL,
-                date TEXT NOT NULL,
-                value REAL NOT NULL,
-                unit TEXT NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(panel_id, parameter, date)
-            )
-        """)
+        # Time series data (LST, SWIR, NDVI, NDWI, VISIBLE) in yearly
+        # partitions; converts a legacy or unpartitioned table in place
+        migrate_timeseries_schema(cursor)
+        _create_rollup_schema(cursor)
         
         # Table for soiling data (special structure)
         cursor.execute("""
@@ -98,17 +657,31 @@ def init_database():
             )
         """)
         
-        # Create indexes for better query performance
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_timeseries_panel_param_date 
-            ON panel_timeseries(panel_id, parameter, date)
-        """)
-        
+        # Date intervals [start_date, end_date) already fetched from GEE per panel
+        # and parameter, kept merged and non-overlapping. Unlike
+        # data_availability this records every fetched range, including ranges
+        # that produced no rows (e.g. fully clouded), so they are not refetched.
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'data_coverage'")
+        coverage_exists = cursor.fetchone() is not None
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_timeseries_date 
-            ON panel_timeseries(date)
+            CREATE TABLE IF NOT EXISTS data_coverage (
+                panel_id INTEGER NOT NULL,
+                parameter TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                PRIMARY KEY (panel_id, parameter, start_date)
+            )
         """)
-        
+        if not coverage_exists:
+            # Seed from the ranges the migration script already recorded
+            cursor.execute("""
+                INSERT OR IGNORE INTO data_coverage (panel_id, parameter, start_date, end_date)
+                SELECT panel_id, parameter, start_date, end_date
+                FROM data_availability
+                WHERE start_date < end_date
+            """)
+
+        # Create indexes for better query performance
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_soiling_panel_date 
             ON panel_soiling(panel_id, date)
@@ -118,31 +691,107 @@ def init_database():
             CREATE INDEX IF NOT EXISTS idx_monthly_lst_month 
             ON monthly_lst(month)
         """)
+
+        _create_stats_schema(cursor)
         
         print(f"Database initialized at {DB_PATH}")
 
 
+def _batches(rows: Iterable, size: int):
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _parameter_info(conn, name: str, unit: Optional[str] = None) -> Optional[Tuple[int, str]]:
+    """
+    (parameter_id, unit) for a parameter name. With `unit`, an unknown
+    parameter is registered; without it, None is returned for unknown names.
+    """
+    key = (str(DB_PATH), name)
+    info = _parameter_cache.get(key)
+    if info is not None:
+        return info
+    if unit is not None:
+        conn.execute("INSERT OR IGNORE INTO parameters (name, unit) VALUES (?, ?)", (name, unit))
+    row = conn.execute("SELECT parameter_id, unit FROM parameters WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+    info = (row['parameter_id'], row['unit'])
+    _parameter_cache[key] = info
+    return info
+
+
+def upsert_timeseries_rows(rows: Iterable[Tuple[int, str, str, float, str]]) -> int:
+    """
+    Insert or replace (panel_id, parameter, date, value, unit) rows with
+    executemany into their yearly partitions, one transaction per
+    WRITE_CHUNK_SIZE rows. Returns the number of rows written.
+    Units are stored once per parameter (the first unit seen wins). Rows for
+    years already compacted into weekly aggregates are skipped.
+    """
+    written = 0
+    skipped = 0
+    for batch in _batches(rows, WRITE_CHUNK_SIZE):
+        with get_db() as conn:
+            by_year: Dict[int, List[tuple]] = {}
+            for panel_id, parameter, date, value, unit in batch:
+                by_year.setdefault(int(date[:4]), []).append(
+                    (_parameter_info(conn, parameter, unit)[0], panel_id, date_to_day(date), value)
+                )
+            for year, compact in by_year.items():
+                table = _ensure_partition(conn, year)
+                if table is None:
+                    skipped += len(compact)
+                    continue
+                # An upsert (not OR REPLACE) so the rollup triggers see updates as updates
+                conn.executemany(f"""
+                    INSERT INTO {table} (parameter_id, panel_id, day, value)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (parameter_id, panel_id, day) DO UPDATE SET value = excluded.value
+                """, compact)
+                written += len(compact)
+    if skipped:
+        print(f"[WARN] Skipped {skipped} time-series rows for compacted years")
+    return written
+
+
+def upsert_soiling_rows(rows: Iterable[Tuple[int, str, float, float, float, str]]) -> int:
+    """
+    Insert or replace (panel_id, date, baseline_si, current_si,
+    soiling_drop_percent, status) rows in chunked transactions. Returns the row count.
+    """
+    written = 0
+    for batch in _batches(rows, WRITE_CHUNK_SIZE):
+        with get_db() as conn:
+            # An upsert (not OR REPLACE) so the statistics trigger only counts new rows
+            conn.executemany("""
+                INSERT INTO panel_soiling 
+                (panel_id, date, baseline_si, current_si, soiling_drop_percent, unit, status)
+                VALUES (?, ?, ?, ?, ?, '%', ?)
+                ON CONFLICT (panel_id, date) DO UPDATE SET
+                    baseline_si = excluded.baseline_si,
+                    current_si = excluded.current_si,
+                    soiling_drop_percent = excluded.soiling_drop_percent,
+                    unit = excluded.unit,
+                    status = excluded.status
+            """, batch)
+        written += len(batch)
+    return written
+
+
 def insert_timeseries_data(panel_id: int, parameter: str, date: str, value: float, unit: str):
     """Insert time series data for a panel."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO panel_timeseries 
-            (panel_id, parameter, date, value, unit)
-            VALUES (?, ?, ?, ?, ?)
-        """, (panel_id, parameter, date, value, unit))
+    upsert_timeseries_rows([(panel_id, parameter, date, value, unit)])
 
 
 def insert_soiling_data(panel_id: int, date: str, baseline_si: float, current_si: float, 
                        soiling_drop_percent: float, status: str):
     """Insert soiling data for a panel."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO panel_soiling 
-            (panel_id, date, baseline_si, current_si, soiling_drop_percent, unit, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (panel_id, date, baseline_si, current_si, soiling_drop_percent, '%', status))
+    upsert_soiling_rows([(panel_id, date, baseline_si, current_si, soiling_drop_percent, status)])
 
 
 def insert_monthly_lst(month: str, value: float):
@@ -155,29 +804,309 @@ def insert_monthly_lst(month: str, value: float):
         """, (month, value))
 
 
+def _timeseries_segments(conn, start_day: int, end_day: int) -> List[Tuple[str, int, int]]:
+    """
+    Route an inclusive day range to the partitions it overlaps: (source,
+    first_day, last_day) in day order, where source is a raw partition or
+    WEEKLY_TABLE for compacted years. Years without a partition are skipped.
+    """
+    if start_day > end_day:
+        return []
+    segments = []
+    for year, compacted in conn.execute("""
+        SELECT year, compacted FROM timeseries_partitions
+        WHERE year >= ? AND year <= ?
+        ORDER BY year
+    """, (_day_year(start_day), _day_year(end_day))).fetchall():
+        first_day, last_day = partition_days(year)
+        segments.append((
+            WEEKLY_TABLE if compacted else partition_name(year),
+            max(first_day, start_day),
+            min(last_day, end_day),
+        ))
+    return segments
+
+
+def _segment_source(source: str) -> str:
+    """
+    FROM-clause source with (parameter_id, panel_id, day, value, n, total)
+    columns; weekly aggregates read as one point per week at the mean value.
+    """
+    if source == WEEKLY_TABLE:
+        return f"""(SELECT parameter_id, panel_id, week_day AS day, sum / count AS value,
+                   count AS n, sum AS total FROM {WEEKLY_TABLE})"""
+    return f"(SELECT parameter_id, panel_id, day, value, 1 AS n, value AS total FROM {source})"
+
+
 def get_timeseries_data(panel_id: int, parameter: str, start_date: str, end_date: str) -> List[Dict]:
     """Get time series data for a panel within a date range."""
     with get_db() as conn:
+        info = _parameter_info(conn, parameter)
+        if info is None:
+            return []
+        parameter_id, unit = info
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT date, value, unit
-            FROM panel_timeseries
-            WHERE panel_id = ? AND parameter = ? 
-            AND date >= ? AND date <= ?
-            ORDER BY date ASC
-        """, (panel_id, parameter, start_date, end_date))
-        
-        rows = cursor.fetchall()
+        rows = []
+        for source, first_day, last_day in _timeseries_segments(conn, date_to_day(start_date), date_to_day(end_date)):
+            cursor.execute(f"""
+                SELECT day, value
+                FROM {_segment_source(source)}
+                WHERE parameter_id = ? AND panel_id = ?
+                AND day >= ? AND day <= ?
+                ORDER BY day ASC
+            """, (parameter_id, panel_id, first_day, last_day))
+            rows.extend(cursor.fetchall())
+
         return [
             {
-                'date': row['date'],
+                'date': day_to_date(row['day']),
                 'value': row['value'],
-                'unit': row['unit']
+                'unit': unit
             }
             for row in rows
         ]
 
 
+def _chunked(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def get_timeseries_data_bulk(panel_ids: List[int], parameter: str, start_date: str, end_date: str) -> Dict[int, List[Dict]]:
+    """
+    Get time series data for many panels in one query per chunk of ids.
+    Returns {panel_id: [{'date', 'value', 'unit'}, ...]}; panels without rows are omitted.
+    """
+    results: Dict[int, List[Dict]] = {}
+    unique_ids = list(dict.fromkeys(panel_ids))
+    if not unique_ids:
+        return results
+
+    with get_db() as conn:
+        info = _parameter_info(conn, parameter)
+        if info is None:
+            return results
+        parameter_id, unit = info
+        segments = _timeseries_segments(conn, date_to_day(start_date), date_to_day(end_date))
+        cursor = conn.cursor()
+        for chunk in _chunked(unique_ids, MAX_QUERY_PARAMETERS):
+            placeholders = ','.join('?' * len(chunk))
+            # Segments are in day order, so each panel's list stays sorted
+            for source, first_day, last_day in segments:
+                cursor.execute(f"""
+                    SELECT panel_id, day, value
+                    FROM {_segment_source(source)}
+                    WHERE parameter_id = ? AND panel_id IN ({placeholders})
+                    AND day >= ? AND day <= ?
+                    ORDER BY panel_id ASC, day ASC
+                """, (parameter_id, *chunk, first_day, last_day))
+
+                for row in cursor.fetchall():
+                    results.setdefault(row['panel_id'], []).append({
+                        'date': day_to_date(row['day']),
+                        'value': row['value'],
+                        'unit': unit
+                    })
+    return results
+
+
+def _full_month_span(start_date: str, end_date: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    (first_month, last_month, first_day, last_day) of the whole calendar
+    months inside the inclusive [start_date, end_date], months as YYYYMM and
+    days as epoch days; None if no month is fully inside.
+    """
+    start = date_type.fromisoformat(start_date[:10])
+    end = date_type.fromisoformat(end_date[:10])
+    first = start if start.day == 1 else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    after_end = end + timedelta(days=1)
+    last_end = after_end.replace(day=1) - timedelta(days=1)  # last month-end <= end
+    if first > last_end:
+        return None
+    return (
+        first.year * 100 + first.month,
+        last_end.year * 100 + last_end.month,
+        first.toordinal() - EPOCH_ORDINAL,
+        last_end.toordinal() - EPOCH_ORDINAL,
+    )
+
+
+def get_panel_means(parameter: str, start_date: str, end_date: str) -> Dict[int, Tuple[int, float]]:
+    """
+    {panel_id: (count, sum)} of `parameter` over the inclusive date range.
+    Whole months come from panel_monthly_rollup; only the partial months at
+    either end are read from the raw (or weekly, once compacted) rows.
+    """
+    totals: Dict[int, List[float]] = {}
+
+    def add(rows):
+        for row in rows:
+            entry = totals.setdefault(row['panel_id'], [0, 0.0])
+            entry[0] += row['count']
+            entry[1] += row['total']
+
+    with get_db() as conn:
+        info = _parameter_info(conn, parameter)
+        if info is None:
+            return {}
+        parameter_id = info[0]
+        start_day, end_day = date_to_day(start_date), date_to_day(end_date)
+        raw_ranges = [(start_day, end_day)]
+        span = _full_month_span(start_date, end_date)
+        if span:
+            first_month, last_month, first_day, last_day = span
+            add(conn.execute("""
+                SELECT panel_id, SUM(count) AS count, SUM(sum) AS total
+                FROM panel_monthly_rollup
+                WHERE parameter_id = ? AND month >= ? AND month <= ?
+                GROUP BY panel_id
+            """, (parameter_id, first_month, last_month)))
+            raw_ranges = [(start_day, first_day - 1), (last_day + 1, end_day)]
+
+        for range_start, range_end in raw_ranges:
+            for source, first_day, last_day in _timeseries_segments(conn, range_start, range_end):
+                add(conn.execute(f"""
+                    SELECT panel_id, SUM(n) AS count, SUM(total) AS total
+                    FROM {_segment_source(source)}
+                    WHERE parameter_id = ? AND day >= ? AND day <= ?
+                    GROUP BY panel_id
+                """, (parameter_id, first_day, last_day)))
+
+    return {panel_id: (int(count), total) for panel_id, (count, total) in totals.items() if count}
+
+
+PANEL_REDUCERS = ('mean', 'median', 'latest')
+
+
+def get_panel_reductions(parameter: str, start_date: str, end_date: str, reducer: str = 'mean') -> Dict[int, Tuple[int, float]]:
+    """
+    {panel_id: (count, value)} of `parameter` over the inclusive date range,
+    reduced per panel in SQL: the mean (via get_panel_means), the median of
+    the stored values, or the value on the latest stored day.
+    """
+    if reducer not in PANEL_REDUCERS:
+        raise ValueError(f"Unknown reducer {reducer}; expected one of {PANEL_REDUCERS}")
+    if reducer == 'mean':
+        return {panel_id: (count, total / count) for panel_id, (count, total) in
+                get_panel_means(parameter, start_date, end_date).items()}
+
+    with get_db() as conn:
+        info = _parameter_info(conn, parameter)
+        if info is None:
+            return {}
+        segments = _timeseries_segments(conn, date_to_day(start_date), date_to_day(end_date))
+        if not segments:
+            return {}
+        source = " UNION ALL ".join(
+            f"SELECT panel_id, day, value FROM {_segment_source(name)} "
+            f"WHERE parameter_id = ? AND day >= ? AND day <= ?"
+            for name, _, _ in segments
+        )
+        params = [value for _, first_day, last_day in segments for value in (info[0], first_day, last_day)]
+        if reducer == 'median':
+            # Middle row (or the mean of the two middle rows) of each panel's sorted values
+            query = f"""
+                WITH ranked AS (
+                    SELECT panel_id, value,
+                           ROW_NUMBER() OVER (PARTITION BY panel_id ORDER BY value) AS position,
+                           COUNT(*) OVER (PARTITION BY panel_id) AS count
+                    FROM ({source})
+                )
+                SELECT panel_id, MAX(count) AS count, AVG(value) AS value
+                FROM ranked
+                WHERE position IN ((count + 1) / 2, (count + 2) / 2)
+                GROUP BY panel_id
+            """
+        else:
+            query = f"""
+                WITH ranked AS (
+                    SELECT panel_id, value,
+                           ROW_NUMBER() OVER (PARTITION BY panel_id ORDER BY day DESC) AS position,
+                           COUNT(*) OVER (PARTITION BY panel_id) AS count
+                    FROM ({source})
+                )
+                SELECT panel_id, count, value FROM ranked WHERE position = 1
+            """
+        return {row['panel_id']: (row['count'], row['value']) for row in conn.execute(query, params)}
+
+
+def get_farm_rollups(parameter: str, start_date: str, end_date: str, grain: str = 'day') -> List[Dict]:
+    """
+    Farm-wide count / mean / stddev / min / max of `parameter` per day or per
+    month (grain='month', months overlapping the range) from the rollup tables.
+    """
+    with get_db() as conn:
+        info = _parameter_info(conn, parameter)
+        if info is None:
+            return []
+        parameter_id, unit = info
+        if grain == 'month':
+            cursor = conn.execute("""
+                SELECT month AS period, count, sum, sum_sq, min, max
+                FROM farm_monthly_rollup
+                WHERE parameter_id = ? AND month >= ? AND month <= ?
+                ORDER BY month ASC
+            """, (parameter_id, int(start_date[:4] + start_date[5:7]), int(end_date[:4] + end_date[5:7])))
+        else:
+            cursor = conn.execute("""
+                SELECT day AS period, count, sum, sum_sq, min, max
+                FROM farm_daily_rollup
+                WHERE parameter_id = ? AND day >= ? AND day <= ?
+                ORDER BY day ASC
+            """, (parameter_id, date_to_day(start_date), date_to_day(end_date)))
+
+        results = []
+        for row in cursor.fetchall():
+            count = row['count']
+            mean = row['sum'] / count
+            variance = max(row['sum_sq'] / count - mean * mean, 0.0)
+            period = row['period']
+            results.append({
+                'month' if grain == 'month' else 'date':
+                    f"{period // 100:04d}-{period % 100:02d}" if grain == 'month' else day_to_date(period),
+                'count': count,
+                'mean': mean,
+                'stddev': variance ** 0.5,
+                'min': row['min'],
+                'max': row['max'],
+                'unit': unit,
+            })
+        return results
+
+
+def get_latest_soiling_records(panel_ids: List[int]) -> Dict[int, Dict]:
+    """Get the latest soiling record for each of many panels in one query per chunk of ids."""
+    results: Dict[int, Dict] = {}
+    unique_ids = list(dict.fromkeys(panel_ids))
+    if not unique_ids:
+        return results
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for chunk in _chunked(unique_ids, MAX_QUERY_PARAMETERS):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"""
+                SELECT s.panel_id, s.baseline_si, s.current_si, s.soiling_drop_percent, s.unit, s.status
+                FROM panel_soiling s
+                JOIN (
+                    SELECT panel_id, MAX(date) AS max_date
+                    FROM panel_soiling
+                    WHERE panel_id IN ({placeholders})
+                    GROUP BY panel_id
+                ) latest ON latest.panel_id = s.panel_id AND latest.max_date = s.date
+            """, chunk)
+
+            for row in cursor.fetchall():
+                results[row['panel_id']] = {
+                    'baseline_si': row['baseline_si'],
+                    'current_si': row['current_si'],
+                    'soiling_drop_percent': row['soiling_drop_percent'],
+                    'unit': row['unit'],
+                    'status': row['status']
+                }
+    return results
+
+
 def get_latest_soiling_record(panel_id: int) -> Optional[Dict]:
     """Get the latest soiling record for a panel."""
     with get_db() as conn:
@@ -232,6 +1161,82 @@ def update_data_availability(panel_id: int, parameter: str, start_date: str, end
             (panel_id, parameter, start_date, end_date, record_count, last_updated)
             VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
         """, (panel_id, parameter, start_date, end_date, record_count))
+    add_coverage([panel_id], parameter, start_date, end_date)
+
+
+def missing_ranges(intervals: List[Tuple[str, str]], start_date: str, end_date: str) -> List[Tuple[str, str]]:
+    """
+    Sub-ranges of [start_date, end_date) not covered by `intervals`
+    (sorted, non-overlapping [start, end) pairs of YYYY-MM-DD strings).
+    """
+    gaps = []
+    cursor = start_date
+    for interval_start, interval_end in intervals:
+        if interval_end <= cursor:
+            continue
+        if interval_start >= end_date:
+            break
+        if interval_start > cursor:
+            gaps.append((cursor, interval_start))
+        cursor = max(cursor, interval_end)
+        if cursor >= end_date:
+            break
+    if cursor < end_date:
+        gaps.append((cursor, end_date))
+    return gaps
+
+
+def get_coverage_bulk(panel_ids: List[int], parameter: str) -> Dict[int, List[Tuple[str, str]]]:
+    """Covered [start, end) intervals per panel, sorted by start; panels without coverage are omitted."""
+    results: Dict[int, List[Tuple[str, str]]] = {}
+    unique_ids = list(dict.fromkeys(panel_ids))
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for chunk in _chunked(unique_ids, MAX_QUERY_PARAMETERS):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"""
+                SELECT panel_id, start_date, end_date
+                FROM data_coverage
+                WHERE parameter = ? AND panel_id IN ({placeholders})
+                ORDER BY panel_id ASC, start_date ASC
+            """, (parameter, *chunk))
+            for row in cursor.fetchall():
+                results.setdefault(row['panel_id'], []).append((row['start_date'], row['end_date']))
+    return results
+
+
+def add_coverage(panel_ids: List[int], parameter: str, start_date: str, end_date: str):
+    """Mark [start_date, end_date) as fetched for every panel, merging overlapping or adjacent intervals."""
+    if start_date >= end_date:
+        return
+    unique_ids = list(dict.fromkeys(panel_ids))
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for chunk in _chunked(unique_ids, MAX_QUERY_PARAMETERS):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"""
+                SELECT panel_id, MIN(start_date) AS merged_start, MAX(end_date) AS merged_end
+                FROM data_coverage
+                WHERE parameter = ? AND panel_id IN ({placeholders})
+                AND start_date <= ? AND end_date >= ?
+                GROUP BY panel_id
+            """, (parameter, *chunk, end_date, start_date))
+            merged = {row['panel_id']: (row['merged_start'], row['merged_end']) for row in cursor.fetchall()}
+
+            cursor.execute(f"""
+                DELETE FROM data_coverage
+                WHERE parameter = ? AND panel_id IN ({placeholders})
+                AND start_date <= ? AND end_date >= ?
+            """, (parameter, *chunk, end_date, start_date))
+
+            rows = []
+            for panel_id in chunk:
+                merged_start, merged_end = merged.get(panel_id, (start_date, end_date))
+                rows.append((panel_id, parameter, min(merged_start, start_date), max(merged_end, end_date)))
+            cursor.executemany("""
+                INSERT INTO data_coverage (panel_id, parameter, start_date, end_date)
+                VALUES (?, ?, ?, ?)
+            """, rows)
 
 
 def check_data_availability(panel_id: int, parameter: str, start_date: str, end_date: str) -> bool:
@@ -245,12 +1250,22 @@ def check_data_availability(panel_id: int, parameter: str, start_date: str, end_
                 WHERE panel_id = ? AND date >= ? AND date <= ?
             """, (panel_id, start_date, end_date))
         else:
-            cursor.execute("""
-                SELECT COUNT(*) as count
-                FROM panel_timeseries
-                WHERE panel_id = ? AND parameter = ? 
-                AND date >= ? AND date <= ?
-            """, (panel_id, parameter, start_date, end_date))
+            info = _parameter_info(conn, parameter)
+            if info is None:
+                return False
+            for source, first_day, last_day in _timeseries_segments(
+                conn, date_to_day(start_date), date_to_day(end_date)
+            ):
+                cursor.execute(f"""
+                    SELECT EXISTS (
+                        SELECT 1 FROM {_segment_source(source)}
+                        WHERE parameter_id = ? AND panel_id = ?
+                        AND day >= ? AND day <= ?
+                    ) as count
+                """, (info[0], panel_id, first_day, last_day))
+                if cursor.fetchone()['count']:
+                    return True
+            return False
         
         row = cursor.fetchone()
         return row['count'] > 0 if row else False
@@ -261,53 +1276,118 @@ def get_all_panel_ids() -> List[int]:
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT DISTINCT panel_id FROM panel_timeseries
+            SELECT DISTINCT panel_id FROM timeseries
+            UNION
+            SELECT DISTINCT panel_id FROM timeseries_weekly
             UNION
             SELECT DISTINCT panel_id FROM panel_soiling
         """)
         return [row['panel_id'] for row in cursor.fetchall()]
 
 
-def get_data_statistics() -> Dict[str, Any]:
-    """Get database statistics."""
+def get_data_statistics(exact: bool = False) -> Dict[str, Any]:
+    """
+    Get database statistics from the materialized stats tables, or with
+    `exact` from a full recount of the data tables.
+    """
     with get_db() as conn:
         cursor = conn.cursor()
-        
-        stats = {}
-        
-        # Count records by parameter
-        cursor.execute("""
-            SELECT parameter, COUNT(*) as count
-            FROM panel_timeseries
-            GROUP BY parameter
-        """)
-        stats['timeseries_counts'] = {row['parameter']: row['count'] for row in cursor.fetchall()}
-        
-        # Count soiling records
-        cursor.execute("SELECT COUNT(*) as count FROM panel_soiling")
-        stats['soiling_count'] = cursor.fetchone()['count']
-        
-        # Count unique panels
-        cursor.execute("""
-            SELECT COUNT(DISTINCT panel_id) as count FROM panel_timeseries
-        """)
-        stats['unique_panels_timeseries'] = cursor.fetchone()['count']
-        
-        cursor.execute("""
-            SELECT COUNT(DISTINCT panel_id) as count FROM panel_soiling
-        """)
-        stats['unique_panels_soiling'] = cursor.fetchone()['count']
-        
-        # Date ranges
-        cursor.execute("""
-            SELECT MIN(date) as min_date, MAX(date) as max_date
-            FROM panel_timeseries
-        """)
-        date_range = cursor.fetchone()
-        if date_range and date_range['min_date']:
+        if exact:
+            per_parameter, counters = _recount_statistics(cursor)
+        else:
+            per_parameter = [tuple(row) for row in cursor.execute(
+                "SELECT parameter_id, row_count, min_day, max_day FROM timeseries_stats"
+            ).fetchall()]
+            counters = {row['name']: row['value'] for row in cursor.execute(
+                "SELECT name, value FROM stats_counters"
+            ).fetchall()}
+        names = {row['parameter_id']: row['name'] for row in cursor.execute(
+            "SELECT parameter_id, name FROM parameters"
+        ).fetchall()}
+
+        stats = {
+            'timeseries_counts': {
+                names.get(parameter_id, str(parameter_id)): row_count
+                for parameter_id, row_count, _, _ in per_parameter if row_count
+            },
+            'soiling_count': counters.get('soiling_rows', 0),
+            'unique_panels_timeseries': counters.get('timeseries_panels', 0),
+            'unique_panels_soiling': counters.get('soiling_panels', 0),
+            'partitions': [
+                {'year': year, 'compacted': compacted} for year, compacted in list_partitions(conn)
+            ],
+            'exact': exact,
+        }
+        if per_parameter:
             stats['date_range'] = {
-                'min': date_range['min_date'],
-                'max': date_range['max_date']
+                'min': day_to_date(min(row[2] for row in per_parameter)),
+                'max': day_to_date(max(row[3] for row in per_parameter))
             }
         
         return stats
+
+
+def compact_timeseries(retention_days: int = TIMESERIES_RAW_RETENTION_DAYS,
+                       today: Optional[date_type] = None) -> List[int]:
+    """
+    Retention policy: fold every raw yearly partition that ended more than
+    `retention_days` ago into weekly aggregates, then drop it. One
+    transaction per year. Rollups and data coverage are kept, so reads of a
+    compacted year return one point per week. Returns the compacted years.
+    """
+    cutoff = (today or date_type.today()).toordinal() - EPOCH_ORDINAL - retention_days
+    with get_db() as conn:
+        years = [
+            year for year, compacted in list_partitions(conn)
+            if not compacted and partition_days(year)[1] < cutoff
+        ]
+
+    for year in years:
+        table = partition_name(year)
+        first_day, _ = partition_days(year)
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO {WEEKLY_TABLE}
+                (parameter_id, panel_id, week_day, count, sum, sum_sq, min, max)
+                SELECT parameter_id, panel_id, MAX(day - (day + 3) % 7, ?) AS week_day,
+                       COUNT(*), SUM(value), SUM(value * value), MIN(value), MAX(value)
+                FROM {table}
+                GROUP BY parameter_id, panel_id, week_day
+            """, (first_day,))
+            weeks = cursor.rowcount
+            dropped = cursor.execute(f"""
+                SELECT COUNT(*) AS row_count, parameter_id FROM {table} GROUP BY parameter_id
+            """).fetchall()
+            cursor.executemany("""
+                UPDATE timeseries_stats SET row_count = row_count - ? WHERE parameter_id = ?
+            """, [tuple(row) for row in dropped])
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute("""
+                UPDATE timeseries_partitions
+                SET compacted = 1, compacted_at = CURRENT_TIMESTAMP
+                WHERE year = ?
+            """, (year,))
+            _rebuild_timeseries_view(cursor)
+            _partition_cache.pop((str(DB_PATH), year), None)
+        print(f"[INFO] Compacted {table} into {weeks} weekly aggregates")
+    return years
+
+
+def reclaim_space(full: bool = False):
+    """
+    Return free pages (e.g. from dropped partitions) to the filesystem.
+    Incremental by default, which leaves live partitions untouched; `full`
+    runs VACUUM, which also switches older files to incremental auto-vacuum.
+    """
+    conn = get_db_connection()
+    try:
+        if full:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            # Each step frees pages; the pragma only runs while it is stepped
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
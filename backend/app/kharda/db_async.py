@@ -0,0 +1,75 @@
+"""
+Awaitable access to app.kharda.database for the async routes.
+
+Every call runs on a dedicated, bounded thread pool so SQLite never blocks the
+event loop. Each pool thread keeps its own pooled WAL connection, so up to
+DB_POOL_SIZE reads run in parallel; writes additionally take a process-wide
+lock because SQLite allows a single writer at a time.
+"""
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from app.kharda import database
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="kharda-db")
+# Held by every in-process writer, including the ingest queue's writer thread
+write_lock = threading.Lock()
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking DB function on the DB pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+def _serialized(func, *args, **kwargs):
+    with write_lock:
+        return func(*args, **kwargs)
+
+
+async def run_db_write(func, *args, **kwargs):
+    """Run a blocking DB write on the DB pool, one writer at a time."""
+    return await run_db(_serialized, func, *args, **kwargs)
+
+
+def _reader(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+
+def _writer(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db_write(func, *args, **kwargs)
+    return wrapper
+
+
+# Same names and arguments as app.kharda.database, but awaitable
+get_timeseries_data = _reader(database.get_timeseries_data)
+get_timeseries_data_bulk = _reader(database.get_timeseries_data_bulk)
+get_latest_soiling_record = _reader(database.get_latest_soiling_record)
+get_latest_soiling_records = _reader(database.get_latest_soiling_records)
+get_coverage_bulk = _reader(database.get_coverage_bulk)
+get_monthly_lst = _reader(database.get_monthly_lst)
+check_data_availability = _reader(database.check_data_availability)
+get_all_panel_ids = _reader(database.get_all_panel_ids)
+get_data_statistics = _reader(database.get_data_statistics)
+get_panel_means = _reader(database.get_panel_means)
+get_farm_rollups = _reader(database.get_farm_rollups)
+
+upsert_timeseries_rows = _writer(database.upsert_timeseries_rows)
+upsert_soiling_rows = _writer(database.upsert_soiling_rows)
+add_coverage = _writer(database.add_coverage)
+update_data_availability = _writer(database.update_data_availability)
+
+
+def shutdown():
+    """Stop the DB pool (call on application shutdown)."""
+    _executor.shutdown(wait=True)
@@ -0,0 +1,255 @@
+"""
+Streaming export of the stored panel history.
+
+Rows are read from SQLite in fixed-size chunks on a dedicated connection and
+encoded incrementally, so memory stays bounded by EXPORT_CHUNK_ROWS no matter
+how much history is exported:
+
+    parquet - one row group per chunk; row groups never span two
+              (parameter, year) partitions, so readers can skip by
+              parameter/year using row-group statistics
+    csv     - gzip-compressed CSV
+
+Datasets:
+    timeseries - panel_id, parameter, date, value, unit, granularity
+                 ('day' for raw rows; 'week' for years compacted by retention,
+                 where date is the week start and value the weekly mean)
+    soiling    - panel_id, date, baseline_si, current_si, soiling_drop_percent, unit, status
+
+Usage (from backend/):
+    python -m app.kharda.export --dataset timeseries --format parquet --out history.parquet
+"""
+import io
+import os
+import csv
+import zlib
+from datetime import date as date_type
+from typing import Optional, List, Iterator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+from app.kharda.database import (
+    get_db_connection, date_to_day, day_to_date, list_partitions, partition_days, partition_name, WEEKLY_TABLE
+)
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 50000))
+EXPORT_DATASETS = ('timeseries', 'soiling')
+EXPORT_FORMATS = ('parquet', 'csv')
+
+TIMESERIES_COLUMNS = ('panel_id', 'parameter', 'date', 'value', 'unit', 'granularity')
+SOILING_COLUMNS = ('panel_id', 'date', 'baseline_si', 'current_si', 'soiling_drop_percent', 'unit', 'status')
+
+MEDIA_TYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'csv': 'application/gzip',
+}
+FILE_EXTENSIONS = {
+    'parquet': 'parquet',
+    'csv': 'csv.gz',
+}
+
+
+def _iter_timeseries_chunks(conn, parameters: Optional[List[str]], start_date: Optional[str],
+                            end_date: Optional[str]) -> Iterator[List[tuple]]:
+    """
+    Chunks of timeseries rows, each within a single (parameter, year)
+    partition. Years compacted into weekly aggregates are exported from
+    WEEKLY_TABLE as one row per week at the weekly mean, marked 'week'.
+    """
+    start_day = date_to_day(start_date) if start_date else None
+    end_day = date_to_day(end_date) if end_date else None
+    wanted = {p.upper() for p in parameters} if parameters else None
+    partitions = list_partitions(conn)
+
+    for parameter_id, name, unit in conn.execute(
+        "SELECT parameter_id, name, unit FROM parameters ORDER BY name"
+    ).fetchall():
+        if wanted is not None and name not in wanted:
+            continue
+        for year, compacted in partitions:
+            first_day, last_day = partition_days(year)
+            first_day = max(first_day, start_day) if start_day is not None else first_day
+            last_day = min(last_day, end_day) if end_day is not None else last_day
+            if first_day > last_day:
+                continue
+            if compacted:
+                granularity = 'week'
+                query = f"""
+                    SELECT panel_id, week_day AS day, sum / count AS value
+                    FROM {WEEKLY_TABLE}
+                    WHERE parameter_id = ? AND week_day >= ? AND week_day <= ?
+                    ORDER BY panel_id ASC, week_day ASC
+                """
+            else:
+                granularity = 'day'
+                query = f"""
+                    SELECT panel_id, day, value
+                    FROM {partition_name(year)}
+                    WHERE parameter_id = ? AND day >= ? AND day <= ?
+                    ORDER BY panel_id ASC, day ASC
+                """
+            cursor = conn.execute(query, (parameter_id, first_day, last_day))
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                yield [(panel_id, name, day_to_date(day), value, unit, granularity) for panel_id, day, value in rows]
+
+
+def _iter_soiling_chunks(conn, start_date: Optional[str], end_date: Optional[str]) -> Iterator[List[tuple]]:
+    """Chunks of soiling rows, each within a single year."""
+    first_date, last_date = conn.execute("SELECT MIN(date), MAX(date) FROM panel_soiling").fetchone()
+    if first_date is None:
+        return
+    first_date = max(first_date, start_date) if start_date else first_date
+    last_date = min(last_date, end_date) if end_date else last_date
+
+    for year in range(int(first_date[:4]), int(last_date[:4]) + 1):
+        cursor = conn.execute("""
+            SELECT panel_id, date, baseline_si, current_si, soiling_drop_percent, unit, status
+            FROM panel_soiling
+            WHERE date >= ? AND date <= ?
+            ORDER BY panel_id ASC, date ASC
+        """, (max(f"{year}-01-01", first_date), min(f"{year}-12-31", last_date)))
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+
+
+def iter_export_chunks(dataset: str, parameters: Optional[List[str]] = None, start_date: Optional[str] = None,
+                       end_date: Optional[str] = None) -> Iterator[List[tuple]]:
+    """Row chunks of `dataset` read on a private connection that is closed when iteration ends."""
+    conn = get_db_connection()
+    try:
+        if dataset == 'soiling':
+            yield from _iter_soiling_chunks(conn, start_date, end_date)
+        else:
+            yield from _iter_timeseries_chunks(conn, parameters, start_date, end_date)
+    finally:
+        conn.close()
+
+
+def _parquet_schema(dataset: str):
+    if dataset == 'soiling':
+        return pa.schema([
+            ('panel_id', pa.int32()),
+            ('date', pa.date32()),
+            ('baseline_si', pa.float64()),
+            ('current_si', pa.float64()),
+            ('soiling_drop_percent', pa.float64()),
+            ('unit', pa.dictionary(pa.int8(), pa.string())),
+            ('status', pa.dictionary(pa.int8(), pa.string())),
+        ])
+    return pa.schema([
+        ('panel_id', pa.int32()),
+        ('parameter', pa.dictionary(pa.int8(), pa.string())),
+        ('date', pa.date32()),
+        ('value', pa.float64()),
+        ('unit', pa.dictionary(pa.int8(), pa.string())),
+        ('granularity', pa.dictionary(pa.int8(), pa.string())),
+    ])
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose buffered bytes are handed out as they are produced."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def iter_parquet_bytes(dataset: str, **filters) -> Iterator[bytes]:
+    """Encode `dataset` as a Parquet file, yielding bytes after each row group."""
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    schema = _parquet_schema(dataset)
+    columns = SOILING_COLUMNS if dataset == 'soiling' else TIMESERIES_COLUMNS
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for rows in iter_export_chunks(dataset, **filters):
+            arrays = {}
+            for index, column in enumerate(columns):
+                values = [row[index] for row in rows]
+                if column == 'date':
+                    values = [date_type.fromisoformat(v[:10]) for v in values]
+                arrays[column] = values
+            writer.write_table(pa.Table.from_pydict(arrays, schema=schema), row_group_size=len(rows))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_csv_gzip_bytes(dataset: str, **filters) -> Iterator[bytes]:
+    """Encode `dataset` as gzip-compressed CSV, yielding compressed bytes per chunk."""
+    columns = SOILING_COLUMNS if dataset == 'soiling' else TIMESERIES_COLUMNS
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for rows in iter_export_chunks(dataset, **filters):
+        writer.writerows(rows)
+        data = compressor.compress(text.getvalue().encode('utf-8'))
+        text.seek(0)
+        text.truncate()
+        if data:
+            yield data
+    yield compressor.compress(text.getvalue().encode('utf-8')) + compressor.flush()
+
+
+def iter_export_bytes(dataset: str, format: str, **filters) -> Iterator[bytes]:
+    if format == 'parquet':
+        return iter_parquet_bytes(dataset, **filters)
+    return iter_csv_gzip_bytes(dataset, **filters)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export stored panel history')
+    parser.add_argument('--dataset', choices=EXPORT_DATASETS, default='timeseries')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='parquet')
+    parser.add_argument('--parameters', help='Comma-separated parameters (timeseries only)')
+    parser.add_argument('--start-date', help='YYYY-MM-DD (inclusive)')
+    parser.add_argument('--end-date', help='YYYY-MM-DD (inclusive)')
+    parser.add_argument('--out', required=True, help='Output file')
+    args = parser.parse_args()
+
+    export_filters = {'start_date': args.start_date, 'end_date': args.end_date}
+    if args.dataset == 'timeseries':
+        export_filters['parameters'] = args.parameters.split(',') if args.parameters else None
+
+    written = 0
+    tmp_path = f"{args.out}.tmp"
+    with open(tmp_path, 'wb') as f:
+        for chunk in iter_export_bytes(args.dataset, args.format, **export_filters):
+            f.write(chunk)
+            written += len(chunk)
+    os.replace(tmp_path, args.out)
+    print(f"[INFO] Exported {args.dataset} to {args.out} ({written / 1e6:.1f} MB)")
@@ -0,0 +1,256 @@
+"""
+Write-behind ingest queue for the Kharda database.
+
+Request handlers and the migration script hand rows to the queue and return
+immediately; one writer thread drains it, coalescing everything pending into
+a single transaction of up to INGEST_BATCH_ROWS rows. SQLite's write lock is
+therefore only ever taken by that thread (plus the rare db_async writer,
+which shares the same process-wide lock), so requests no longer wait on or
+fail with `database is locked`.
+
+Backpressure: at most INGEST_MAX_PENDING_ROWS rows wait in memory. Producers
+block (off the event loop for `submit`) until the writer catches up, and give
+up after INGEST_PUT_TIMEOUT_S. Rows and the coverage recorded for them travel
+in the same item, so coverage is never written without its rows.
+
+Writes become visible once the writer commits, typically within
+INGEST_FLUSH_INTERVAL_S; call flush() where a caller must read its own writes.
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple, Iterable
+
+from app.kharda import database
+from app.kharda.db_async import write_lock
+
+INGEST_MAX_PENDING_ROWS = int(os.getenv("INGEST_MAX_PENDING_ROWS", 200000))
+INGEST_BATCH_ROWS = int(os.getenv("INGEST_BATCH_ROWS", 20000))
+# How long the writer waits for more rows before committing a small batch
+INGEST_FLUSH_INTERVAL_S = float(os.getenv("INGEST_FLUSH_INTERVAL_S", 0.5))
+INGEST_PUT_TIMEOUT_S = float(os.getenv("INGEST_PUT_TIMEOUT_S", 30))
+INGEST_MAX_RETRIES = 3
+
+
+class IngestItem:
+    """One producer's writes; committed together with whatever else is pending."""
+    __slots__ = ('timeseries', 'soiling', 'coverage', 'availability')
+
+    def __init__(self, timeseries=(), soiling=(), coverage=(), availability=()):
+        # (panel_id, parameter, date, value, unit)
+        self.timeseries: List[tuple] = list(timeseries)
+        # (panel_id, date, baseline_si, current_si, soiling_drop_percent, status)
+        self.soiling: List[tuple] = list(soiling)
+        # (panel_ids, parameter, start_date, end_date), end exclusive
+        self.coverage: List[tuple] = list(coverage)
+        # (panel_id, parameter, start_date, end_date, record_count)
+        self.availability: List[tuple] = list(availability)
+
+    def size(self) -> int:
+        return len(self.timeseries) + len(self.soiling) + len(self.coverage) + len(self.availability)
+
+
+class IngestQueue:
+    """Bounded write-behind queue drained by a single writer thread."""
+
+    def __init__(self, max_pending_rows: int = INGEST_MAX_PENDING_ROWS, batch_rows: int = INGEST_BATCH_ROWS,
+                 flush_interval: float = INGEST_FLUSH_INTERVAL_S):
+        self.max_pending_rows = max_pending_rows
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self._items: deque = deque()
+        self._pending_rows = 0
+        self._writing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self.written_rows = 0
+        self.dropped_rows = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="kharda-ingest", daemon=True)
+        self._thread.start()
+
+    def _offer(self, item: IngestItem, rows: int) -> Optional[bool]:
+        """Queue `item` if it fits (caller holds the condition); None if the queue is full."""
+        if self._closed:
+            self.dropped_rows += rows
+            print(f"[WARN] Ingest queue closed; dropped {rows} rows")
+            return False
+        # An item larger than the whole queue is still accepted once it drains
+        if self._pending_rows and self._pending_rows + rows > self.max_pending_rows:
+            return None
+        self._items.append(item)
+        self._pending_rows += rows
+        self._cond.notify_all()
+        return True
+
+    def put(self, item: IngestItem, timeout: Optional[float] = INGEST_PUT_TIMEOUT_S) -> bool:
+        """
+        Queue `item`, blocking while the queue is full. Returns False (and
+        drops the item) if it is still full after `timeout` or the queue is closed.
+        """
+        rows = item.size()
+        if rows == 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                queued = self._offer(item, rows)
+                if queued is not None:
+                    return queued
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.dropped_rows += rows
+                    print(f"[WARN] Ingest queue full ({self._pending_rows} rows pending); dropped {rows} rows")
+                    return False
+                self._cond.wait(remaining)
+
+    def try_put(self, item: IngestItem) -> Optional[bool]:
+        """put() without waiting: None if the queue is full."""
+        rows = item.size()
+        if rows == 0:
+            return True
+        with self._cond:
+            return self._offer(item, rows)
+
+    async def submit(self, timeseries: Iterable[tuple] = (), soiling: Iterable[tuple] = (),
+                     coverage: Iterable[tuple] = (), availability: Iterable[tuple] = ()) -> bool:
+        """Queue writes from async code; waits for space off the event loop."""
+        item = IngestItem(timeseries, soiling, coverage, availability)
+        queued = self.try_put(item)
+        if queued is None:
+            queued = await asyncio.to_thread(self.put, item)
+        return queued
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is committed; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._items or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting writes, commit what is queued and stop the writer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'pending_rows': self._pending_rows,
+                'pending_items': len(self._items),
+                'written_rows': self.written_rows,
+                'dropped_rows': self.dropped_rows,
+                'batches': self.batches,
+                'last_error': self.last_error,
+            }
+
+    def _take_batch(self) -> Optional[List[IngestItem]]:
+        """Wait for work, linger up to flush_interval to coalesce, and take up to batch_rows rows."""
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if not self._items:
+                return None
+            deadline = time.monotonic() + self.flush_interval
+            while not self._closed and self._pending_rows < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            rows = 0
+            while self._items and (not batch or rows + self._items[0].size() <= self.batch_rows):
+                item = self._items.popleft()
+                batch.append(item)
+                rows += item.size()
+            self._pending_rows -= rows
+            self._writing = True
+            # Producers waiting on backpressure can proceed
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            rows = sum(item.size() for item in batch)
+            try:
+                self._write(batch)
+                self.written_rows += rows
+                self.batches += 1
+            except Exception as e:
+                self.dropped_rows += rows
+                self.last_error = str(e)
+                print(f"[ERROR] Ingest writer dropped {rows} rows: {e}")
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def _write(self, batch: List[IngestItem]):
+        """Commit a batch in one transaction, retrying when the database is busy."""
+        # Later writes of the same key win, as they would have row by row
+        timeseries: Dict[Tuple, tuple] = {}
+        soiling: Dict[Tuple, tuple] = {}
+        for item in batch:
+            for row in item.timeseries:
+                timeseries[(row[0], row[1], row[2][:10])] = row
+            for row in item.soiling:
+                soiling[(row[0], row[1])] = row
+
+        for attempt in range(INGEST_MAX_RETRIES):
+            try:
+                with write_lock, database.get_db():
+                    database.upsert_timeseries_rows(timeseries.values())
+                    database.upsert_soiling_rows(soiling.values())
+                    for item in batch:
+                        for panel_id, parameter, start_date, end_date, record_count in item.availability:
+                            database.update_data_availability(panel_id, parameter, start_date, end_date, record_count)
+                        for panel_ids, parameter, start_date, end_date in item.coverage:
+                            database.add_coverage(panel_ids, parameter, start_date, end_date)
+                return
+            except Exception as e:
+                if 'locked' not in str(e) or attempt == INGEST_MAX_RETRIES - 1:
+                    raise
+                print(f"[WARN] Ingest write busy, retrying ({attempt + 1}/{INGEST_MAX_RETRIES})")
+                time.sleep(0.5 * (attempt + 1))
+
+
+_queue: Optional[IngestQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_ingest_queue() -> IngestQueue:
+    """The process-wide ingest queue, started on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestQueue()
+    return _queue
+
+
+def shutdown_ingest(timeout: Optional[float] = INGEST_PUT_TIMEOUT_S):
+    """Commit everything queued and stop the writer (call on application shutdown)."""
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue is None:
+        return
+    pending = queue.status()['pending_rows']
+    if not queue.close(timeout):
+        print(f"[WARN] Ingest writer did not finish within {timeout}s")
+    elif pending:
+        print(f"[INFO] Flushed {pending} queued rows on shutdown")
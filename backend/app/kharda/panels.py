@@ -0,0 +1,201 @@
+"""
+Process-wide registry of Kharda panel geometries.
+
+The panel GeoJSON is parsed once and kept in memory, keyed by panel_id.
+Centroids and bounding boxes are precomputed at load time, and Earth Engine
+geometries are built lazily (they need an initialized EE client) and reused.
+The file is only re-read when its modification time changes.
+"""
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Any
+
+import ee
+
+# current file: backend/app/kharda/panels.py -> project root is 4 levels up
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+POLYGONS_PATH = PROJECT_ROOT / "asset" / "solar_panel_polygons.geojson"
+
+
+def _iter_outer_rings(geometry: Dict) -> List[List]:
+    """Return the outer ring(s) of a Polygon / MultiPolygon geometry."""
+    geom_type = geometry.get('type')
+    coords = geometry.get('coordinates') or []
+    if geom_type == 'Polygon':
+        return [coords[0]] if coords else []
+    if geom_type == 'MultiPolygon':
+        return [poly[0] for poly in coords if poly]
+    return []
+
+
+def _is_valid_geometry(geometry: Optional[Dict]) -> bool:
+    """Same validation the snapshot code applied before building EE features."""
+    if not geometry:
+        return False
+    if geometry.get('type') == 'Polygon':
+        coords = geometry.get('coordinates', [])
+        if coords and len(coords) > 0:
+            ring = coords[0]
+            if len(ring) < 3:
+                return False
+            if not all(len(coord) >= 2 for coord in ring):
+                return False
+    return True
+
+
+class PanelRecord:
+    """A single panel with precomputed centroid, bbox and a cached EE geometry."""
+
+    __slots__ = ('panel_id', 'feature', 'geometry', 'centroid', 'bbox', 'valid', '_ee_geometry')
+
+    def __init__(self, panel_id: int, feature: Dict):
+        self.panel_id = panel_id
+        self.feature = feature
+        self.geometry = feature.get('geometry')
+        self.valid = _is_valid_geometry(self.geometry)
+        self._ee_geometry = None
+
+        points = [
+            coord for ring in _iter_outer_rings(self.geometry or {})
+            for coord in ring if len(coord) >= 2
+        ]
+        if points:
+            lons = [float(coord[0]) for coord in points]
+            lats = [float(coord[1]) for coord in points]
+            # Vertex average, matching the centroid used by the dashboard
+            self.centroid: Optional[Tuple[float, float]] = (sum(lons) / len(lons), sum(lats) / len(lats))
+            self.bbox: Optional[Tuple[float, float, float, float]] = (min(lons), min(lats), max(lons), max(lats))
+        else:
+            self.centroid = None
+            self.bbox = None
+
+    @property
+    def ee_geometry(self):
+        """Lazily build and reuse the ee.Geometry for this panel."""
+        if self._ee_geometry is None:
+            self._ee_geometry = ee.Geometry(self.geometry)
+        return self._ee_geometry
+
+
+class PanelRegistry:
+    """In-memory index of panel polygons, reloaded when the source file changes."""
+
+    def __init__(self, path: Path = POLYGONS_PATH):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._mtime: Optional[float] = None
+        self._geojson: Dict[str, Any] = {}
+        self._panels: Dict[int, PanelRecord] = {}
+        self._ordered_ids: List[int] = []
+        self._feature_collection = None
+
+    def _ensure_loaded(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            raise FileNotFoundError(f"Polygons file not found at: {self.path}")
+
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(self.path, 'r') as f:
+                geojson = json.load(f)
+
+            panels = {}
+            ordered_ids = []
+            for feature in geojson.get('features', []):
+                panel_id = feature.get('properties', {}).get('panel_id')
+                if panel_id is None or feature.get('geometry') is None:
+                    continue
+                panels[panel_id] = PanelRecord(panel_id, feature)
+                ordered_ids.append(panel_id)
+
+            self._geojson = geojson
+            self._panels = panels
+            self._ordered_ids = ordered_ids
+            self._feature_collection = None
+            self._mtime = mtime
+            print(f"[INFO] Panel registry loaded {len(panels)} panels from {self.path}")
+
+    @property
+    def version(self) -> Optional[float]:
+        """Modification time of the loaded file; changes on every reload."""
+        self._ensure_loaded()
+        return self._mtime
+
+    @property
+    def geojson(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return self._geojson
+
+    def get(self, panel_id) -> Optional[PanelRecord]:
+        self._ensure_loaded()
+        return self._panels.get(panel_id)
+
+    def panel_ids(self) -> List[int]:
+        self._ensure_loaded()
+        return list(self._ordered_ids)
+
+    def records(self) -> List[PanelRecord]:
+        self._ensure_loaded()
+        return [self._panels[pid] for pid in self._ordered_ids]
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._panels)
+
+    def first_centroid(self) -> Optional[Tuple[float, float]]:
+        """(lon, lat) of the first panel in file order."""
+        self._ensure_loaded()
+        for pid in self._ordered_ids:
+            centroid = self._panels[pid].centroid
+            if centroid is not None:
+                return centroid
+        return None
+
+    def feature_collection(self):
+        """
+        Return (ee.FeatureCollection, panel_ids) over every valid panel.
+        The collection is built once per file version and reused.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if self._feature_collection is not None:
+                return self._feature_collection
+
+            features = []
+            panel_ids = []
+            for record in self.records():
+                if not record.valid:
+                    continue
+                try:
+                    ee_geom = record.ee_geometry
+                except Exception:
+                    continue
+                features.append(ee.Feature(ee_geom, {'panel_id': record.panel_id}))
+                panel_ids.append(record.panel_id)
+
+            if not features:
+                return None, []
+
+            self._feature_collection = (ee.FeatureCollection(features), panel_ids)
+            return self._feature_collection
+
+
+_registry: Optional[PanelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_panel_registry() -> PanelRegistry:
+    """Return the process-wide panel registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PanelRegistry()
+    return _registry
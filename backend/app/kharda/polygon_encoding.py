@@ -0,0 +1,252 @@
+"""
+Build step for the compact /polygons payload.
+
+Converts the panel GeoJSON into quantized, delta-encoded TopoJSON (one arc per
+ring, decodable with topojson-client's `feature()`), and writes gzip / brotli
+precompressed variants of both the TopoJSON and the original GeoJSON. Output
+files are named by a content hash of the source so they can be served as-is
+with a strong ETag.
+
+Usage (from backend/):
+    python -m app.kharda.polygon_encoding [--quantization 100000]
+"""
+import os
+import json
+import gzip
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional
+    brotli = None
+
+from app.kharda.panels import POLYGONS_PATH
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent.parent
+POLYGON_ASSETS_DIR = BACKEND_ROOT / "polygon_assets"
+MANIFEST_NAME = "manifest.json"
+DEFAULT_QUANTIZATION = int(os.getenv("POLYGON_QUANTIZATION", 100000))
+# Bump when the encoded layout changes so stale assets are rebuilt
+ENCODER_VERSION = 1
+
+GEOJSON_MEDIA_TYPE = "application/geo+json"
+TOPOJSON_MEDIA_TYPE = "application/topo+json"
+
+
+class _Quantizer:
+    def __init__(self, bbox: Tuple[float, float, float, float], quantization: int):
+        min_x, min_y, max_x, max_y = bbox
+        self.translate = [min_x, min_y]
+        kx = (max_x - min_x) / (quantization - 1) if max_x > min_x else 1
+        ky = (max_y - min_y) / (quantization - 1) if max_y > min_y else 1
+        self.scale = [kx, ky]
+
+    def point(self, coord) -> List[int]:
+        return [
+            int(round((coord[0] - self.translate[0]) / self.scale[0])),
+            int(round((coord[1] - self.translate[1]) / self.scale[1])),
+        ]
+
+
+def _collect_bbox(features) -> Tuple[float, float, float, float]:
+    xs, ys = [], []
+
+    def walk(coords):
+        if coords and isinstance(coords[0], (int, float)):
+            xs.append(coords[0])
+            ys.append(coords[1])
+            return
+        for item in coords:
+            walk(item)
+
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        walk(geometry.get('coordinates') or [])
+    if not xs:
+        return (0.0, 0.0, 0.0, 0.0)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def geojson_to_topojson(geojson: Dict, quantization: int = DEFAULT_QUANTIZATION, object_name: str = "panels") -> Dict:
+    """Encode a FeatureCollection as quantized, delta-encoded TopoJSON."""
+    features = geojson.get('features', [])
+    bbox = _collect_bbox(features)
+    quantizer = _Quantizer(bbox, quantization)
+    arcs: List[List[List[int]]] = []
+
+    def encode_arc(line) -> int:
+        arc = []
+        prev_x = prev_y = 0
+        for index, coord in enumerate(line):
+            x, y = quantizer.point(coord)
+            # Drop points that collapse onto their predecessor after quantization
+            if index > 0 and x == prev_x and y == prev_y:
+                continue
+            arc.append([x - prev_x, y - prev_y] if arc else [x, y])
+            prev_x, prev_y = x, y
+        arcs.append(arc)
+        return len(arcs) - 1
+
+    geometries = []
+    for feature in features:
+        geometry = feature.get('geometry')
+        if not geometry:
+            continue
+        geom_type = geometry.get('type')
+        coords = geometry.get('coordinates') or []
+        encoded = {'type': geom_type}
+        if geom_type == 'Point':
+            encoded['coordinates'] = quantizer.point(coords)
+        elif geom_type == 'MultiPoint':
+            encoded['coordinates'] = [quantizer.point(c) for c in coords]
+        elif geom_type == 'LineString':
+            encoded['arcs'] = [encode_arc(coords)]
+        elif geom_type in ('MultiLineString', 'Polygon'):
+            encoded['arcs'] = [[encode_arc(line)] for line in coords]
+        elif geom_type == 'MultiPolygon':
+            encoded['arcs'] = [[[encode_arc(ring)] for ring in poly] for poly in coords]
+        else:
+            continue
+        if feature.get('id') is not None:
+            encoded['id'] = feature['id']
+        if feature.get('properties'):
+            encoded['properties'] = feature['properties']
+        geometries.append(encoded)
+
+    return {
+        'type': 'Topology',
+        'bbox': list(bbox),
+        'transform': {'scale': quantizer.scale, 'translate': quantizer.translate},
+        'objects': {object_name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': arcs,
+    }
+
+
+def _write_variants(out_dir: Path, stem: str, raw: bytes) -> Dict[str, Dict]:
+    """Write identity / gzip / brotli files for `raw` and describe them."""
+    variants = {'identity': raw, 'gzip': gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(raw, quality=11)
+    suffixes = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+
+    written = {}
+    for encoding, data in variants.items():
+        filename = f"{stem}{suffixes[encoding]}"
+        tmp_path = out_dir / f".{filename}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, out_dir / filename)
+        written[encoding] = {'file': filename, 'size': len(data)}
+    return written
+
+
+def source_digest(source: Path = POLYGONS_PATH, quantization: int = DEFAULT_QUANTIZATION) -> str:
+    hasher = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            hasher.update(chunk)
+    hasher.update(f"|v{ENCODER_VERSION}|q{quantization}".encode('utf-8'))
+    return hasher.hexdigest()[:16]
+
+
+def build_polygon_assets(source: Path = POLYGONS_PATH, out_dir: Path = POLYGON_ASSETS_DIR,
+                         quantization: int = DEFAULT_QUANTIZATION) -> Dict:
+    """Encode the panel GeoJSON and write all precompressed variants plus a manifest."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    source_mtime = os.path.getmtime(source)
+    digest = source_digest(source, quantization)
+    with open(source, 'rb') as f:
+        geojson_raw = f.read()
+    geojson = json.loads(geojson_raw)
+
+    topojson = geojson_to_topojson(geojson, quantization)
+    topojson_raw = json.dumps(topojson, separators=(',', ':')).encode('utf-8')
+
+    manifest = {
+        'hash': digest,
+        'source_mtime': source_mtime,
+        'quantization': quantization,
+        'encoder_version': ENCODER_VERSION,
+        'formats': {
+            'geojson': {
+                'media_type': GEOJSON_MEDIA_TYPE,
+                'variants': _write_variants(out_dir, f"panels.{digest}.geojson", geojson_raw),
+            },
+            'topojson': {
+                'media_type': TOPOJSON_MEDIA_TYPE,
+                'variants': _write_variants(out_dir, f"panels.{digest}.topojson", topojson_raw),
+            },
+        },
+    }
+
+    tmp_manifest = out_dir / f".{MANIFEST_NAME}.tmp"
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, out_dir / MANIFEST_NAME)
+
+    # Remove assets from previous source versions
+    for stale in out_dir.glob("panels.*"):
+        if f".{digest}." not in stale.name:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+
+    print(f"[INFO] Built polygon assets {digest}: "
+          f"geojson {len(geojson_raw)} B -> topojson {len(topojson_raw)} B")
+    return manifest
+
+
+_manifest: Optional[Dict] = None
+_manifest_lock = threading.Lock()
+
+
+def get_polygon_manifest(source: Path = POLYGONS_PATH, out_dir: Path = POLYGON_ASSETS_DIR) -> Dict:
+    """
+    Return the manifest for the current polygons file, building the assets if
+    they are missing or the source changed since the last build.
+    """
+    global _manifest
+    source_mtime = os.path.getmtime(source)
+    manifest = _manifest
+    if manifest and manifest.get('source_mtime') == source_mtime:
+        return manifest
+
+    with _manifest_lock:
+        manifest = _manifest
+        if manifest and manifest.get('source_mtime') == source_mtime:
+            return manifest
+
+        manifest_path = out_dir / MANIFEST_NAME
+        manifest = None
+        if manifest_path.exists():
+            try:
+                with open(manifest_path, 'r') as f:
+                    manifest = json.load(f)
+            except Exception:
+                manifest = None
+        if (
+            not manifest
+            or manifest.get('source_mtime') != source_mtime
+            or manifest.get('encoder_version') != ENCODER_VERSION
+        ):
+            manifest = build_polygon_assets(source, out_dir)
+        _manifest = manifest
+        return manifest
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build compact /polygons assets')
+    parser.add_argument('--quantization', type=int, default=DEFAULT_QUANTIZATION,
+                        help=f'Quantization grid size (default: {DEFAULT_QUANTIZATION})')
+    args = parser.parse_args()
+
+    result = build_polygon_assets(quantization=args.quantization)
+    for fmt, info in result['formats'].items():
+        sizes = ', '.join(f"{enc}={v['size']}" for enc, v in info['variants'].items())
+        print(f"  {fmt}: {sizes}")
@@ -0,0 +1,169 @@
+"""
+Background pre-warming of the responses the dashboard asks for most.
+
+Nearly all traffic asks for a few rolling windows (last 7/30/90 days, the
+current month). The scheduler wakes every PREWARM_INTERVAL_S, asks each
+target when its cached copy expires and recomputes those that are missing
+or expire within PREWARM_LEAD_S, so users rarely pay for a cold start or
+a TTL expiry. Refreshes start after a random delay of up to PREWARM_JITTER_S
+(spreading upstream load and letting several workers notice each other's
+results in the shared snapshot store) and at most PREWARM_CONCURRENCY run
+at once.
+
+Targets are supplied by the caller (see routes.build_prewarm_targets).
+"""
+import os
+import time
+import random
+import asyncio
+from datetime import date, timedelta
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "1").lower() not in ("0", "false", "no")
+# Rolling windows ending today: "<n>d" (last n days) or "month" (month to date)
+PREWARM_WINDOWS = [w.strip() for w in os.getenv("PREWARM_WINDOWS", "7d,30d,90d,month").split(",") if w.strip()]
+# Comma-separated parameters; empty means every snapshot parameter
+PREWARM_PARAMETERS = [p.strip().upper() for p in os.getenv("PREWARM_PARAMETERS", "").split(",") if p.strip()]
+PREWARM_INTERVAL_S = float(os.getenv("PREWARM_INTERVAL_S", 5 * 60))
+PREWARM_LEAD_S = float(os.getenv("PREWARM_LEAD_S", 15 * 60))
+PREWARM_JITTER_S = float(os.getenv("PREWARM_JITTER_S", 60))
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", 2))
+PREWARM_STARTUP_DELAY_S = float(os.getenv("PREWARM_STARTUP_DELAY_S", 30))
+
+
+def window_dates(window: str, today: Optional[date] = None) -> Tuple[str, str]:
+    """(start_date, end_date) of a rolling window such as '30d' or 'month'."""
+    today = today or date.today()
+    if window == 'month':
+        start = today.replace(day=1)
+    elif window.endswith('d') and window[:-1].isdigit():
+        start = today - timedelta(days=int(window[:-1]))
+    else:
+        raise ValueError(f"Unknown prewarm window {window!r}; use '<n>d' or 'month'")
+    return start.isoformat(), today.isoformat()
+
+
+class PrewarmTarget:
+    """
+    One cached response to keep warm. `expires_at` returns when the cached
+    copy expires (None if there is none); `refresh` recomputes and caches it.
+    Both are awaitables so they never block the event loop.
+    """
+    __slots__ = ('name', 'expires_at', 'refresh')
+
+    def __init__(self, name: str, expires_at: Callable[[], Awaitable[Optional[float]]],
+                 refresh: Callable[[], Awaitable[Any]]):
+        self.name = name
+        self.expires_at = expires_at
+        self.refresh = refresh
+
+
+class PrewarmScheduler:
+    """Periodically refreshes the targets from `build_targets` before they expire."""
+
+    def __init__(self, build_targets: Callable[[], List[PrewarmTarget]], interval: float = PREWARM_INTERVAL_S,
+                 lead: float = PREWARM_LEAD_S, jitter: float = PREWARM_JITTER_S,
+                 concurrency: int = PREWARM_CONCURRENCY, startup_delay: float = PREWARM_STARTUP_DELAY_S):
+        self.build_targets = build_targets
+        self.interval = interval
+        self.lead = lead
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.startup_delay = startup_delay
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[str, float] = {}
+        self._targets: Dict[str, Dict[str, Any]] = {}
+        self.runs = 0
+        self.last_run_at: Optional[float] = None
+        self.next_run_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Start the loop on the running event loop (call from the startup hook)."""
+        if not PREWARM_ENABLED:
+            print("[INFO] Snapshot pre-warming disabled (PREWARM_ENABLED=0)")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self):
+        self.next_run_at = time.time() + self.startup_delay
+        await asyncio.sleep(self.startup_delay)
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[ERROR] Pre-warm run failed: {e}")
+            self.next_run_at = time.time() + self.interval
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Refresh every target that is missing or expires within `lead`; returns how many were refreshed."""
+        self.runs += 1
+        self.last_run_at = time.time()
+        targets = self.build_targets()
+        due = []
+        for target in targets:
+            if target.name in self._running:
+                continue
+            state = self._targets.setdefault(target.name, {'refreshes': 0, 'failures': 0})
+            try:
+                expires_at = await target.expires_at()
+            except Exception as e:
+                print(f"[WARN] Pre-warm check of {target.name} failed: {e}")
+                expires_at = None
+            state['expires_at'] = expires_at
+            if expires_at is None or expires_at - time.time() < self.lead:
+                due.append(target)
+        if due:
+            print(f"[INFO] Pre-warming {len(due)} of {len(targets)} targets")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        outcomes = await asyncio.gather(*[self._refresh(target, semaphore) for target in due])
+        return sum(outcomes)
+
+    async def _refresh(self, target: PrewarmTarget, semaphore: asyncio.Semaphore) -> bool:
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        state = self._targets[target.name]
+        async with semaphore:
+            started = time.time()
+            self._running[target.name] = started
+            try:
+                await target.refresh()
+                state['refreshes'] += 1
+                state['last_refresh_at'] = time.time()
+                state['last_duration_s'] = round(time.time() - started, 3)
+                state.pop('last_error', None)
+                return True
+            except Exception as e:
+                state['failures'] += 1
+                state['last_error'] = str(e) or type(e).__name__
+                print(f"[WARN] Pre-warm of {target.name} failed: {state['last_error']}")
+                return False
+            finally:
+                self._running.pop(target.name, None)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'enabled': PREWARM_ENABLED,
+            'running': self._task is not None and not self._task.done(),
+            'windows': PREWARM_WINDOWS,
+            'interval_s': self.interval,
+            'lead_s': self.lead,
+            'jitter_s': self.jitter,
+            'concurrency': self.concurrency,
+            'runs': self.runs,
+            'last_run_at': self.last_run_at,
+            'next_run_at': self.next_run_at,
+            'last_error': self.last_error,
+            'in_progress': sorted(self._running),
+            'targets': self._targets,
+        }
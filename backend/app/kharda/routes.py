@@ -4,44 +4,47 @@ import math
 import statistics
 import time
 import hashlib
+import asyncio
+from functools import partial
 from pathlib import Path
 import ee
 import httpx
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
 from app.kharda.services import (
-    get_soiling_data as calculate_soiling_data,
-    get_lst_data,
-    get_swir_data,
-    get_ndvi_data,
-    get_ndwi_data,
-    get_visible_mean_data
+    get_reduced_timeseries,
+    get_reduced_soiling,
+    TIMESERIES_SOURCES
+)
+from app.kharda.panels import get_panel_registry
+from app.kharda.spatial import get_panel_spatial_index
+from app.kharda.blocks import get_panel_blocks, LEVEL_PANEL, LEVEL_BLOCK, REDUCTION_LEVELS
+from app.kharda.polygon_encoding import get_polygon_manifest, POLYGON_ASSETS_DIR
+from app.kharda.tiles import build_panel_tile, panel_tile_cache, MAX_TILE_ZOOM
+from app.kharda.snapshot_cache import SnapshotEntry, snapshot_memory_cache
+from app.kharda.snapshot_store import get_snapshot_store
+from app.kharda.prewarm import (
+    PrewarmScheduler, PrewarmTarget, window_dates, PREWARM_WINDOWS, PREWARM_PARAMETERS
+)
+from app.common.singleflight import SingleFlight
+from app.kharda.export import (
+    iter_export_bytes, EXPORT_DATASETS, EXPORT_FORMATS, MEDIA_TYPES, FILE_EXTENSIONS, pa as pyarrow_module
 )
 
 
 try:
-    from app.kharda.database import (
-        get_data_statistics, 
-        get_timeseries_data, 
-        get_db,
-        get_monthly_lst,
-        check_data_availability,
-        get_latest_soiling_record,
-    )
-    
-    try:
-        from app.kharda.database import insert_timeseries_data
-    except ImportError:
-        print("[WARN] Could not import insert_timeseries_data")
-        insert_timeseries_data = None
+    from app.kharda.database import missing_ranges, get_coverage_bulk, get_panel_reductions
+    # Reads from async routes go through the DB thread pool; writes go
+    # through the write-behind ingest queue
+    from app.kharda import db_async
+    from app.kharda.ingest import get_ingest_queue
 
     DB_AVAILABLE = True
 except ImportError as e:
     DB_AVAILABLE = False
-    insert_timeseries_data = None
     print(f"Warning: Database module not available. API will only use GEE. Error: {e}")
 
 router = APIRouter()
@@ -60,10 +63,24 @@ if not os.path.exists(POLYGONS_PATH_STR):
 else:
     print(f"Polygons file loaded from: {POLYGONS_PATH_STR}")
 
-# Cache directory in backend root
-BACKEND_ROOT = BASE_DIR_KHARDA.parent.parent
-PANEL_SNAPSHOT_CACHE_DIR = BACKEND_ROOT / "panel_snapshots"
+# Snapshots are cached in memory and in the compressed store under backend/panel_snapshots
 DEFAULT_SNAPSHOT_CACHE_TTL = int(os.getenv("PANEL_SNAPSHOT_CACHE_TTL", 6 * 60 * 60))
+# Minimum gap between background refresh attempts of a snapshot whose refresh failed
+SNAPSHOT_REFRESH_RETRY_S = int(os.getenv("SNAPSHOT_REFRESH_RETRY_S", 60))
+# /api/all-panels-lst responses are cached in memory (and kept warm by the pre-warmer)
+ALL_PANELS_LST_CACHE_TTL = int(os.getenv("ALL_PANELS_LST_CACHE_TTL", 30 * 60))
+
+# Identical snapshot computations / upstream HTTP calls in flight are shared
+snapshot_flights = SingleFlight("snapshot")
+http_flights = SingleFlight("http")
+
+# Days before today that are never marked as covered; late-arriving scenes
+# for that window are refetched on the next request
+COVERAGE_SETTLE_DAYS = int(os.getenv("COVERAGE_SETTLE_DAYS", 5))
+
+# Streaming /api/panel-data: panels per GEE reduction and reductions in flight
+STREAM_GEE_BATCH_SIZE = int(os.getenv("STREAM_GEE_BATCH_SIZE", 25))
+STREAM_GEE_CONCURRENCY = int(os.getenv("STREAM_GEE_CONCURRENCY", 4))
 
 PANEL_PARAMETER_CONFIG = {
     'LST': {'unit': '°C', 'precision': 2},
@@ -87,13 +104,23 @@ class PanelQuery(BaseModel):
     parameter: str  # "LST", "SWIR", "SOILING", "NDVI", "NDWI", "VISIBLE"
     start_date: str
     end_date: str
+    level: str = LEVEL_PANEL  # "panel", "block" or "farm"
 
 class TimeRangeQuery(BaseModel):
     start_date: str
     end_date: str
 
+class PanelAreaQuery(BaseModel):
+    geometry: Dict  # GeoJSON Polygon or MultiPolygon in lon/lat
+    predicate: str = "intersects"  # panel "intersects", is "within" or "contains" the area
+
 @router.post("/api/panel-data")
-async def get_panel_data(query: PanelQuery):
+async def get_panel_data(query: PanelQuery, stream: bool = False):
+    """
+    Per-panel time series (or soiling summary) for a date range. With
+    `?stream=true` results are sent as NDJSON lines as soon as each panel is
+    ready instead of one JSON document.
+    """
     if not DB_AVAILABLE:
         raise HTTPException(status_code=503, detail="Database not available")
 
@@ -105,206 +132,388 @@ async def get_panel_data(query: PanelQuery):
         query.start_date,
         query.end_date
     )
+    level = normalize_level(query.level)
 
     print(
         f"[INFO] /api/panel-data request "
         f"panel_ids={query.panel_ids} "
         f"parameter={parameter} "
-        f"start={start_date} end={end_date}"
+        f"start={start_date} end={end_date} level={level}"
     )
 
-    results = []
-    for panel_id in query.panel_ids:
-        panel_result = {}
+    if level != LEVEL_PANEL:
+        return {"results": await get_unit_data(query.panel_ids, parameter, level, start_date, end_date)}
 
+    # One bulk DB read for every requested panel instead of a query per panel
+    unique_ids = list(dict.fromkeys(query.panel_ids))
+    db_soiling = {}
+    db_timeseries = {}
+    gaps_by_panel = {}
+    if parameter == "SOILING":
+        try:
+            db_soiling = await db_async.get_latest_soiling_records(query.panel_ids)
+        except Exception as e:
+            print(f"[ERROR] Error fetching soiling records from database: {e}")
+        db_hits = db_soiling
+    else:
+        coverage = {}
+        try:
+            print(f"[DEBUG] Fetching DB: panels={len(query.panel_ids)}, param={parameter}, start={start_date}, end={end_date}")
+            db_timeseries, coverage = await asyncio.gather(
+                db_async.get_timeseries_data_bulk(query.panel_ids, parameter, start_date, end_date),
+                db_async.get_coverage_bulk(query.panel_ids, parameter),
+            )
+            print(f"[DEBUG] DB returned records for {len(db_timeseries)} panels")
+        except Exception as e:
+            print(f"[ERROR] Error fetching timeseries data from database: {e}")
+        # A panel is served from the DB only when the whole range was fetched before
+        gaps_by_panel = {
+            pid: missing_ranges(coverage.get(pid, []), start_date, end_date)
+            for pid in unique_ids
+        }
+        db_hits = {pid: db_timeseries.get(pid, []) for pid in unique_ids if not gaps_by_panel[pid]}
+
+    pending_ids = [pid for pid in unique_ids if pid not in db_hits]
+
+    async def resolve_pending(panel_ids):
         if parameter == "SOILING":
-            record = None
-            try:
-                record = get_latest_soiling_record(panel_id)
-            except Exception as e:
-                print(f"[ERROR] Error fetching soiling record from database for panel {panel_id}: {e}")
-
-            if record:
-                panel_result.update({
-                    "parameter": "SOILING",
-                    **record,
-                    "source": "database"
-                })
-            else:
-                gee_result = None
-
-                try:
-                    with open(POLYGONS_PATH_STR, "r") as f:
-                        geojson = json.load(f)
-
-                    feature = next(
-                        f for f in geojson["features"]
-                        if f["properties"]["panel_id"] == panel_id
-                    )
-
-                    geometry = ee.Geometry(feature["geometry"])
-
-                    gee_result = await calculate_soiling_data(
-                        geometry,
-                        start_date,
-                        end_date
-                    )
-
-                except Exception as e:
-                    print(f"[ERROR] Soiling calculation via GEE failed for panel {panel_id}: {e}")
-
-                if gee_result:
-                    panel_result.update({
-                        "parameter": "SOILING",
-                        **gee_result,
-                        "source": "gee"
-                    })
-                else:
-                    panel_result.update({
-                        "parameter": "SOILING",
-                        "baseline_si": 1.0,
-                        "current_si": 1.0,
-                        "soiling_drop_percent": 0.0,
-                        "unit": PANEL_PARAMETER_CONFIG["SOILING"]["unit"],
-                        "status": "no_data",
-                        "source": "fallback"
-                    })
-
-        # ===================== OTHER PARAMETERS =====================
-        else:
-            timeseries = []
-            if DB_AVAILABLE:
-                try:
-                    print(f"[DEBUG] Fetching DB: panel={panel_id}, param={parameter}, start={start_date}, end={end_date}")
-                    timeseries = get_timeseries_data(
-                        panel_id,
-                        parameter,
-                        start_date,
-                        end_date
-                    )
-                    print(f"[DEBUG] DB returned {len(timeseries)} records")
-                except Exception as e:
-                    print(f"[ERROR] Error fetching timeseries data from database for panel {panel_id}: {e}")
-            else:
-                print("[WARN] DB_AVAILABLE is False, skipping DB fetch")
-            
-            # If no data in DB, try GEE
-            if not timeseries:
-                print(f"[INFO] No data in DB for {parameter} (panel {panel_id}). Fetching from GEE...")
-                try:
-                    # Get geometry
-                    with open(POLYGONS_PATH_STR, "r") as f:
-                        geojson = json.load(f)
-                    feature = next(
-                        f for f in geojson["features"]
-                        if f["properties"]["panel_id"] == panel_id
-                    )
-                    geometry = ee.Geometry(feature["geometry"])
-
-                    # Call appropriate service
-                    gee_data = None
-                    if parameter == 'LST':
-                        gee_data = await get_lst_data(geometry, start_date, end_date)
-                    elif parameter == 'SWIR':
-                        gee_data = await get_swir_data(geometry, start_date, end_date)
-                    elif parameter == 'NDVI':
-                        gee_data = await get_ndvi_data(geometry, start_date, end_date)
-                    elif parameter == 'NDWI':
-                        gee_data = await get_ndwi_data(geometry, start_date, end_date)
-                    elif parameter == 'VISIBLE':
-                        gee_data = await get_visible_mean_data(geometry, start_date, end_date)
-                    
-                    if gee_data and gee_data.get('timeseries'):
-                        timeseries = gee_data['timeseries']
-                        # Cache to DB
-                        if DB_AVAILABLE and insert_timeseries_data:
-                            print(f"[INFO] Caching {len(timeseries)} records to DB for {parameter} (panel {panel_id})")
-                            for record in timeseries:
-                                try:
-                                    insert_timeseries_data(
-                                        panel_id,
-                                        parameter,
-                                        record['date'],
-                                        record['value'],
-                                        record['unit']
-                                    )
-                                except Exception as db_err:
-                                    print(f"[WARN] Failed to cache record: {db_err}")
-                        elif DB_AVAILABLE and not insert_timeseries_data:
-                            print(f"[WARN] Skipping cache: insert_timeseries_data not available")
-                except Exception as gee_err:
-                    print(f"[ERROR] GEE fetch failed for {parameter} (panel {panel_id}): {gee_err}")
-
-            if not timeseries:
-                panel_result.update({
-                    "error": "No data found for requested range"
-                })
-                results.append(panel_result)
-                continue
+            return await fetch_panels_from_gee(panel_ids, parameter, start_date, end_date)
+        return await fill_timeseries_gaps(panel_ids, parameter, gaps_by_panel, db_timeseries)
 
-            config = PANEL_PARAMETER_CONFIG.get(parameter, {})
-            precision = config.get("precision", 2)
-            unit = timeseries[0]["unit"]
+    if stream:
+        return StreamingResponse(
+            stream_panel_results(query.panel_ids, parameter, db_hits, pending_ids, resolve_pending),
+            media_type="application/x-ndjson",
+        )
 
-            try:
-                current_value = round(float(timeseries[-1]["value"]), precision)
-            except Exception:
-                current_value = None
-
-            rounded_series = []
-            for entry in timeseries:
-                try:
-                    value = round(float(entry["value"]), precision)
-                except Exception:
-                    value = None
-
-                rounded_series.append({
-                    "date": entry["date"],
-                    "value": value,
-                    "unit": entry["unit"]
-                })
+    # Panels not fully in the DB are resolved together in batched GEE reductions
+    gee_hits = await resolve_pending(pending_ids) if pending_ids else {}
+
+    results = [
+        build_panel_result(parameter, db_hits.get(panel_id), gee_hits.get(panel_id))
+        for panel_id in query.panel_ids
+    ]
+
+    return {"results": results}
 
+
+def build_panel_result(parameter: str, db_value, gee_value) -> Dict:
+    """
+    Shape one /api/panel-data result from the DB hit (soiling record or
+    timeseries) and/or the GEE hit for a panel; the DB wins when both exist.
+    """
+    panel_result = {}
+
+    if parameter == "SOILING":
+        if db_value:
             panel_result.update({
-                "parameter": parameter,
-                "current_value": current_value,
-                "unit": unit,
-                "timeseries": rounded_series,
+                "parameter": "SOILING",
+                **db_value,
+                "source": "database"
             })
+        elif gee_value:
+            panel_result.update({
+                "parameter": "SOILING",
+                **gee_value,
+                "source": "gee"
+            })
+        else:
+            panel_result.update({
+                "parameter": "SOILING",
+                "baseline_si": 1.0,
+                "current_si": 1.0,
+                "soiling_drop_percent": 0.0,
+                "unit": PANEL_PARAMETER_CONFIG["SOILING"]["unit"],
+                "status": "no_data",
+                "source": "fallback"
+            })
+        return panel_result
 
-        results.append(panel_result)
+    # ===================== OTHER PARAMETERS =====================
+    timeseries = db_value or gee_value or []
 
-    return {"results": results}
+    if not timeseries:
+        panel_result.update({
+            "error": "No data found for requested range"
+        })
+        return panel_result
 
+    config = PANEL_PARAMETER_CONFIG.get(parameter, {})
+    precision = config.get("precision", 2)
+    unit = timeseries[0]["unit"]
 
-def ensure_snapshot_cache_dir():
-    PANEL_SNAPSHOT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        current_value = round(float(timeseries[-1]["value"]), precision)
+    except Exception:
+        current_value = None
 
-def build_snapshot_cache_path(parameter: str, start_date: str, end_date: str) -> Path:
-    normalized = f"{parameter.upper()}|{start_date}|{end_date}"
-    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
-    return PANEL_SNAPSHOT_CACHE_DIR / f"{parameter.lower()}_{digest}.json"
+    rounded_series = []
+    for entry in timeseries:
+        try:
+            value = round(float(entry["value"]), precision)
+        except Exception:
+            value = None
 
-def load_cached_snapshot(path: Path):
-    if not path.exists():
-        return None
+        rounded_series.append({
+            "date": entry["date"],
+            "value": value,
+            "unit": entry["unit"]
+        })
+
+    panel_result.update({
+        "parameter": parameter,
+        "current_value": current_value,
+        "unit": unit,
+        "timeseries": rounded_series,
+    })
+    return panel_result
+
+
+async def stream_panel_results(panel_ids: List[int], parameter: str, db_hits: Dict,
+                               pending_ids: List[int], resolve_pending):
+    """
+    NDJSON stream of {"panel_id", ...result} lines: DB-backed panels first,
+    then GEE-backed panels batch by batch as `resolve_pending(batch)` completes.
+    """
+    for panel_id in dict.fromkeys(panel_ids):
+        if panel_id in db_hits:
+            line = {"panel_id": panel_id, **build_panel_result(parameter, db_hits[panel_id], None)}
+            yield json.dumps(line) + "\n"
+
+    if not pending_ids:
+        return
+
+    semaphore = asyncio.Semaphore(STREAM_GEE_CONCURRENCY)
+
+    async def fetch_batch(batch):
+        async with semaphore:
+            hits = await resolve_pending(batch)
+        return batch, hits
+
+    batches = [
+        pending_ids[i:i + STREAM_GEE_BATCH_SIZE]
+        for i in range(0, len(pending_ids), STREAM_GEE_BATCH_SIZE)
+    ]
+    for completed in asyncio.as_completed([fetch_batch(batch) for batch in batches]):
+        batch, hits = await completed
+        for panel_id in batch:
+            line = {"panel_id": panel_id, **build_panel_result(parameter, None, hits.get(panel_id))}
+            yield json.dumps(line) + "\n"
+
+
+async def fill_timeseries_gaps(panel_ids: List[int], parameter: str, gaps_by_panel: Dict,
+                               db_timeseries: Dict) -> Dict[int, List[Dict]]:
+    """
+    Fetch only the uncovered sub-ranges of each panel from GEE (panels sharing
+    the same gaps are reduced together), cache the rows, record the new
+    coverage and return the DB rows merged with the fetched ones.
+    """
+    groups: Dict[tuple, List[int]] = {}
+    for panel_id in panel_ids:
+        groups.setdefault(tuple(gaps_by_panel.get(panel_id, ())), []).append(panel_id)
+    jobs = [(group_ids, gap_start, gap_end) for gaps, group_ids in groups.items() for gap_start, gap_end in gaps]
+    print(f"[INFO] Filling {len(jobs)} GEE gap(s) for {parameter} across {len(panel_ids)} panels")
+
+    outcomes = await asyncio.gather(
+        *[reduce_panels_on_gee(group_ids, parameter, gap_start, gap_end) for group_ids, gap_start, gap_end in jobs],
+        return_exceptions=True,
+    )
+
+    merged = {panel_id: {row['date']: row for row in db_timeseries.get(panel_id, [])} for panel_id in panel_ids}
+    fetched_rows: Dict[int, List[Dict]] = {}
+    fetched_ranges = []
+    for (group_ids, gap_start, gap_end), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"[ERROR] GEE gap fetch {gap_start}..{gap_end} failed for {parameter}: {outcome}")
+            continue
+        for panel_id, timeseries in outcome.items():
+            fetched_rows.setdefault(panel_id, []).extend(timeseries)
+            for row in timeseries:
+                merged.setdefault(panel_id, {})[row['date']] = row
+        fetched_ranges.append((group_ids, gap_start, gap_end))
+
+    await queue_timeseries_write(parameter, fetched_rows, fetched_ranges)
+
+    return {
+        panel_id: [by_date[date] for date in sorted(by_date)]
+        for panel_id, by_date in merged.items()
+    }
+
+
+def settled_coverage(parameter: str, fetched_ranges) -> List[tuple]:
+    """
+    Coverage rows (panel_ids, parameter, start, end) for fetched ranges. Recent
+    days are left open so scenes that are still being ingested upstream are
+    picked up by a later request.
+    """
+    settled_end = (datetime.utcnow() - timedelta(days=COVERAGE_SETTLE_DAYS)).strftime('%Y-%m-%d')
+    coverage = []
+    for panel_ids, start_date, end_date in fetched_ranges:
+        end_date = min(end_date, settled_end)
+        if start_date < end_date:
+            coverage.append((list(panel_ids), parameter, start_date, end_date))
+    return coverage
+
+
+async def queue_timeseries_write(parameter: str, series_by_panel: Dict[int, List[Dict]], fetched_ranges):
+    """Hand fetched rows and their coverage to the ingest queue; the request does not wait for the write."""
+    if not DB_AVAILABLE:
+        return
+    rows = [
+        (panel_id, parameter, record['date'], record['value'], record['unit'])
+        for panel_id, timeseries in series_by_panel.items()
+        for record in timeseries
+    ]
+    coverage = settled_coverage(parameter, fetched_ranges)
+    if not rows and not coverage:
+        return
+    if await get_ingest_queue().submit(timeseries=rows, coverage=coverage):
+        print(f"[INFO] Queued {len(rows)} records for DB for {parameter} ({len(series_by_panel)} panels)")
+
+
+async def fetch_panels_from_gee(panel_ids: List[int], parameter: str, start_date: str, end_date: str) -> Dict:
+    """
+    Fetch `parameter` for every panel in `panel_ids` with a single per-image
+    reduceRegions over one FeatureCollection, then split the rows back per panel.
+    Returns {panel_id: timeseries list} or, for SOILING, {panel_id: soiling summary};
+    GEE errors are logged and yield {}.
+    """
+    print(f"[INFO] No data in DB for {parameter} ({len(panel_ids)} panels). Fetching from GEE in one batch...")
     try:
-        with open(path, 'r') as cache_file:
-            payload = json.load(cache_file)
-    except Exception:
-        return None
-    timestamp = payload.get('generated_at_ts')
-    ttl = payload.get('cache_ttl', DEFAULT_SNAPSHOT_CACHE_TTL)
-    if timestamp and (time.time() - timestamp) > ttl:
-        return None
-    return payload
+        return await reduce_panels_on_gee(panel_ids, parameter, start_date, end_date)
+    except Exception as gee_err:
+        print(f"[ERROR] GEE batch fetch failed for {parameter}: {gee_err}")
+        return {}
+
+
+async def reduce_panels_on_gee(panel_ids: List[int], parameter: str, start_date: str, end_date: str) -> Dict:
+    """fetch_panels_from_gee without the error handling; GEE failures propagate."""
+    registry = get_panel_registry()
+    features = []
+    for panel_id in panel_ids:
+        record = registry.get(panel_id)
+        if record is None or not record.valid:
+            print(f"[WARN] Panel {panel_id} not found in polygons")
+            continue
+        features.append(ee.Feature(record.ee_geometry, {'panel_id': panel_id}))
+    if not features:
+        return {}
+    panels_fc = ee.FeatureCollection(features)
+
+    if parameter == "SOILING":
+        fetched = await get_reduced_soiling(panels_fc, start_date, end_date, key=tuple(panel_ids))
+    else:
+        fetched = await get_reduced_timeseries(parameter, panels_fc, start_date, end_date, key=tuple(panel_ids))
+
+    # EE hands numeric properties back as JSON numbers; key by the int panel id
+    return {
+        int(panel_id) if isinstance(panel_id, float) and panel_id.is_integer() else panel_id: value
+        for panel_id, value in fetched.items()
+    }
+
+
+async def get_unit_data(panel_ids: List[int], parameter: str, level: str, start_date: str, end_date: str):
+    """Time series for the blocks containing `panel_ids` (or the whole farm), one GEE reduction per request."""
+    blocks = get_panel_blocks()
+    units = blocks.units_for_panels(level, panel_ids)
+    if not units:
+        raise HTTPException(status_code=404, detail=f"No {level} found for the requested panels")
+
+    try:
+        unit_fc, _ = blocks.feature_collection(level)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building {level} geometries: {str(e)}")
+    if unit_fc is None:
+        raise HTTPException(status_code=500, detail=f"No {level} geometries available.")
+    if level == LEVEL_BLOCK:
+        unit_fc = unit_fc.filter(ee.Filter.inList('panel_id', list(units.keys())))
+
+    results = []
+    if parameter == "SOILING":
+        soiling_by_unit = {}
+        try:
+            soiling_by_unit = await get_reduced_soiling(unit_fc, start_date, end_date, key=(level, tuple(units)))
+        except Exception as e:
+            print(f"[ERROR] Soiling calculation via GEE failed for {level}: {e}")
+        for unit_id, members in units.items():
+            unit_result = {"unit_id": unit_id, "level": level, "panel_ids": members}
+            if unit_id in soiling_by_unit:
+                unit_result.update({"parameter": "SOILING", **soiling_by_unit[unit_id], "source": "gee"})
+            else:
+                unit_result.update({"error": "No data found for requested range"})
+            results.append(unit_result)
+        return results
+
+    series_by_unit = {}
+    try:
+        series_by_unit = await get_reduced_timeseries(
+            parameter, unit_fc, start_date, end_date, key=(level, tuple(units))
+        )
+    except Exception as gee_err:
+        print(f"[ERROR] GEE {level} reduction failed for {parameter}: {gee_err}")
+
+    precision = PANEL_PARAMETER_CONFIG[parameter]["precision"]
+    for unit_id, members in units.items():
+        unit_result = {"unit_id": unit_id, "level": level, "panel_ids": members}
+        timeseries = series_by_unit.get(unit_id) or []
+        if not timeseries:
+            unit_result["error"] = "No data found for requested range"
+            results.append(unit_result)
+            continue
+        rounded_series = [
+            {"date": entry["date"], "value": round(float(entry["value"]), precision), "unit": entry["unit"]}
+            for entry in timeseries
+        ]
+        unit_result.update({
+            "parameter": parameter,
+            "current_value": rounded_series[-1]["value"],
+            "unit": timeseries[0]["unit"],
+            "timeseries": rounded_series,
+            "source": "gee",
+        })
+        results.append(unit_result)
+    return results
+
+
+def normalize_level(level: Optional[str]) -> str:
+    normalized = (level or LEVEL_PANEL).strip().lower()
+    if normalized not in REDUCTION_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Invalid level. Use one of: {', '.join(REDUCTION_LEVELS)}")
+    return normalized
 
-def save_snapshot_cache(path: Path, payload: Dict):
-    ensure_snapshot_cache_dir()
+
+def get_panel_ee_geometry(panel_id: int):
+    """Look up a panel in the in-memory registry and return its cached ee.Geometry."""
+    record = get_panel_registry().get(panel_id)
+    if record is None:
+        raise KeyError(f"Panel {panel_id} not found in polygons")
+    return record.ee_geometry
+
+
+def build_snapshot_cache_key(parameter: str, start_date: str, end_date: str, level: str = LEVEL_PANEL) -> str:
+    normalized = f"{parameter.upper()}|{start_date}|{end_date}"
+    if level != LEVEL_PANEL:
+        normalized = f"{normalized}|{level}"
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    return f"{parameter.lower()}_{digest}"
+
+def save_snapshot_cache(cache_key: str, payload: Dict) -> SnapshotEntry:
+    """Stamp `payload` with its freshness fields and write it to the snapshot store."""
     payload_to_store = dict(payload)
     payload_to_store['generated_at_ts'] = time.time()
     payload_to_store['cache_ttl'] = DEFAULT_SNAPSHOT_CACHE_TTL
-    with open(path, 'w') as cache_file:
-        json.dump(payload_to_store, cache_file)
+    entry = SnapshotEntry.from_payload(payload_to_store, DEFAULT_SNAPSHOT_CACHE_TTL)
+    return store_snapshot_entry(cache_key, entry)
+
+
+def store_snapshot_entry(cache_key: str, entry: SnapshotEntry) -> SnapshotEntry:
+    """Write `entry` to the snapshot store shared by all workers."""
+    try:
+        get_snapshot_store().put(cache_key, entry)
+    except Exception as e:
+        # Still served from memory; the next worker recomputes
+        print(f"[WARN] Failed to store snapshot {cache_key}: {e}")
+    return entry
 
 def normalize_date_range(start_date: str, end_date: str):
     try:
@@ -410,6 +619,9 @@ def build_value_stats(value_map: Dict[str, Dict], precision: int):
 
 async def fetch_latest_satellite_ghi(lat: float, lon: float, tilt: int = 18) -> Optional[float]:
     """Fetch the latest Global Horizontal Irradiance from Open-Meteo's satellite API."""
+    return await http_flights.do(("ghi", lat, lon, tilt), _fetch_latest_satellite_ghi, lat, lon, tilt)
+
+async def _fetch_latest_satellite_ghi(lat: float, lon: float, tilt: int) -> Optional[float]:
     try:
         now = datetime.utcnow()
         # Request the last 48 hours to make sure we capture the latest completed hour
@@ -448,6 +660,12 @@ async def fetch_latest_satellite_ghi(lat: float, lon: float, tilt: int = 18) ->
         print(f"Error fetching satellite GHI: {exc}")
         return None
 
+async def fetch_json(url: str, params: Dict) -> Dict:
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, params=params, timeout=10.0)
+        response.raise_for_status()
+        return response.json()
+
 def mask_l8l9_clouds(image):
     """Mask clouds and shadows in Landsat 8 & 9 C2 L2"""
     qa = image.select('QA_PIXEL')
@@ -518,16 +736,9 @@ async def get_weather(lat: Optional[float] = None, lon: Optional[float] = None):
         if lat is None or lon is None:
             # Get location from polygons (using first polygon center)
             if os.path.exists(POLYGONS_PATH_STR):
-                with open(POLYGONS_PATH_STR, 'r') as f:
-                    geojson_data = json.load(f)
-                
-                if geojson_data.get('features'):
-                    # Get first polygon for GHI calculation
-                    first_polygon_feature = geojson_data['features'][0]
-                    first_polygon = first_polygon_feature['geometry']['coordinates'][0]
-                    # Simple centroid calculation for polygon ring
-                    lon = sum(coord[0] for coord in first_polygon) / len(first_polygon)
-                    lat = sum(coord[1] for coord in first_polygon) / len(first_polygon)
+                first_centroid = get_panel_registry().first_centroid()
+                if first_centroid:
+                    lon, lat = first_centroid
             
             # If still None (no file or empty), default to Kharda
             if lat is None or lon is None:
@@ -549,10 +760,7 @@ async def get_weather(lat: Optional[float] = None, lon: Optional[float] = None):
             "windspeed_unit": "kmh"
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
+        data = await http_flights.do(("forecast", lat, lon), fetch_json, url, params)
         
         # Extract current values
         current = data.get('current', {})
@@ -619,24 +827,268 @@ async def get_weather(lat: Optional[float] = None, lon: Optional[float] = None):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def choose_polygon_format(format: Optional[str], accept: str) -> str:
+    if format:
+        normalized = format.strip().lower()
+        if normalized not in ('geojson', 'topojson'):
+            raise HTTPException(status_code=400, detail="format must be 'geojson' or 'topojson'")
+        return normalized
+    if 'topo+json' in accept or 'topojson' in accept:
+        return 'topojson'
+    return 'geojson'
+
+def choose_content_encoding(accept_encoding: str, available) -> str:
+    offered = set()
+    for part in accept_encoding.split(','):
+        token, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        offered.add(token.strip().lower())
+    for encoding in ('zstd', 'br', 'gzip'):
+        if encoding in available and encoding in offered:
+            return encoding
+    return 'identity'
+
 @router.get("/polygons")
-async def get_polygons():
-    """Return the GeoJSON file with all polygons"""
-    if os.path.exists(POLYGONS_PATH_STR):
+async def get_polygons(request: Request, format: Optional[str] = None):
+    """
+    Return all panel polygons. GeoJSON by default; quantized TopoJSON with
+    `?format=topojson` or `Accept: application/topo+json`. Precompressed
+    gzip/brotli variants are served according to Accept-Encoding.
+    """
+    if not os.path.exists(POLYGONS_PATH_STR):
+        raise HTTPException(status_code=404, detail="Polygons file not found")
+
+    polygon_format = choose_polygon_format(format, request.headers.get('accept', ''))
+    try:
+        manifest = await asyncio.to_thread(get_polygon_manifest)
+    except Exception as e:
+        print(f"[WARN] Polygon assets unavailable, serving raw GeoJSON: {e}")
+        if polygon_format == 'topojson':
+            raise HTTPException(status_code=500, detail=f"Error building TopoJSON: {str(e)}")
         return FileResponse(POLYGONS_PATH_STR, media_type="application/json")
-    raise HTTPException(status_code=404, detail="Polygons file not found")
+
+    etag = f'"{manifest["hash"]}-{polygon_format}"'
+    headers = {
+        'ETag': etag,
+        'Vary': 'Accept, Accept-Encoding',
+        'Cache-Control': 'public, max-age=3600, must-revalidate',
+    }
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+
+    format_info = manifest['formats'][polygon_format]
+    variants = format_info['variants']
+    encoding = choose_content_encoding(request.headers.get('accept-encoding', ''), variants)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    media_type = format_info['media_type'] if polygon_format == 'topojson' else "application/json"
+    return FileResponse(POLYGON_ASSETS_DIR / variants[encoding]['file'], media_type=media_type, headers=headers)
+
+def build_panel_summaries(panel_ids: List[int]) -> List[Dict]:
+    registry = get_panel_registry()
+    panels = []
+    for panel_id in panel_ids:
+        record = registry.get(panel_id)
+        if record is None:
+            continue
+        centroid = record.centroid
+        panels.append({
+            "panel_id": panel_id,
+            "centroid": {"lat": centroid[1], "lng": centroid[0]} if centroid else None,
+            "bbox": list(record.bbox) if record.bbox else None,
+        })
+    return panels
+
+@router.get("/api/panels/bbox")
+async def get_panels_in_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    """Return panels whose polygon intersects the given lon/lat bounding box"""
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lon/min_lat must be less than or equal to max_lon/max_lat")
+    try:
+        panel_ids = get_panel_spatial_index().query_bbox(min_lon, min_lat, max_lon, max_lat)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"count": len(panel_ids), "panel_ids": panel_ids, "panels": build_panel_summaries(panel_ids)}
+
+@router.post("/api/panels/within")
+async def get_panels_in_polygon(query: PanelAreaQuery):
+    """Return panels matching a drawn GeoJSON polygon"""
+    if query.geometry.get("type") not in ("Polygon", "MultiPolygon"):
+        raise HTTPException(status_code=400, detail="geometry must be a GeoJSON Polygon or MultiPolygon")
+    predicate = query.predicate.lower()
+    # Predicates are phrased from the panel's side ("panel within area"), while
+    # STRtree evaluates predicate(drawn area, panel), so within/contains swap.
+    tree_predicates = {"intersects": "intersects", "within": "contains", "contains": "within"}
+    if predicate not in tree_predicates:
+        raise HTTPException(status_code=400, detail=f"Unsupported predicate. Use one of: {', '.join(tree_predicates)}")
+    try:
+        panel_ids = get_panel_spatial_index().query_polygon(query.geometry, tree_predicates[predicate])
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid geometry: {str(e)}")
+    return {"count": len(panel_ids), "panel_ids": panel_ids, "panels": build_panel_summaries(panel_ids)}
+
+@router.get("/api/panels/nearest")
+async def get_nearest_panels(lat: float, lon: float, k: int = 1):
+    """Return the k panels nearest to a point, with distances in metres"""
+    if k < 1 or k > 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+    try:
+        nearest = get_panel_spatial_index().query_nearest(lon, lat, k)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    summaries = {p["panel_id"]: p for p in build_panel_summaries([n["panel_id"] for n in nearest])}
+    panels = [{**summaries.get(n["panel_id"], {"panel_id": n["panel_id"]}), "distance_m": n["distance_m"]} for n in nearest]
+    return {"count": len(panels), "panel_ids": [p["panel_id"] for p in panels], "panels": panels}
+
+@router.get("/api/panel-blocks")
+async def get_panel_blocks_route():
+    """Return the block grouping (GeoJSON) used for level=block reductions"""
+    try:
+        return get_panel_blocks().geojson
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 @router.get("/api/database/stats")
-async def get_database_stats_route():
-    """Get database statistics"""
+async def get_database_stats_route(exact: bool = False):
+    """
+    Get database statistics from the materialized stats tables;
+    `exact=true` recounts the data tables instead.
+    """
     if not DB_AVAILABLE:
         raise HTTPException(status_code=503, detail="Database not available")
     try:
-        stats = get_data_statistics()
+        stats = await db_async.get_data_statistics(exact=exact)
+        stats['ingest'] = get_ingest_queue().status()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting database stats: {str(e)}")
 
+@router.get("/api/snapshot-cache")
+async def get_snapshot_cache_status():
+    """Size and hit counters of the in-memory and on-disk snapshot caches."""
+    try:
+        store = await asyncio.to_thread(get_snapshot_store().status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading snapshot store: {str(e)}")
+    return {'memory': snapshot_memory_cache.status(), 'store': store}
+
+@router.get("/api/export")
+async def export_history(
+    dataset: str = "timeseries",
+    format: str = "parquet",
+    parameters: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+):
+    """
+    Stream the stored history as Parquet (row groups per parameter and year)
+    or gzip CSV. Rows are read and encoded chunk by chunk.
+    """
+    if not DB_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Database not available")
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=400, detail=f"dataset must be one of: {', '.join(EXPORT_DATASETS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "parquet" and pyarrow_module is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow; use format=csv")
+    for value in (start_date, end_date):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
+
+    filters = {"start_date": start_date, "end_date": end_date}
+    if dataset == "timeseries":
+        filters["parameters"] = [p.strip() for p in parameters.split(",") if p.strip()] if parameters else None
+
+    filename = f"kharda_{dataset}.{FILE_EXTENSIONS[format]}"
+    # A sync iterator: Starlette pulls each chunk on its threadpool
+    return StreamingResponse(
+        iter_export_bytes(dataset, format, **filters),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/api/farm-rollup")
+async def get_farm_rollup(parameter: str, start_date: str, end_date: str, grain: str = "day"):
+    """Farm-wide count/mean/stddev/min/max of a parameter per day or month, from the rollup tables."""
+    if not DB_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Database not available")
+    normalized_parameter = parameter.strip().upper()
+    if normalized_parameter not in PANEL_PARAMETER_CONFIG or normalized_parameter == "SOILING":
+        raise HTTPException(status_code=400, detail=f"Unsupported parameter: {parameter}")
+    if grain not in ("day", "month"):
+        raise HTTPException(status_code=400, detail="grain must be 'day' or 'month'")
+    normalized_start, normalized_end = normalize_date_range(start_date, end_date)
+    try:
+        series = await db_async.get_farm_rollups(normalized_parameter, normalized_start, normalized_end, grain)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading rollups: {str(e)}")
+    return {"parameter": normalized_parameter, "grain": grain, "series": series}
+
+def all_panels_lst_cache_key(start_date: str, end_date: str) -> str:
+    return f"all_panels_lst_{start_date}_{end_date}"
+
+
+def build_all_panels_lst(means_by_panel: Dict[int, tuple]) -> Dict:
+    """The /api/all-panels-lst body from {panel_id: (count, sum)} LST means, with z-scores."""
+    panel_lst_map = {}
+    lst_values = []
+    for pid in sorted(means_by_panel):
+        count, total = means_by_panel[pid]
+        mean_val = total / count
+        panel_lst_map[pid] = mean_val
+        lst_values.append(mean_val)
+
+    if not lst_values:
+        return {"panel_lst": {}, "panel_z_scores": {}, "global_stats": {"mean": None, "stddev": None}}
+
+    global_mean = statistics.mean(lst_values)
+    global_std = statistics.stdev(lst_values) if len(lst_values) > 1 else 0
+
+    panel_z_scores = {}
+    if global_std > 0:
+        for pid, val in panel_lst_map.items():
+            z_score = (val - global_mean) / global_std
+            panel_z_scores[pid] = round(z_score, 2)
+    else:
+        for pid in panel_lst_map:
+            panel_z_scores[pid] = 0
+
+    return {
+        "panel_lst": {int(k): round(v, 2) for k, v in panel_lst_map.items()},
+        "panel_z_scores": panel_z_scores,
+        "global_stats": {
+            "mean": round(global_mean, 2),
+            "stddev": round(global_std, 2),
+        },
+    }
+
+
+async def refresh_all_panels_lst(start_date: str, end_date: str) -> SnapshotEntry:
+    """
+    Recompute /api/all-panels-lst for a range and cache the serialized body
+    for ALL_PANELS_LST_CACHE_TTL, in memory and in the snapshot store.
+    """
+    # Per-panel means from the monthly rollups plus raw rows for partial months
+    means_by_panel = await db_async.get_panel_means("LST", start_date, end_date)
+    entry = SnapshotEntry.from_payload(build_all_panels_lst(means_by_panel), ALL_PANELS_LST_CACHE_TTL)
+    cache_key = all_panels_lst_cache_key(start_date, end_date)
+    await asyncio.to_thread(store_snapshot_entry, cache_key, entry)
+    snapshot_memory_cache.put(cache_key, entry)
+    return entry
+
+
 @router.get("/api/all-panels-lst")
 async def get_all_panels_lst(start_date: str, end_date: str):
     """Get LST values for all panels using the SQLite database with z-score hotspot detection."""
@@ -654,65 +1106,23 @@ async def get_all_panels_lst(start_date: str, end_date: str):
             end_dt = start_dt + timedelta(days=1)
             end_date = end_dt.strftime('%Y-%m-%d')
 
-        print(f"[DEBUG] Fetching all-panels LST from database for {start_date} to {end_date}")
-
         if not DB_AVAILABLE:
             raise HTTPException(status_code=503, detail="Database not available for all-panels LST")
 
-        panel_ids = get_all_panel_ids()
-        if not panel_ids:
-            return {"panel_lst": {}, "panel_z_scores": {}, "global_stats": {"mean": None, "stddev": None}}
-
-        panel_lst_map = {}
-        lst_values = []
-
-        for pid in panel_ids:
+        cache_key = all_panels_lst_cache_key(start_date, end_date)
+        entry = snapshot_memory_cache.get(cache_key)
+        if entry is None:
+            # Possibly computed by another worker
+            entry = await asyncio.to_thread(load_stored_snapshot, cache_key)
+        if entry is None:
+            print(f"[DEBUG] Fetching all-panels LST from database for {start_date} to {end_date}")
             try:
-                series = get_timeseries_data(pid, "LST", start_date, end_date)
+                entry = await refresh_all_panels_lst(start_date, end_date)
             except Exception as e:
-                print(f"[WARNING] Failed to get LST timeseries for panel {pid}: {e}")
-                continue
-
-            if not series:
-                continue
-
-            values = []
-            for entry in series:
-                try:
-                    values.append(float(entry["value"]))
-                except Exception:
-                    continue
-
-            if not values:
-                continue
-
-            mean_val = statistics.mean(values)
-            panel_lst_map[pid] = mean_val
-            lst_values.append(mean_val)
-
-        if not lst_values:
-            return {"panel_lst": {}, "panel_z_scores": {}, "global_stats": {"mean": None, "stddev": None}}
-
-        global_mean = statistics.mean(lst_values)
-        global_std = statistics.stdev(lst_values) if len(lst_values) > 1 else 0
-
-        panel_z_scores = {}
-        if global_std > 0:
-            for pid, val in panel_lst_map.items():
-                z_score = (val - global_mean) / global_std
-                panel_z_scores[pid] = round(z_score, 2)
-        else:
-            for pid in panel_lst_map:
-                panel_z_scores[pid] = 0
-
-        return {
-            "panel_lst": {int(k): round(v, 2) for k, v in panel_lst_map.items()},
-            "panel_z_scores": panel_z_scores,
-            "global_stats": {
-                "mean": round(global_mean, 2),
-                "stddev": round(global_std, 2),
-            },
-        }
+                # Not cached, so the next request retries
+                print(f"[WARNING] Failed to get LST means for panels: {e}")
+                return build_all_panels_lst({})
+        return Response(content=entry.body, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -722,10 +1132,17 @@ async def get_all_panels_lst(start_date: str, end_date: str):
 @router.get("/api/lst-monthly")
 async def get_lst_monthly(start_date: str, end_date: str):
     """Return monthly mean LST (°C) across all panels using Landsat 8 & 9 and MODIS"""
-    # Try database first
+    # Try database first: farm-wide panel rollups, then the stored MODIS series
     if DB_AVAILABLE:
         try:
-            db_data = get_monthly_lst(start_date, end_date)
+            rollups = await db_async.get_farm_rollups("LST", start_date, end_date, "month")
+            if rollups:
+                series = [{'month': r['month'], 'value': round(r['mean'], 2)} for r in rollups]
+                return {'series': series, 'source': 'rollup'}
+        except Exception as db_error:
+            print(f"Rollup query failed: {db_error}")
+        try:
+            db_data = await db_async.get_monthly_lst(start_date, end_date)
             if db_data:
                 return {'series': db_data, 'source': 'database'}
         except Exception as db_error:
@@ -761,54 +1178,22 @@ async def get_lst_monthly(start_date: str, end_date: str):
         
         print(f'[DEBUG] Processing monthly LST for date range: {start_date} to {end_date}')
 
-        # Load polygons
-        try:
-            with open(POLYGONS_PATH_STR, 'r') as f:
-                geojson_data = json.load(f)
-        except Exception as file_error:
-            print(f'Error loading polygons file: {str(file_error)}')
-            return { 'series': [] }
-
-        features_list = []
+        # Load polygons (cached, validated feature collection from the registry)
         try:
-            for feature in geojson_data.get('features', []):
-                try:
-                    coords = feature['geometry']['coordinates'][0]
-                    # Validate polygon has at least 3 points
-                    if len(coords) < 3:
-                        print(f'[WARNING] Skipping polygon with less than 3 points: {len(coords)} points')
-                        continue
-                    # Validate coordinates are valid (not empty, have x and y)
-                    if not all(len(coord) >= 2 for coord in coords):
-                        print(f'[WARNING] Skipping polygon with invalid coordinates')
-                        continue
-                    ee_polygon = ee.Geometry.Polygon(coords)
-                    features_list.append(ee.Feature(ee_polygon))
-                except Exception as feat_error:
-                    print(f'[WARNING] Error processing feature: {str(feat_error)}')
-                    continue
+            polygons_fc, _ = get_panel_registry().feature_collection()
         except Exception as poly_error:
-            print(f'Error processing polygons: {str(poly_error)}')
+            print(f'Error loading polygons: {str(poly_error)}')
             return { 'series': [] }
 
-        if not features_list:
+        if polygons_fc is None:
             print(f'[WARNING] No valid polygons found after validation')
             return { 'series': [] }
 
         try:
-            polygons_fc = ee.FeatureCollection(features_list)
-            # Use union of all polygons to get AOI bounds, with error handling
-            try:
-                aoi = polygons_fc.geometry().bounds()
-            except Exception as bounds_error:
-                # Fallback: use first polygon's bounds
-                print(f'[WARNING] Error computing bounds from all polygons, using first polygon: {bounds_error}')
-                if features_list:
-                    aoi = features_list[0].geometry().bounds()
-                else:
-                    return { 'series': [] }
-        except Exception as ee_init_error:
-            print(f'Error creating FeatureCollection: {str(ee_init_error)}')
+            # Use union of all polygons to get AOI bounds
+            aoi = polygons_fc.geometry().bounds()
+        except Exception as bounds_error:
+            print(f'Error computing AOI bounds: {str(bounds_error)}')
             return { 'series': [] }
 
         # Helper to get monthly mean across panels
@@ -929,41 +1314,15 @@ async def get_lst_monthly(start_date: str, end_date: str):
         return { 'series': [], 'source': 'none' }
 
 
-def load_panel_feature_collection():
+def load_panel_feature_collection(level=LEVEL_PANEL):
     try:
-        with open(POLYGONS_PATH_STR, 'r') as f:
-            geojson_data = json.load(f)
+        polygons_fc, panel_ids = get_panel_blocks().feature_collection(level)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Error loading polygons file: {str(exc)}")
 
-    features = []
-    panel_ids = []
-    for feature in geojson_data.get('features', []):
-        panel_id = feature.get('properties', {}).get('panel_id')
-        geometry = feature.get('geometry')
-        if panel_id is None or geometry is None:
-            continue
-
-        if geometry.get('type') == 'Polygon':
-            coords = geometry.get('coordinates', [])
-            if coords and len(coords) > 0:
-                ring = coords[0]
-                if len(ring) < 3:
-                    continue
-                if not all(len(coord) >= 2 for coord in ring):
-                    continue
-
-        try:
-            ee_geom = ee.Geometry(geometry)
-        except Exception:
-            continue
-        features.append(ee.Feature(ee_geom, {'panel_id': panel_id}))
-        panel_ids.append(panel_id)
-
-    if not features:
+    if polygons_fc is None:
         raise HTTPException(status_code=500, detail="No valid panel polygons available.")
 
-    polygons_fc = ee.FeatureCollection(features)
     return polygons_fc, panel_ids
 
 
@@ -1051,28 +1410,55 @@ def aggregate_lst_snapshot(polygons_fc, start_date, end_date):
     )
 
 
-def aggregate_swir_snapshot(polygons_fc, start_date, end_date):
-    farm_geometry = polygons_fc.geometry()
-    s2_collection = (
-        ee.ImageCollection('COPERNICUS/S2_SR')
-        .filterDate(start_date, end_date)
-        .filterBounds(farm_geometry)
-        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
-        .select('B11')
-    )
-    count = s2_collection.size().getInfo()
+# Parameters whose snapshot can be built in SQL from the stored time series,
+# and how: 'mean', 'median' or 'latest' (see database.get_panel_reductions).
+# Their GEE aggregators composite the same series definition (see
+# aggregate_stored_series_snapshot) with the same statistic over time, so DB
+# and GEE panels of one snapshot share one scale. LST is not listed (stored
+# LST is Landsat 8 only while aggregate_lst_snapshot takes the latest Landsat
+# 8/9 or MODIS scene), nor NDVI (snapshots sample a ring around each panel)
+# or SOILING (two seasonal composites), neither of which is stored.
+SNAPSHOT_DB_REDUCERS: Dict[str, str] = {
+    'SWIR': 'median',
+    'NDWI': 'mean',
+    'VISIBLE': 'median',
+}
+
+
+def stored_series_composite(collection, reducer):
+    """One image of `collection` reduced over time like the `reducer` of get_panel_reductions."""
+    if reducer == 'mean':
+        return collection.mean()
+    if reducer == 'median':
+        return collection.median()
+    return ee.Image(collection.sort('system:time_start', False).first())
+
+
+def aggregate_stored_series_snapshot(parameter, polygons_fc, start_date, end_date):
+    """
+    Snapshot of a SNAPSHOT_DB_REDUCERS parameter from its stored time series
+    definition (services.TIMESERIES_SOURCES: cloud-masked S2_SR_HARMONIZED
+    reflectance divided by 10000), composited with the parameter's reducer.
+    """
+    build_collection, scale, _ = TIMESERIES_SOURCES[parameter]
+    collection = build_collection(polygons_fc.geometry(), start_date, end_date)
+    count = collection.size().getInfo()
     if count == 0:
         return {}
-    median_img = s2_collection.median().select(['B11'], ['SWIR'])
-    features = reduce_image_to_panels(median_img, polygons_fc, 10, ['SWIR'])
+    composite = stored_series_composite(collection, SNAPSHOT_DB_REDUCERS[parameter]).rename(parameter)
+    features = reduce_image_to_panels(composite, polygons_fc, scale, [parameter])
     return features_to_value_map(
         features,
-        'SWIR',
-        PANEL_PARAMETER_CONFIG['SWIR']['unit'],
-        PANEL_PARAMETER_CONFIG['SWIR']['precision'],
+        parameter,
+        PANEL_PARAMETER_CONFIG[parameter]['unit'],
+        PANEL_PARAMETER_CONFIG[parameter]['precision'],
     )
 
 
+def aggregate_swir_snapshot(polygons_fc, start_date, end_date):
+    return aggregate_stored_series_snapshot('SWIR', polygons_fc, start_date, end_date)
+
+
 def aggregate_ndvi_snapshot(polygons_fc, start_date, end_date):
     farm_geometry = polygons_fc.geometry()
     s2_collection = (
@@ -1103,62 +1489,11 @@ def aggregate_ndvi_snapshot(polygons_fc, start_date, end_date):
 
 
 def aggregate_ndwi_snapshot(polygons_fc, start_date, end_date):
-    farm_geometry = polygons_fc.geometry()
-    s2_collection = (
-        ee.ImageCollection('COPERNICUS/S2_SR')
-        .filterDate(start_date, end_date)
-        .filterBounds(farm_geometry)
-        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
-        .select(['B3', 'B8'])
-    )
-    count = s2_collection.size().getInfo()
-    if count == 0:
-        return {}
-
-    def add_ndwi(img):
-        ndwi = img.normalizedDifference(['B3', 'B8']).rename('NDWI')
-        return ndwi.copyProperties(img, ['system:time_start'])
-
-    ndwi_collection = s2_collection.map(add_ndwi)
-    mean_ndwi = ndwi_collection.mean()
-    features = reduce_image_to_panels(mean_ndwi, polygons_fc, 10, ['NDWI'])
-    return features_to_value_map(
-        features,
-        'NDWI',
-        PANEL_PARAMETER_CONFIG['NDWI']['unit'],
-        PANEL_PARAMETER_CONFIG['NDWI']['precision'],
-    )
+    return aggregate_stored_series_snapshot('NDWI', polygons_fc, start_date, end_date)
 
 
 def aggregate_visible_snapshot(polygons_fc, start_date, end_date):
-    farm_geometry = polygons_fc.geometry()
-    s2_collection = (
-        ee.ImageCollection('COPERNICUS/S2_SR')
-        .filterDate(start_date, end_date)
-        .filterBounds(farm_geometry)
-        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
-        .select(['B2', 'B3', 'B4'])
-    )
-    count = s2_collection.size().getInfo()
-    if count == 0:
-        return {}
-
-    def add_vis_mean(img):
-        vis = img.expression(
-            '((B2 + B3 + B4) / 3)',
-            {'B2': img.select('B2'), 'B3': img.select('B3'), 'B4': img.select('B4')},
-        ).rename('VISIBLE')
-        return vis.copyProperties(img, ['system:time_start'])
-
-    vis_collection = s2_collection.map(add_vis_mean)
-    median_vis = vis_collection.median()
-    features = reduce_image_to_panels(median_vis, polygons_fc, 10, ['VISIBLE'])
-    return features_to_value_map(
-        features,
-        'VISIBLE',
-        PANEL_PARAMETER_CONFIG['VISIBLE']['unit'],
-        PANEL_PARAMETER_CONFIG['VISIBLE']['precision'],
-    )
+    return aggregate_stored_series_snapshot('VISIBLE', polygons_fc, start_date, end_date)
 
 
 def aggregate_soiling_snapshot(polygons_fc, start_date, end_date):
@@ -1208,7 +1543,11 @@ def aggregate_soiling_snapshot(polygons_fc, start_date, end_date):
     features = reduce_image_to_panels(
         combined, polygons_fc, 10, ['baseline_si', 'current_si', 'soiling_drop_percent']
     )
+    return soiling_features_to_value_map(features)
+
 
+def soiling_features_to_value_map(features):
+    """Per-panel SOILING entries from features carrying the baseline_si / current_si / soiling_drop_percent bands."""
     results = {}
     precision = PANEL_PARAMETER_CONFIG['SOILING']['precision']
     for feature in features:
@@ -1241,13 +1580,164 @@ PARAMETER_AGGREGATORS = {
     'VISIBLE': aggregate_visible_snapshot,
 }
 
+# Sentinel-2 parameters aggregate_s2_snapshots can compute together in one stacked reduction
+S2_SNAPSHOT_PARAMETERS = ('SWIR', 'NDVI', 'NDWI', 'VISIBLE', 'SOILING')
+
+
+def s2_composite_band(collection, build, band):
+    """
+    `build(collection)` renamed to `band`, or a fully masked band when the
+    collection is empty. The emptiness check runs server-side, so unlike the
+    single-parameter aggregators no size().getInfo() round trip is needed.
+    """
+    empty = ee.Image.constant(0).updateMask(0).rename(band)
+    return ee.Image(ee.Algorithms.If(collection.size().gt(0), build(collection).rename(band), empty)).toFloat()
+
+
+def aggregate_s2_snapshots(parameters, polygons_fc, start_date, end_date):
+    """
+    {parameter: value map} for the Sentinel-2 `parameters`, each composited
+    exactly as its aggregate_*_snapshot does. Every panel-sampled composite is
+    stacked into one image and reduced with a single reduceRegions; NDVI,
+    sampled on the ring around each panel, takes a second one.
+    """
+    s2_collection = (
+        ee.ImageCollection('COPERNICUS/S2_SR')
+        .filterBounds(polygons_fc.geometry())
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20))
+        .select(['B2', 'B4', 'B8'])
+    )
+    window = s2_collection.filterDate(start_date, end_date)
+
+    def soiling_index(img):
+        return img.expression(
+            '(B2 + B4) / (B8 + 0.0001)',
+            {'B2': img.select('B2'), 'B4': img.select('B4'), 'B8': img.select('B8')},
+        )
+
+    bands = []
+    for parameter in ('SWIR', 'NDWI', 'VISIBLE'):
+        if parameter in parameters:
+            # The stored series definition, as in aggregate_stored_series_snapshot
+            stored = TIMESERIES_SOURCES[parameter][0](polygons_fc.geometry(), start_date, end_date)
+            reducer = SNAPSHOT_DB_REDUCERS[parameter]
+            bands.append(s2_composite_band(stored, lambda c, reducer=reducer: stored_series_composite(c, reducer), parameter))
+    if 'SOILING' in parameters:
+        year = start_date[:4]
+        baseline = s2_collection.filterDate(f"{year}-01-01", f"{year}-03-31")
+        current = s2_collection.filterDate(f"{year}-04-01", end_date)
+        baseline_si = s2_composite_band(baseline, lambda c: soiling_index(c.median()), 'baseline_si')
+        current_si = s2_composite_band(current, lambda c: soiling_index(c.median()), 'current_si')
+        drop = (
+            baseline_si.subtract(current_si)
+            .divide(baseline_si.add(1e-6))
+            .multiply(100)
+            .rename('soiling_drop_percent')
+        )
+        bands.extend([baseline_si, current_si, drop])
+
+    results = {}
+    if bands:
+        stacked = bands[0]
+        for band in bands[1:]:
+            stacked = stacked.addBands(band)
+        features = reduce_image_to_panels(stacked, polygons_fc, 10)
+        for parameter in ('SWIR', 'NDWI', 'VISIBLE'):
+            if parameter in parameters:
+                results[parameter] = features_to_value_map(
+                    features,
+                    parameter,
+                    PANEL_PARAMETER_CONFIG[parameter]['unit'],
+                    PANEL_PARAMETER_CONFIG[parameter]['precision'],
+                )
+        if 'SOILING' in parameters:
+            results['SOILING'] = soiling_features_to_value_map(features)
+
+    if 'NDVI' in parameters:
+        mean_ndvi = s2_composite_band(window, lambda c: c.map(lambda img: img.normalizedDifference(['B8', 'B4'])).mean(), 'NDVI')
+        features = reduce_image_to_panels(mean_ndvi, create_ring_feature_collection(polygons_fc), 10)
+        results['NDVI'] = features_to_value_map(
+            features,
+            'NDVI',
+            PANEL_PARAMETER_CONFIG['NDVI']['unit'],
+            PANEL_PARAMETER_CONFIG['NDVI']['precision'],
+        )
+    return results
+
 
-def compute_parameter_snapshot(parameter, start_date, end_date):
-    polygons_fc, panel_ids = load_panel_feature_collection()
-    aggregator = PARAMETER_AGGREGATORS.get(parameter)
-    if aggregator is None:
+def plan_parameter_snapshot(parameter, start_date, end_date, level=LEVEL_PANEL):
+    """
+    Split a snapshot between the database and GEE: (panel ids, {panel_id:
+    entry} of panels whose whole [start_date, end_date) range is covered in
+    the DB, panel ids that still need the GEE aggregator). Returns None when
+    the snapshot must be computed entirely on GEE: block/farm levels,
+    parameters without a DB reducer, or the DB being unavailable.
+    """
+    reducer = SNAPSHOT_DB_REDUCERS.get(parameter)
+    if not DB_AVAILABLE or reducer is None or level != LEVEL_PANEL:
+        return None
+
+    panel_ids = [record.panel_id for record in get_panel_registry().records() if record.valid]
+    try:
+        coverage = get_coverage_bulk(panel_ids, parameter)
+        covered_ids = [pid for pid in panel_ids if not missing_ranges(coverage.get(pid, []), start_date, end_date)]
+        # Coverage is [start, end); the stored-row reads are inclusive
+        last_date = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        reduced = get_panel_reductions(parameter, start_date, last_date, reducer) if covered_ids else {}
+    except Exception as e:
+        print(f"[WARN] Snapshot DB plan failed for {parameter}, using GEE: {e}")
+        return None
+
+    config = PANEL_PARAMETER_CONFIG[parameter]
+    db_values = {}
+    for panel_id in covered_ids:
+        if panel_id in reduced:
+            db_values[str(panel_id)] = {
+                'value': round(float(reduced[panel_id][1]), config['precision']),
+                'unit': config['unit'],
+            }
+    covered = set(covered_ids)
+    return panel_ids, db_values, [pid for pid in panel_ids if pid not in covered]
+
+
+def panel_subset_feature_collection(panel_ids):
+    """ee.FeatureCollection of just `panel_ids`, keyed by `panel_id` like the full collection."""
+    registry = get_panel_registry()
+    return ee.FeatureCollection([
+        ee.Feature(registry.get(panel_id).ee_geometry, {'panel_id': panel_id}) for panel_id in panel_ids
+    ])
+
+
+def compute_parameter_snapshot(parameter, start_date, end_date, level=LEVEL_PANEL):
+    if parameter not in PARAMETER_AGGREGATORS:
         raise HTTPException(status_code=400, detail=f"Unsupported parameter {parameter}")
-    values = aggregator(polygons_fc, start_date, end_date)
+    plan = plan_parameter_snapshot(parameter, start_date, end_date, level)
+    return compute_planned_snapshot(parameter, start_date, end_date, level, plan)
+
+
+def compute_planned_snapshot(parameter, start_date, end_date, level, plan):
+    """compute_parameter_snapshot for an existing plan_parameter_snapshot result."""
+    aggregator = PARAMETER_AGGREGATORS[parameter]
+    if plan is None:
+        polygons_fc, panel_ids = load_panel_feature_collection(level)
+        values = aggregator(polygons_fc, start_date, end_date)
+        sources = {'gee': len(panel_ids)}
+    else:
+        panel_ids, values, gee_panel_ids = plan
+        if gee_panel_ids:
+            print(f"[INFO] Snapshot {parameter} {start_date}..{end_date}: "
+                  f"{len(panel_ids) - len(gee_panel_ids)} panels from DB, {len(gee_panel_ids)} from GEE")
+            if len(gee_panel_ids) == len(panel_ids):
+                polygons_fc, _ = load_panel_feature_collection(level)
+            else:
+                polygons_fc = panel_subset_feature_collection(gee_panel_ids)
+            values.update(aggregator(polygons_fc, start_date, end_date))
+        sources = {'database': len(panel_ids) - len(gee_panel_ids), 'gee': len(gee_panel_ids)}
+
+    return build_snapshot_payload(parameter, start_date, end_date, level, panel_ids, values, sources)
+
+
+def build_snapshot_payload(parameter, start_date, end_date, level, panel_ids, values, sources):
     precision = PANEL_PARAMETER_CONFIG[parameter]['precision']
     stats = build_value_stats(values, precision)
     payload = {
@@ -1259,13 +1749,261 @@ def compute_parameter_snapshot(parameter, start_date, end_date):
         'value_count': len(values),
         'values': values,
         'stats': stats,
+        'sources': sources,
         'generated_at': datetime.utcnow().isoformat() + 'Z',
     }
+    if level != LEVEL_PANEL:
+        payload['level'] = level
+        payload['unit_members'] = get_panel_blocks().units_for_panels(level, [])
     return payload
 
 
+def compute_parameter_snapshots(parameters, start_date, end_date, level=LEVEL_PANEL) -> Dict[str, Dict]:
+    """
+    compute_parameter_snapshot for several parameters at once. Parameters the
+    DB fully covers are built in SQL; the Sentinel-2 ones that need GEE share
+    one aggregate_s2_snapshots run (over just the panels any of them lacks);
+    anything else (LST) goes through its own aggregator.
+    """
+    payloads = {}
+    gee_plans = {}
+    for parameter in parameters:
+        plan = plan_parameter_snapshot(parameter, start_date, end_date, level)
+        if plan is not None and not plan[2]:
+            panel_ids, values, _ = plan
+            payloads[parameter] = build_snapshot_payload(
+                parameter, start_date, end_date, level, panel_ids, values, {'database': len(panel_ids), 'gee': 0}
+            )
+        elif parameter in S2_SNAPSHOT_PARAMETERS:
+            gee_plans[parameter] = plan
+        else:
+            payloads[parameter] = compute_planned_snapshot(parameter, start_date, end_date, level, plan)
+
+    if gee_plans:
+        polygons_fc, all_ids = load_panel_feature_collection(level)
+        if all(plan is not None for plan in gee_plans.values()):
+            needed = set().union(*(plan[2] for plan in gee_plans.values()))
+            if len(needed) < len(all_ids):
+                polygons_fc = panel_subset_feature_collection([pid for pid in all_ids if pid in needed])
+        print(f"[INFO] Stacked GEE snapshot for {sorted(gee_plans)} {start_date}..{end_date}")
+        reduced = aggregate_s2_snapshots(list(gee_plans), polygons_fc, start_date, end_date)
+        for parameter, plan in gee_plans.items():
+            values = reduced.get(parameter, {})
+            if plan is None:
+                panel_ids, sources = all_ids, {'gee': len(all_ids)}
+            else:
+                # Only reached for SNAPSHOT_DB_REDUCERS parameters, whose stored
+                # series is on the aggregator's scale
+                panel_ids, db_values, gee_panel_ids = plan
+                wanted = {str(pid) for pid in gee_panel_ids}
+                values = {**db_values, **{key: entry for key, entry in values.items() if key in wanted}}
+                sources = {'database': len(panel_ids) - len(gee_panel_ids), 'gee': len(gee_panel_ids)}
+            payloads[parameter] = build_snapshot_payload(
+                parameter, start_date, end_date, level, panel_ids, values, sources
+            )
+    return payloads
+
+
+def lookup_parameter_snapshot(cache_key: str, allow_stale: bool = False) -> Optional[SnapshotEntry]:
+    """The cached snapshot from memory or the snapshot store, without computing."""
+    entry = snapshot_memory_cache.get(cache_key, allow_stale)
+    if entry is not None:
+        return entry
+    return load_stored_snapshot(cache_key, allow_stale)
+
+
+def load_stored_snapshot(cache_key: str, allow_stale: bool = False) -> Optional[SnapshotEntry]:
+    """The snapshot from the store shared by all workers, copied into memory; None if absent."""
+    try:
+        entry = get_snapshot_store().get(cache_key, allow_stale)
+    except Exception as e:
+        print(f"[WARN] Snapshot store lookup failed for {cache_key}: {e}")
+        return None
+    if entry is not None:
+        snapshot_memory_cache.put(cache_key, entry)
+    return entry
+
+
+def refresh_parameter_snapshot(parameter, start_date, end_date, level=LEVEL_PANEL) -> SnapshotEntry:
+    """Compute the snapshot and replace its cached copies."""
+    cache_key = build_snapshot_cache_key(parameter, start_date, end_date, level)
+    payload = compute_parameter_snapshot(parameter, start_date, end_date, level)
+    entry = save_snapshot_cache(cache_key, payload)
+    snapshot_memory_cache.put(cache_key, entry)
+    return entry
+
+
+def refresh_parameter_snapshots(parameters, start_date, end_date, level=LEVEL_PANEL) -> Dict[str, SnapshotEntry]:
+    """refresh_parameter_snapshot for several parameters from one compute_parameter_snapshots run."""
+    payloads = compute_parameter_snapshots(parameters, start_date, end_date, level)
+    entries = {}
+    for parameter, payload in payloads.items():
+        cache_key = build_snapshot_cache_key(parameter, start_date, end_date, level)
+        entries[parameter] = save_snapshot_cache(cache_key, payload)
+        snapshot_memory_cache.put(cache_key, entries[parameter])
+    return entries
+
+
+def lookup_parameter_snapshots(parameters, start_date, end_date, level=LEVEL_PANEL) -> Dict[str, SnapshotEntry]:
+    """The fresh cached snapshots among `parameters`, without computing."""
+    entries = {}
+    for parameter in parameters:
+        entry = lookup_parameter_snapshot(build_snapshot_cache_key(parameter, start_date, end_date, level))
+        if entry is not None:
+            entries[parameter] = entry
+    return entries
+
+
+def resolve_parameter_snapshot(parameter, start_date, end_date, force_refresh=False, level=LEVEL_PANEL) -> SnapshotEntry:
+    """The fresh snapshot from memory, the snapshot store or a new computation, in that order."""
+    if not force_refresh:
+        entry = lookup_parameter_snapshot(build_snapshot_cache_key(parameter, start_date, end_date, level))
+        if entry is not None:
+            return entry
+    return refresh_parameter_snapshot(parameter, start_date, end_date, level)
+
+
+# Background refreshes of stale snapshots in flight, and when a key's last refresh failed
+_snapshot_refreshes: Dict[tuple, asyncio.Task] = {}
+_snapshot_refresh_failures: Dict[tuple, float] = {}
+
+
+def schedule_snapshot_refresh(parameter, start_date, end_date, level=LEVEL_PANEL):
+    """
+    Recompute a stale snapshot in the background, at most one refresh per
+    key; a key whose refresh failed is retried after SNAPSHOT_REFRESH_RETRY_S.
+    """
+    key = (parameter, start_date, end_date, level)
+    if key in _snapshot_refreshes:
+        return
+    if time.time() - _snapshot_refresh_failures.get(key, 0) < SNAPSHOT_REFRESH_RETRY_S:
+        return
+    print(f"[INFO] Refreshing stale snapshot {key} in the background")
+    # Shares the flight of a concurrent force_refresh request for the same key
+    task = asyncio.ensure_future(snapshot_flights.do(
+        key + (True,), asyncio.to_thread, refresh_parameter_snapshot, parameter, start_date, end_date, level,
+    ))
+    _snapshot_refreshes[key] = task
+    task.add_done_callback(partial(_snapshot_refresh_done, key))
+
+
+def _snapshot_refresh_done(key: tuple, task: asyncio.Task):
+    _snapshot_refreshes.pop(key, None)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        _snapshot_refresh_failures[key] = time.time()
+        print(f"[WARN] Background refresh of snapshot {key} failed: {error}")
+    else:
+        _snapshot_refresh_failures.pop(key, None)
+
+
+async def resolve_parameter_snapshot_shared(parameter, start_date, end_date, force_refresh=False,
+                                            level=LEVEL_PANEL) -> SnapshotEntry:
+    """
+    resolve_parameter_snapshot off the event loop, with concurrent requests
+    for the same snapshot sharing one aggregator run. Fresh memory hits are
+    served without leaving the loop; otherwise the snapshot store is checked,
+    since another worker may already have refreshed it. An expired snapshot
+    is returned as-is (check `is_fresh()`) while a background refresh
+    replaces it.
+    """
+    if not force_refresh:
+        cache_key = build_snapshot_cache_key(parameter, start_date, end_date, level)
+        entry = snapshot_memory_cache.get(cache_key, allow_stale=True)
+        if entry is None or not entry.is_fresh():
+            entry = await asyncio.to_thread(load_stored_snapshot, cache_key, True) or entry
+        if entry is not None:
+            if not entry.is_fresh():
+                schedule_snapshot_refresh(parameter, start_date, end_date, level)
+            return entry
+    return await snapshot_flights.do(
+        (parameter, start_date, end_date, level, force_refresh),
+        asyncio.to_thread, resolve_parameter_snapshot, parameter, start_date, end_date, force_refresh, level,
+    )
+
+
+async def snapshot_expires_at(cache_key: str) -> Optional[float]:
+    """
+    When the cached snapshot expires; None if not cached. A copy in memory
+    that is stale is checked against the store, which another worker may
+    have refreshed (loading it into memory).
+    """
+    entry = snapshot_memory_cache.get(cache_key, allow_stale=True)
+    if entry is None or not entry.is_fresh():
+        entry = await asyncio.to_thread(load_stored_snapshot, cache_key, True) or entry
+    return entry.expires_at if entry is not None else None
+
+
+async def prewarm_parameter_snapshot(parameter: str, start_date: str, end_date: str):
+    """Recompute a panel snapshot, sharing the flight of any concurrent refresh of it."""
+    await snapshot_flights.do(
+        (parameter, start_date, end_date, LEVEL_PANEL, True),
+        asyncio.to_thread, refresh_parameter_snapshot, parameter, start_date, end_date, LEVEL_PANEL,
+    )
+
+
+def build_prewarm_targets() -> List[PrewarmTarget]:
+    """Panel snapshots of every PREWARM_PARAMETERS x PREWARM_WINDOWS, plus /api/all-panels-lst per window."""
+    parameters = [p for p in PREWARM_PARAMETERS if p in PANEL_PARAMETER_CONFIG] or list(PANEL_PARAMETER_CONFIG)
+    targets = []
+    for window in PREWARM_WINDOWS:
+        try:
+            start_date, end_date = normalize_date_range(*window_dates(window))
+        except ValueError as e:
+            print(f"[WARN] Skipping pre-warm window: {e}")
+            continue
+        for parameter in parameters:
+            targets.append(PrewarmTarget(
+                f"snapshot:{parameter}:{window}",
+                partial(snapshot_expires_at, build_snapshot_cache_key(parameter, start_date, end_date)),
+                partial(prewarm_parameter_snapshot, parameter, start_date, end_date),
+            ))
+        if DB_AVAILABLE:
+            targets.append(PrewarmTarget(
+                f"all-panels-lst:{window}",
+                partial(snapshot_expires_at, all_panels_lst_cache_key(start_date, end_date)),
+                partial(refresh_all_panels_lst, start_date, end_date),
+            ))
+    return targets
+
+
+# Started and stopped by the application's startup / shutdown hooks
+prewarm_scheduler = PrewarmScheduler(build_prewarm_targets)
+
+
+@router.get("/api/admin/prewarm")
+async def get_prewarm_status():
+    """Pre-warm scheduler state and the last outcome of each target."""
+    return prewarm_scheduler.status()
+
+
+def snapshot_response(snapshot: SnapshotEntry, request: Request) -> Response:
+    """
+    The pre-serialized snapshot body; fresh snapshots go out as the stored
+    compressed bytes when the client accepts their encoding.
+    """
+    if not snapshot.is_fresh():
+        return Response(content=snapshot.stale_body(), media_type="application/json")
+    headers = {'Vary': 'Accept-Encoding'}
+    if snapshot.encoded is not None:
+        encoding = choose_content_encoding(request.headers.get('accept-encoding', ''), {snapshot.encoding})
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+            return Response(content=snapshot.encoded, media_type="application/json", headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
 @router.get("/api/panel-parameter-snapshot")
-async def get_panel_parameter_snapshot(parameter: str, start_date: str, end_date: str, force_refresh: bool = False):
+async def get_panel_parameter_snapshot(
+    request: Request,
+    parameter: str,
+    start_date: str,
+    end_date: str,
+    force_refresh: bool = False,
+    level: str = LEVEL_PANEL,
+):
     if not parameter:
         raise HTTPException(status_code=400, detail="Parameter is required.")
     normalized_parameter = parameter.strip().upper()
@@ -1275,11 +2013,100 @@ async def get_panel_parameter_snapshot(parameter: str, start_date: str, end_date
             detail=f"Invalid parameter. Use one of: {', '.join(PANEL_PARAMETER_CONFIG.keys())}",
         )
     normalized_start, normalized_end = normalize_date_range(start_date, end_date)
-    cache_path = build_snapshot_cache_path(normalized_parameter, normalized_start, normalized_end)
+    normalized_level = normalize_level(level)
+    snapshot = await resolve_parameter_snapshot_shared(
+        normalized_parameter, normalized_start, normalized_end, force_refresh, normalized_level
+    )
+    return snapshot_response(snapshot, request)
+
+
+@router.get("/api/panel-parameter-snapshots")
+async def get_panel_parameter_snapshots(
+    parameters: str,
+    start_date: str,
+    end_date: str,
+    force_refresh: bool = False,
+    level: str = LEVEL_PANEL,
+):
+    """
+    Snapshots of several parameters (comma-separated) as {"snapshots":
+    {parameter: snapshot}}. Fresh cached snapshots are reused; the rest are
+    computed together, with the Sentinel-2 parameters sharing one stacked
+    GEE reduction, and each is cached as if requested on its own.
+    """
+    requested = list(dict.fromkeys(p.strip().upper() for p in parameters.split(',') if p.strip()))
+    invalid = [p for p in requested if p not in PANEL_PARAMETER_CONFIG]
+    if not requested or invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid parameters. Use one or more of: {', '.join(PANEL_PARAMETER_CONFIG.keys())}",
+        )
+    normalized_start, normalized_end = normalize_date_range(start_date, end_date)
+    normalized_level = normalize_level(level)
+
+    entries = {}
     if not force_refresh:
-        cached = load_cached_snapshot(cache_path)
-        if cached:
-            return cached
-    payload = compute_parameter_snapshot(normalized_parameter, normalized_start, normalized_end)
-    save_snapshot_cache(cache_path, payload)
-    return payload
+        entries = await asyncio.to_thread(
+            lookup_parameter_snapshots, requested, normalized_start, normalized_end, normalized_level
+        )
+    missing = [p for p in requested if p not in entries]
+    if missing:
+        entries.update(await snapshot_flights.do(
+            ('multi', tuple(missing), normalized_start, normalized_end, normalized_level, force_refresh),
+            asyncio.to_thread, refresh_parameter_snapshots, missing, normalized_start, normalized_end, normalized_level,
+        ))
+    # Splice the pre-serialized bodies instead of decoding and re-encoding them
+    body = b'{"snapshots":{' + b','.join(
+        json.dumps(parameter).encode('utf-8') + b':' + entries[parameter].body for parameter in requested
+    ) + b'}}'
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_panel_tile(
+    z: int,
+    x: int,
+    y: int,
+    parameter: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+):
+    """
+    Mapbox Vector Tile of the panels in z/x/y (layer "panels"). With
+    `parameter`, `start_date` and `end_date`, each feature carries the
+    parameter snapshot `value` for its panel.
+    """
+    if z < 0 or z > MAX_TILE_ZOOM or not (0 <= x < 2 ** z) or not (0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+
+    snapshot = None
+    snapshot_key = None
+    if parameter:
+        normalized_parameter = parameter.strip().upper()
+        if normalized_parameter not in PANEL_PARAMETER_CONFIG:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid parameter. Use one of: {', '.join(PANEL_PARAMETER_CONFIG.keys())}",
+            )
+        if not start_date or not end_date:
+            raise HTTPException(status_code=400, detail="start_date and end_date are required with parameter")
+        normalized_start, normalized_end = normalize_date_range(start_date, end_date)
+        snapshot = await resolve_parameter_snapshot_shared(normalized_parameter, normalized_start, normalized_end)
+        snapshot_key = (normalized_parameter, normalized_start, normalized_end, snapshot.generated_at)
+
+    cache_key = (z, x, y, get_panel_registry().version, snapshot_key)
+    tile = panel_tile_cache.get(cache_key)
+    if tile is None:
+        # The value map is only decoded when the tile has to be built
+        value_map = snapshot.payload().get('values', {}) if snapshot is not None else None
+        try:
+            tile = await asyncio.to_thread(build_panel_tile, z, x, y, value_map)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        panel_tile_cache.put(cache_key, tile)
+
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={'Cache-Control': 'public, max-age=3600'},
+    )
@@ -1,12 +1,28 @@
 import ee
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Hashable
+
+from app.common.singleflight import SingleFlight
+
+# Identical GEE fetches running at the same time share one computation
+gee_flights = SingleFlight("gee")
 
 # Helper to run GEE blocking calls in thread
 async def run_in_thread(func, *args, **kwargs):
     return await asyncio.to_thread(func, *args, **kwargs)
 
+async def run_coalesced(kind: str, key: Optional[Hashable], func, *args):
+    """
+    run_in_thread, except that concurrent calls with the same (kind, key, args)
+    share one in-flight computation. `key` identifies the geometry (panel id,
+    panel id tuple, block id...); with key=None the call is never coalesced.
+    """
+    if key is None:
+        return await run_in_thread(func, *args)
+    flight_key = (kind, key) + tuple(a for a in args if isinstance(a, (str, int, float)))
+    return await gee_flights.do(flight_key, run_in_thread, func, *args)
+
 def mask_s2_clouds(image):
     qa = image.select('QA60')
     cloud_bit_mask = 1 << 10
@@ -14,184 +30,169 @@ def mask_s2_clouds(image):
     mask = qa.bitwiseAnd(cloud_bit_mask).eq(0).And(qa.bitwiseAnd(cirrus_bit_mask).eq(0))
     return image.updateMask(mask).divide(10000)
 
-async def get_lst_data(geometry, start_date: str, end_date: str) -> Dict[str, Any]:
+def lst_collection(geometry, start_date: str, end_date: str):
+    """Landsat 8 LST in °C as a single 'value' band."""
+    def apply_scale(img):
+        # Landsat 8/9 LST
+        lst = img.select('ST_B10').multiply(0.00341802).add(149.0).subtract(273.15).rename('value')
+        return img.addBands(lst).copyProperties(img, ['system:time_start'])
+
+    return ee.ImageCollection('LANDSAT/LC08/C02/T1_L2') \
+        .filterBounds(geometry) \
+        .filterDate(start_date, end_date) \
+        .filter(ee.Filter.lt('CLOUD_COVER', 20)) \
+        .map(apply_scale) \
+        .select('value')
+
+def s2_collection(geometry, start_date: str, end_date: str):
+    """Cloud-masked Sentinel-2 SR reflectance."""
+    return ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
+        .filterBounds(geometry) \
+        .filterDate(start_date, end_date) \
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)) \
+        .map(mask_s2_clouds)
+
+def swir_collection(geometry, start_date: str, end_date: str):
+    # Calculate mean SWIR (B11 + B12)/2 or just B11
+    def calc_swir(img):
+        swir = img.select('B11').rename('value')
+        return img.addBands(swir).copyProperties(img, ['system:time_start'])
+
+    return s2_collection(geometry, start_date, end_date).select(['B11', 'B12']).map(calc_swir).select('value')
+
+def ndvi_collection(geometry, start_date: str, end_date: str):
+    def add_ndvi(img):
+        ndvi = img.normalizedDifference(['B8', 'B4']).rename('value')
+        return img.addBands(ndvi).copyProperties(img, ['system:time_start'])
+
+    return s2_collection(geometry, start_date, end_date).map(add_ndvi).select('value')
+
+def ndwi_collection(geometry, start_date: str, end_date: str):
+    def add_ndwi(img):
+        # NDWI = (B3 - B8) / (B3 + B8)  (Green - NIR)
+        ndwi = img.normalizedDifference(['B3', 'B8']).rename('value')
+        return img.addBands(ndwi).copyProperties(img, ['system:time_start'])
+
+    return s2_collection(geometry, start_date, end_date).map(add_ndwi).select('value')
+
+def visible_collection(geometry, start_date: str, end_date: str):
+    def add_vis(img):
+        # Mean of B2, B3, B4
+        vis = img.expression('(B2 + B3 + B4) / 3', {
+            'B2': img.select('B2'),
+            'B3': img.select('B3'),
+            'B4': img.select('B4')
+        }).rename('value')
+        return img.addBands(vis).copyProperties(img, ['system:time_start'])
+
+    return s2_collection(geometry, start_date, end_date).map(add_vis).select('value')
+
+def si_collection(geometry, start_date: str, end_date: str):
+    def add_si(img):
+        # SI = (Blue + Red) / (NIR + epsilon)
+        si = img.expression('(b("B2") + b("B4")) / (b("B8") + 0.0001)') \
+            .rename('value')
+        return img.addBands(si).copyProperties(img, ['system:time_start'])
+
+    return s2_collection(geometry, start_date, end_date).map(add_si).select('value')
+
+# parameter -> (collection builder, scale in metres, unit)
+TIMESERIES_SOURCES = {
+    'LST': (lst_collection, 30, '°C'),
+    'SWIR': (swir_collection, 10, 'reflectance'),
+    'NDVI': (ndvi_collection, 10, ''),
+    'NDWI': (ndwi_collection, 10, ''),
+    'VISIBLE': (visible_collection, 10, 'reflectance'),
+}
+
+def _region_timeseries(parameter: str, geometry, start_date: str, end_date: str) -> Dict[str, Any]:
+    build_collection, scale, unit = TIMESERIES_SOURCES[parameter]
+    data = build_collection(geometry, start_date, end_date).getRegion(geometry, scale).getInfo()
+
+    timeseries = []
+    if len(data) > 1:
+        header = data[0]
+        for row in data[1:]:
+            ts = row[header.index('system:time_start')]
+            val = row[header.index('value')]
+            if val is not None:
+                dt = datetime.fromtimestamp(ts / 1000.0)
+                timeseries.append({
+                    'date': dt.strftime('%Y-%m-%d'),
+                    'value': val,
+                    'unit': unit
+                })
+    return {'timeseries': timeseries, 'unit': unit}
+
+def _reduce_collection_to_features(collection, features, scale) -> Dict[Any, Dict[str, List[float]]]:
+    """Mean 'value' of every image over every feature, fetched as one compact list."""
+    def reduce_image(img):
+        date = img.date().format('YYYY-MM-dd')
+        reduced = img.reduceRegions(
+            collection=features,
+            reducer=ee.Reducer.mean(),
+            scale=scale,
+            tileScale=4,
+        )
+        return reduced.filter(ee.Filter.notNull(['mean'])).map(lambda f: f.set('date', date))
+
+    rows = collection.map(reduce_image).flatten() \
+        .reduceColumns(ee.Reducer.toList(3), ['panel_id', 'date', 'mean']) \
+        .get('list').getInfo() or []
+
+    grouped: Dict[Any, Dict[str, List[float]]] = {}
+    for unit_id, date, value in rows:
+        if value is None:
+            continue
+        grouped.setdefault(unit_id, {}).setdefault(date, []).append(value)
+    return grouped
+
+def reduce_timeseries_to_features(parameter: str, features, start_date: str, end_date: str) -> Dict[Any, List[Dict]]:
+    """
+    Per-image mean of `parameter` over every feature of an ee.FeatureCollection,
+    in one request. Features are keyed by their 'panel_id' property; values on
+    the same date (overlapping scenes) are averaged.
+    Returns {panel_id: [{'date', 'value', 'unit'}, ...]} sorted by date.
+    """
+    build_collection, scale, unit = TIMESERIES_SOURCES[parameter]
+    grouped = _reduce_collection_to_features(
+        build_collection(features.geometry(), start_date, end_date), features, scale
+    )
+    return {
+        unit_id: [
+            {'date': date, 'value': sum(values) / len(values), 'unit': unit}
+            for date, values in sorted(by_date.items())
+        ]
+        for unit_id, by_date in grouped.items()
+    }
+
+async def get_lst_data(geometry, start_date: str, end_date: str, key: Optional[Hashable] = None) -> Dict[str, Any]:
     """Fetch LST data from Landsat 8/9 and MODIS."""
-    def _process():
-        # Try Landsat first
-        def apply_scale(img):
-            # Landsat 8/9 LST
-            lst = img.select('ST_B10').multiply(0.00341802).add(149.0).subtract(273.15).rename('LST')
-            return img.addBands(lst).copyProperties(img, ['system:time_start'])
-
-        l8 = ee.ImageCollection('LANDSAT/LC08/C02/T1_L2') \
-            .filterBounds(geometry) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUD_COVER', 20)) \
-            .map(apply_scale) \
-            .select('LST')
+    # If scarce data, fill with MODIS?
+    # For migration, we might want strict data or hybrid.
+    # Let's keep it simple for now, maybe add MODIS fallback if needed.
+    return await run_coalesced('region', key, _region_timeseries, 'LST', geometry, start_date, end_date)
 
-        data = l8.getRegion(geometry, 30).getInfo()
-        
-        timeseries = []
-        if len(data) > 1:
-            header = data[0]
-            for row in data[1:]:
-                ts = row[header.index('system:time_start')]
-                val = row[header.index('LST')]
-                if val is not None:
-                    dt = datetime.fromtimestamp(ts / 1000.0)
-                    timeseries.append({
-                        'date': dt.strftime('%Y-%m-%d'),
-                        'value': val,
-                        'unit': '°C'
-                    })
-        
-        # If scarce data, fill with MODIS? 
-        # For migration, we might want strict data or hybrid. 
-        # Let's keep it simple for now, maybe add MODIS fallback if needed.
-        return {'timeseries': timeseries, 'unit': '°C'}
-
-    return await run_in_thread(_process)
-
-async def get_swir_data(geometry, start_date: str, end_date: str) -> Dict[str, Any]:
+async def get_swir_data(geometry, start_date: str, end_date: str, key: Optional[Hashable] = None) -> Dict[str, Any]:
     """Fetch SWIR data from Sentinel-2."""
-    def _process():
-        s2 = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-            .filterBounds(geometry) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)) \
-            .map(mask_s2_clouds) \
-            .select(['B11', 'B12'])
-
-        # Calculate mean SWIR (B11 + B12)/2 or just B11
-        def calc_swir(img):
-            swir = img.select('B11').rename('value')
-            return img.addBands(swir).copyProperties(img, ['system:time_start'])
-
-        s2_proc = s2.map(calc_swir).select('value')
-        data = s2_proc.getRegion(geometry, 10).getInfo()
-
-        timeseries = []
-        if len(data) > 1:
-            header = data[0]
-            for row in data[1:]:
-                ts = row[header.index('system:time_start')]
-                val = row[header.index('value')]
-                if val is not None:
-                    dt = datetime.fromtimestamp(ts / 1000.0)
-                    timeseries.append({
-                        'date': dt.strftime('%Y-%m-%d'),
-                        'value': val,
-                        'unit': 'reflectance'
-                    })
-        return {'timeseries': timeseries, 'unit': 'reflectance'}
+    return await run_coalesced('region', key, _region_timeseries, 'SWIR', geometry, start_date, end_date)
 
-    return await run_in_thread(_process)
-
-async def get_ndvi_data(geometry, start_date: str, end_date: str) -> Dict[str, Any]:
+async def get_ndvi_data(geometry, start_date: str, end_date: str, key: Optional[Hashable] = None) -> Dict[str, Any]:
     """Fetch NDVI data from Sentinel-2."""
-    def _process():
-        s2 = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-            .filterBounds(geometry) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)) \
-            .map(mask_s2_clouds)
-
-        def add_ndvi(img):
-            ndvi = img.normalizedDifference(['B8', 'B4']).rename('value')
-            return img.addBands(ndvi).copyProperties(img, ['system:time_start'])
-
-        s2_proc = s2.map(add_ndvi).select('value')
-        data = s2_proc.getRegion(geometry, 10).getInfo()
-
-        timeseries = []
-        if len(data) > 1:
-            header = data[0]
-            for row in data[1:]:
-                ts = row[header.index('system:time_start')]
-                val = row[header.index('value')]
-                if val is not None:
-                    dt = datetime.fromtimestamp(ts / 1000.0)
-                    timeseries.append({
-                        'date': dt.strftime('%Y-%m-%d'),
-                        'value': val,
-                        'unit': ''
-                    })
-        return {'timeseries': timeseries, 'unit': ''}
-
-    return await run_in_thread(_process)
+    return await run_coalesced('region', key, _region_timeseries, 'NDVI', geometry, start_date, end_date)
 
-async def get_ndwi_data(geometry, start_date: str, end_date: str) -> Dict[str, Any]:
+async def get_ndwi_data(geometry, start_date: str, end_date: str, key: Optional[Hashable] = None) -> Dict[str, Any]:
     """Fetch NDWI data from Sentinel-2."""
-    def _process():
-        s2 = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-            .filterBounds(geometry) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)) \
-            .map(mask_s2_clouds)
-
-        def add_ndwi(img):
-            # NDWI = (B3 - B8) / (B3 + B8)  (Green - NIR)
-            ndwi = img.normalizedDifference(['B3', 'B8']).rename('value')
-            return img.addBands(ndwi).copyProperties(img, ['system:time_start'])
+    return await run_coalesced('region', key, _region_timeseries, 'NDWI', geometry, start_date, end_date)
 
-        s2_proc = s2.map(add_ndwi).select('value')
-        data = s2_proc.getRegion(geometry, 10).getInfo()
-
-        timeseries = []
-        if len(data) > 1:
-            header = data[0]
-            for row in data[1:]:
-                ts = row[header.index('system:time_start')]
-                val = row[header.index('value')]
-                if val is not None:
-                    dt = datetime.fromtimestamp(ts / 1000.0)
-                    timeseries.append({
-                        'date': dt.strftime('%Y-%m-%d'),
-                        'value': val,
-                        'unit': ''
-                    })
-        return {'timeseries': timeseries, 'unit': ''}
-
-    return await run_in_thread(_process)
-
-async def get_visible_mean_data(geometry, start_date: str, end_date: str) -> Dict[str, Any]:
+async def get_visible_mean_data(geometry, start_date: str, end_date: str, key: Optional[Hashable] = None) -> Dict[str, Any]:
     """Fetch mean visible band data."""
-    def _process():
-        s2 = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-            .filterBounds(geometry) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)) \
-            .map(mask_s2_clouds)
-
-        def add_vis(img):
-            # Mean of B2, B3, B4
-            vis = img.expression('(B2 + B3 + B4) / 3', {
-                'B2': img.select('B2'),
-                'B3': img.select('B3'),
-                'B4': img.select('B4')
-            }).rename('value')
-            return img.addBands(vis).copyProperties(img, ['system:time_start'])
-
-        s2_proc = s2.map(add_vis).select('value')
-        data = s2_proc.getRegion(geometry, 10).getInfo()
-
-        timeseries = []
-        if len(data) > 1:
-            header = data[0]
-            for row in data[1:]:
-                ts = row[header.index('system:time_start')]
-                val = row[header.index('value')]
-                if val is not None:
-                    dt = datetime.fromtimestamp(ts / 1000.0)
-                    timeseries.append({
-                        'date': dt.strftime('%Y-%m-%d'),
-                        'value': val,
-                        'unit': 'reflectance'
-                    })
-        return {'timeseries': timeseries, 'unit': 'reflectance'}
+    return await run_coalesced('region', key, _region_timeseries, 'VISIBLE', geometry, start_date, end_date)
 
-    return await run_in_thread(_process)
+async def get_reduced_timeseries(parameter: str, features, start_date: str, end_date: str,
+                                 key: Optional[Hashable] = None) -> Dict[Any, List[Dict]]:
+    """Async wrapper around reduce_timeseries_to_features; `key` names the feature set for coalescing."""
+    return await run_coalesced('reduced', key, reduce_timeseries_to_features, parameter, features, start_date, end_date)
 
 async def get_lst_monthly(start_date: str, end_date: str) -> Dict[str, Any]:
     """Fetch monthly aggregated LST data for the whole farm (approximated by a point or bounds)."""
@@ -242,31 +243,42 @@ async def get_lst_monthly(start_date: str, end_date: str) -> Dict[str, Any]:
 
     return await run_in_thread(_process)
 
-async def get_soiling_data(geometry, start_date: str, end_date: str) -> Dict[str, Any]:
+def soiling_from_values(values: List[float]) -> Dict[str, Any]:
+    """Baseline/current soiling index summary from SI values in time order."""
+    # Logic to determine baseline and current
+    # This is simplified; real soiling logic is complex.
+    # We'll return the latest value as current and max as baseline for now.
+    if not values:
+        baseline_si = 1.0
+        current_si = 1.0
+        drop = 0.0
+    else:
+        current_si = values[-1]
+        baseline_si = max(values)
+        drop = 0.0
+        if baseline_si > 0:
+            drop = ((baseline_si - current_si) / baseline_si) * 100
+
+    status = 'clean'
+    if drop >= 5:
+        status = 'needs_cleaning'
+
+    return {
+        'baseline_si': baseline_si,
+        'current_si': current_si,
+        'soiling_drop_percent': drop,
+        'status': status,
+        'unit': '%'
+    }
+
+async def get_soiling_data(geometry, start_date: str, end_date: str, key: Optional[Hashable] = None) -> Dict[str, Any]:
     """
     Calculate soiling index.
     Simplified version: (B2 + B4) / (B8 + 0.0001)
     """
     def _process():
-        s2 = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-            .filterBounds(geometry) \
-            .filterDate(start_date, end_date) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)) \
-            .map(mask_s2_clouds)
-
-        def add_si(img):
-            # SI = (Blue + Red) / (NIR + epsilon)
-            si = img.expression('(b("B2") + b("B4")) / (b("B8") + 0.0001)') \
-                .rename('value')
-            return img.addBands(si).copyProperties(img, ['system:time_start'])
+        data = si_collection(geometry, start_date, end_date).getRegion(geometry, 10).getInfo()
 
-        s2_proc = s2.map(add_si).select('value')
-        data = s2_proc.getRegion(geometry, 10).getInfo()
-        
-        # Logic to determine baseline and current
-        # This is simplified; real soiling logic is complex.
-        # We'll return the latest value as current and max as baseline for now.
-        
         values = []
         if len(data) > 1:
             header = data[0]
@@ -276,29 +288,30 @@ async def get_soiling_data(geometry, start_date: str, end_date: str) -> Dict[str
                     values.append(val)
         
         print(f"[INFO] GEE Soiling: Found {len(values)} valid data points for {start_date} to {end_date}")
-
         if not values:
             print(f"[WARN] GEE Soiling: No data points found. Returning defaults.")
-            baseline_si = 1.0
-            current_si = 1.0
-            drop = 0.0
-        else:
-            current_si = values[-1]
-            baseline_si = max(values)
-            drop = 0.0
-            if baseline_si > 0:
-                drop = ((baseline_si - current_si) / baseline_si) * 100
-        
-        status = 'clean'
-        if drop >= 5:
-            status = 'needs_cleaning'
-        
-        return {
-            'baseline_si': baseline_si,
-            'current_si': current_si,
-            'soiling_drop_percent': drop,
-            'status': status,
-            'unit': '%'
-        }
 
-    return await run_in_thread(_process)
+        return soiling_from_values(values)
+
+    return await run_coalesced('soiling', None if key is None else (key, start_date, end_date), _process)
+
+def reduce_soiling_to_features(features, start_date: str, end_date: str) -> Dict[Any, Dict[str, Any]]:
+    """
+    Soiling summary for every feature of an ee.FeatureCollection from one
+    per-image reduceRegions over the SI series. Features without any valid
+    SI value are omitted.
+    """
+    grouped = _reduce_collection_to_features(
+        si_collection(features.geometry(), start_date, end_date), features, 10
+    )
+    results = {}
+    for unit_id, by_date in grouped.items():
+        values = [sum(v) / len(v) for _, v in sorted(by_date.items())]
+        if values:
+            results[unit_id] = soiling_from_values(values)
+    return results
+
+async def get_reduced_soiling(features, start_date: str, end_date: str,
+                              key: Optional[Hashable] = None) -> Dict[Any, Dict[str, Any]]:
+    """Async wrapper around reduce_soiling_to_features; `key` names the feature set for coalescing."""
+    return await run_coalesced('reduced_soiling', key, reduce_soiling_to_features, features, start_date, end_date)
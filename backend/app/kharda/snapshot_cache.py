@@ -0,0 +1,147 @@
+"""
+In-process cache of serialized panel parameter snapshots.
+
+Entries hold the response body exactly as it is sent (JSON bytes), so a hit
+neither reads panel_snapshots/ nor runs the JSON encoder. The LRU is bounded
+by the total size of the bodies (SNAPSHOT_MEMORY_CACHE_BYTES). Entries past
+their TTL are kept for up to SNAPSHOT_MAX_STALE_S so they can be served
+stale while a refresh runs, then dropped.
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+SNAPSHOT_MEMORY_CACHE_BYTES = int(os.getenv("SNAPSHOT_MEMORY_CACHE_BYTES", 64 * 1024 * 1024))
+# How long past its TTL a snapshot may still be served (marked stale)
+SNAPSHOT_MAX_STALE_S = int(os.getenv("SNAPSHOT_MAX_STALE_S", 7 * 24 * 60 * 60))
+# Rough per-entry bookkeeping cost added to the body size
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def serialize_payload(payload: Dict[str, Any]) -> bytes:
+    """JSON bytes as Starlette's JSONResponse would render them."""
+    return json.dumps(
+        payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class SnapshotEntry:
+    """
+    A serialized snapshot and the freshness fields stored with it. `encoded`
+    holds the same body compressed with `encoding` once it has been stored
+    on disk, ready to send with a Content-Encoding header.
+    """
+    __slots__ = ('body', 'generated_at', 'generated_at_ts', 'ttl', 'encoded', 'encoding')
+
+    def __init__(self, body: bytes, generated_at: Optional[str], generated_at_ts: float, ttl: float,
+                 encoded: Optional[bytes] = None, encoding: Optional[str] = None):
+        self.body = body
+        self.generated_at = generated_at
+        self.generated_at_ts = generated_at_ts
+        self.ttl = ttl
+        self.encoded = encoded
+        self.encoding = encoding
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], default_ttl: float) -> "SnapshotEntry":
+        return cls(
+            serialize_payload(payload),
+            payload.get('generated_at'),
+            payload.get('generated_at_ts') or time.time(),
+            payload.get('cache_ttl', default_ttl),
+        )
+
+    @property
+    def expires_at(self) -> float:
+        return self.generated_at_ts + self.ttl
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) <= self.expires_at
+
+    def is_servable(self, now: Optional[float] = None) -> bool:
+        """Fresh, or expired for no longer than SNAPSHOT_MAX_STALE_S."""
+        return (now or time.time()) <= self.expires_at + SNAPSHOT_MAX_STALE_S
+
+    def stale_body(self) -> bytes:
+        """`body` with `"stale": true` added to the top-level object."""
+        return self.body[:-1] + b',"stale":true}'
+
+    def payload(self) -> Dict[str, Any]:
+        """Decoded snapshot (not cached; most hits only need the bytes)."""
+        return json.loads(self.body)
+
+    def size(self) -> int:
+        return len(self.body) + len(self.encoded or b'') + ENTRY_OVERHEAD_BYTES
+
+
+class SnapshotMemoryCache:
+    """Thread-safe LRU of snapshot entries bounded by total body size."""
+
+    def __init__(self, max_bytes: int = SNAPSHOT_MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, SnapshotEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[SnapshotEntry]:
+        """
+        The fresh entry for `key`, or with `allow_stale` also an expired one
+        that is still servable. Entries past that are evicted; misses are counted.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry.is_servable():
+                self._remove(key)
+                entry = None
+            if entry is not None and not allow_stale and not entry.is_fresh():
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: SnapshotEntry):
+        size = entry.size()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def discard(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        self._bytes -= self._entries.pop(key).size()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+snapshot_memory_cache = SnapshotMemoryCache()
@@ -0,0 +1,274 @@
+"""
+On-disk store of compressed panel parameter snapshots (panel_snapshots/).
+
+Each snapshot is one gzip (or zstd) compressed JSON file, written to a temp
+file and renamed into place so readers in any worker see either the old or
+the new file. A small SQLite index next to the files records each entry's
+size, freshness and last access, which lets every worker:
+
+    - check freshness without opening the file,
+    - keep the directory under SNAPSHOT_STORE_MAX_BYTES by evicting the
+      least recently used entries,
+    - sweep entries more than SNAPSHOT_MAX_STALE_S past their TTL (and
+      leftover temp / unindexed files) from a background task.
+
+The compressed bytes are kept on the returned SnapshotEntry so responses can
+send them as-is with the matching Content-Encoding.
+"""
+import os
+import gzip
+import time
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+try:
+    import zstandard
+except ImportError:  # zstd entries are optional; gzip is always available
+    zstandard = None
+
+from app.kharda.snapshot_cache import SnapshotEntry, SNAPSHOT_MAX_STALE_S
+
+# backend/panel_snapshots, next to the SQLite database
+SNAPSHOT_STORE_DIR = Path(__file__).resolve().parent.parent.parent / "panel_snapshots"
+SNAPSHOT_STORE_MAX_BYTES = int(os.getenv("SNAPSHOT_STORE_MAX_BYTES", 256 * 1024 * 1024))
+SNAPSHOT_STORE_CODEC = os.getenv("SNAPSHOT_STORE_CODEC", "gzip").lower()
+SNAPSHOT_SWEEP_INTERVAL_S = int(os.getenv("SNAPSHOT_SWEEP_INTERVAL_S", 15 * 60))
+# last_access is rewritten at most this often per entry, so hits rarely write
+ACCESS_TOUCH_INTERVAL_S = 60
+# Unindexed files younger than this may belong to a write in progress (a temp
+# file, or a file renamed into place whose index row is not committed yet);
+# older ones are left over from a crashed writer or an older layout
+TMP_MAX_AGE_S = 60 * 60
+
+INDEX_NAME = "index.db"
+CODEC_EXTENSIONS = {'gzip': '.json.gz', 'zstd': '.json.zst'}
+
+
+def encode_body(body: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(body)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def decode_body(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class SnapshotStore:
+    """Compressed snapshot files plus an LRU/expiry index shared by all workers."""
+
+    def __init__(self, directory: Path = SNAPSHOT_STORE_DIR, max_bytes: int = SNAPSHOT_STORE_MAX_BYTES,
+                 codec: str = SNAPSHOT_STORE_CODEC):
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"Unknown snapshot codec {codec}; expected one of {tuple(CODEC_EXTENSIONS)}")
+        if codec == 'zstd' and zstandard is None:
+            print("[WARN] SNAPSHOT_STORE_CODEC=zstd but zstandard is not installed; using gzip")
+            codec = 'gzip'
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self._local = threading.local()
+        self.evictions = 0
+        self.swept = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.directory / INDEX_NAME), timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshot_entries (
+                    key TEXT PRIMARY KEY,
+                    file TEXT NOT NULL,
+                    encoding TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    generated_at TEXT,
+                    generated_at_ts REAL NOT NULL,
+                    ttl REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshot_entries_access ON snapshot_entries(last_access)")
+            self._local.conn = conn
+        return conn
+
+    def _unlink(self, name: str):
+        try:
+            (self.directory / name).unlink()
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[SnapshotEntry]:
+        """
+        The stored entry if fresh (or, with `allow_stale`, still servable),
+        with both the decoded body and the compressed bytes.
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM snapshot_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        entry = SnapshotEntry(b'', row['generated_at'], row['generated_at_ts'], row['ttl'])
+        if not (entry.is_servable(now) if allow_stale else entry.is_fresh(now)):
+            return None
+        try:
+            with open(self.directory / row['file'], 'rb') as f:
+                encoded = f.read()
+            entry.body = decode_body(encoded, row['encoding'])
+        except Exception as e:
+            # Evicted by another worker between the lookup and the read, or unreadable
+            if not isinstance(e, FileNotFoundError):
+                print(f"[WARN] Dropping unreadable snapshot {row['file']}: {e}")
+            self.discard(key)
+            return None
+        entry.encoded = encoded
+        entry.encoding = row['encoding']
+        if now - row['last_access'] > ACCESS_TOUCH_INTERVAL_S:
+            conn.execute("UPDATE snapshot_entries SET last_access = ? WHERE key = ?", (now, key))
+        return entry
+
+    def put(self, key: str, entry: SnapshotEntry) -> SnapshotEntry:
+        """Compress and store `entry` atomically; sets `entry.encoded` / `entry.encoding`."""
+        encoded = encode_body(entry.body, self.codec)
+        name = f"{key}{CODEC_EXTENSIONS[self.codec]}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f"{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded)
+        os.replace(tmp_path, self.directory / name)
+
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            previous = conn.execute("SELECT file FROM snapshot_entries WHERE key = ?", (key,)).fetchone()
+            conn.execute("""
+                INSERT OR REPLACE INTO snapshot_entries
+                (key, file, encoding, size, generated_at, generated_at_ts, ttl, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (key, name, self.codec, len(encoded), entry.generated_at, entry.generated_at_ts, entry.ttl, time.time()))
+            self._enforce_budget(conn, keep=key)
+        if previous is not None and previous['file'] != name:
+            self._unlink(previous['file'])
+
+        entry.encoded = encoded
+        entry.encoding = self.codec
+        return entry
+
+    def discard(self, key: str):
+        conn = self._conn()
+        for row in conn.execute("DELETE FROM snapshot_entries WHERE key = ? RETURNING file", (key,)).fetchall():
+            self._unlink(row['file'])
+
+    def _enforce_budget(self, conn: sqlite3.Connection, keep: Optional[str] = None):
+        """Evict least recently used entries until the store fits max_bytes (caller holds a transaction)."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM snapshot_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for row in conn.execute("""
+            SELECT key, file, size FROM snapshot_entries
+            WHERE key != ? ORDER BY last_access ASC
+        """, (keep or '',)):
+            if total <= self.max_bytes:
+                break
+            victims.append((row['key'], row['file']))
+            total -= row['size']
+        conn.executemany("DELETE FROM snapshot_entries WHERE key = ?", [(key,) for key, _ in victims])
+        for _, name in victims:
+            self._unlink(name)
+        self.evictions += len(victims)
+
+    def sweep(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Delete entries past their servable window, temp files left by crashed
+        writers and files the index does not know (e.g. the old plain JSON
+        snapshots), then enforce the size budget.
+        """
+        now = now or time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute("""
+                DELETE FROM snapshot_entries WHERE generated_at_ts + ttl + ? < ? RETURNING file
+            """, (SNAPSHOT_MAX_STALE_S, now)).fetchall()
+            self._enforce_budget(conn)
+            indexed = {row['file'] for row in conn.execute("SELECT file FROM snapshot_entries")}
+        for row in expired:
+            self._unlink(row['file'])
+
+        orphans = 0
+        for path in self.directory.iterdir():
+            if path.name.startswith(INDEX_NAME) or path.name in indexed:
+                continue
+            try:
+                if now - path.stat().st_mtime < TMP_MAX_AGE_S:
+                    continue
+                path.unlink()
+                orphans += 1
+            except FileNotFoundError:
+                continue
+        self.swept += len(expired)
+        return {'expired': len(expired), 'orphans': orphans}
+
+    def status(self) -> Dict[str, Any]:
+        entries, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM snapshot_entries"
+        ).fetchone()
+        return {
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'codec': self.codec,
+            'evictions': self.evictions,
+            'swept': self.swept,
+        }
+
+
+_store: Optional[SnapshotStore] = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore:
+    """The process-wide snapshot store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SnapshotStore()
+    return _store
+
+
+_sweeper: Optional[asyncio.Task] = None
+
+
+async def _sweep_forever(interval: float):
+    while True:
+        try:
+            result = await asyncio.to_thread(get_snapshot_store().sweep)
+            if result['expired'] or result['orphans']:
+                print(f"[INFO] Snapshot sweep removed {result['expired']} expired and {result['orphans']} orphaned files")
+        except Exception as e:
+            print(f"[WARN] Snapshot sweep failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_snapshot_sweeper(interval: float = SNAPSHOT_SWEEP_INTERVAL_S):
+    """Sweep the store now and every `interval` seconds (call from the startup hook)."""
+    global _sweeper
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.get_running_loop().create_task(_sweep_forever(interval))
+
+
+def stop_snapshot_sweeper():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        _sweeper = None
@@ -0,0 +1,136 @@
+"""
+STRtree spatial index over the Kharda panel polygons.
+
+Geometries are projected into a local equirectangular plane (metres around the
+farm centre) so that bbox, polygon and nearest-neighbour queries use metric
+distances. The tree is rebuilt whenever the panel registry reloads its file.
+"""
+import math
+import threading
+from typing import Optional, List, Dict, Tuple
+
+import numpy as np
+from shapely import STRtree, box, transform
+from shapely.geometry import shape, Point
+
+from app.kharda.panels import PanelRegistry, get_panel_registry
+
+EARTH_RADIUS_M = 6371008.8
+# Starting search radius (metres) for k-nearest queries; doubled until enough hits
+NEAREST_INITIAL_RADIUS_M = 25.0
+NEAREST_MAX_RADIUS_M = 100000.0
+
+
+class PanelSpatialIndex:
+    """R-tree over panel polygons with bbox, polygon and k-nearest queries."""
+
+    def __init__(self, registry: PanelRegistry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._version = None
+        self._tree: Optional[STRtree] = None
+        self._panel_ids: List[int] = []
+        self._origin: Tuple[float, float] = (0.0, 0.0)
+        self._lon_scale = EARTH_RADIUS_M
+
+    def _project_coords(self, coords: np.ndarray) -> np.ndarray:
+        lon0, lat0 = self._origin
+        projected = np.empty_like(coords)
+        projected[:, 0] = np.radians(coords[:, 0] - lon0) * self._lon_scale
+        projected[:, 1] = np.radians(coords[:, 1] - lat0) * EARTH_RADIUS_M
+        return projected
+
+    def project(self, geometry):
+        """Project a lon/lat shapely geometry into the index plane."""
+        return transform(geometry, self._project_coords)
+
+    def _ensure_built(self):
+        version = self.registry.version
+        if version == self._version and self._tree is not None:
+            return
+        with self._lock:
+            if version == self._version and self._tree is not None:
+                return
+
+            records = [r for r in self.registry.records() if r.valid and r.bbox is not None]
+            if records:
+                min_lon = min(r.bbox[0] for r in records)
+                min_lat = min(r.bbox[1] for r in records)
+                max_lon = max(r.bbox[2] for r in records)
+                max_lat = max(r.bbox[3] for r in records)
+                lat0 = (min_lat + max_lat) / 2
+                self._origin = ((min_lon + max_lon) / 2, lat0)
+                self._lon_scale = EARTH_RADIUS_M * math.cos(math.radians(lat0))
+
+            geometries = []
+            panel_ids = []
+            for record in records:
+                try:
+                    geometries.append(self.project(shape(record.geometry)))
+                except Exception as e:
+                    print(f"[WARN] Skipping panel {record.panel_id} in spatial index: {e}")
+                    continue
+                panel_ids.append(record.panel_id)
+
+            self._tree = STRtree(geometries)
+            self._panel_ids = panel_ids
+            self._version = version
+            print(f"[INFO] Spatial index built over {len(panel_ids)} panels")
+
+    def _ids_for(self, indices) -> List[int]:
+        return [self._panel_ids[int(i)] for i in sorted(indices)]
+
+    def query_bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> List[int]:
+        """Panels whose polygon intersects the lon/lat bounding box."""
+        self._ensure_built()
+        search_area = self.project(box(min_lon, min_lat, max_lon, max_lat))
+        return self._ids_for(self._tree.query(search_area, predicate='intersects'))
+
+    def query_polygon(self, geometry: Dict, predicate: str = 'intersects') -> List[int]:
+        """Panels matching `predicate` against a GeoJSON (Multi)Polygon."""
+        self._ensure_built()
+        search_area = self.project(shape(geometry))
+        if not search_area.is_valid:
+            search_area = search_area.buffer(0)
+        return self._ids_for(self._tree.query(search_area, predicate=predicate))
+
+    def query_nearest(self, lon: float, lat: float, k: int = 1) -> List[Dict]:
+        """The k panels closest to a point, with distances in metres (0 if inside)."""
+        self._ensure_built()
+        if not self._panel_ids or k <= 0:
+            return []
+        k = min(k, len(self._panel_ids))
+        point = self.project(Point(lon, lat))
+
+        # Every panel within `radius` is returned, so once at least k come back
+        # the k closest among them are the true k nearest.
+        radius = NEAREST_INITIAL_RADIUS_M
+        while True:
+            indices = self._tree.query(point, predicate='dwithin', distance=radius)
+            if len(indices) >= k or radius >= NEAREST_MAX_RADIUS_M:
+                break
+            radius *= 2
+
+        geometries = self._tree.geometries
+        ranked = sorted(
+            ((float(geometries[i].distance(point)), int(i)) for i in indices),
+            key=lambda item: (item[0], self._panel_ids[item[1]])
+        )
+        return [
+            {'panel_id': self._panel_ids[i], 'distance_m': round(distance, 2)}
+            for distance, i in ranked[:k]
+        ]
+
+
+_spatial_index: Optional[PanelSpatialIndex] = None
+_spatial_index_lock = threading.Lock()
+
+
+def get_panel_spatial_index() -> PanelSpatialIndex:
+    """Return the process-wide spatial index over the panel registry."""
+    global _spatial_index
+    if _spatial_index is None:
+        with _spatial_index_lock:
+            if _spatial_index is None:
+                _spatial_index = PanelSpatialIndex(get_panel_registry())
+    return _spatial_index
@@ -0,0 +1,301 @@
+"""
+Mapbox Vector Tile (MVT v2) encoding of the Kharda panel polygons.
+
+Panels are selected through the spatial index, projected to Web Mercator tile
+space, clipped to the tile (plus a small buffer) and written as a single
+"panels" layer. A per-panel value map (e.g. a parameter snapshot) can be baked
+into the features as properties. Encoded tiles are kept in a small in-process
+LRU cache.
+"""
+import os
+import math
+import struct
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple, Any
+
+import numpy as np
+from shapely import clip_by_rect, transform
+from shapely.geometry import shape
+from shapely.geometry.polygon import orient
+
+from app.kharda.panels import get_panel_registry
+from app.kharda.spatial import get_panel_spatial_index
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_TILE_ZOOM = 24
+PANEL_LAYER_NAME = "panels"
+TILE_CACHE_MAX_ENTRIES = int(os.getenv("TILE_CACHE_MAX_ENTRIES", 4096))
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+GEOM_POLYGON = 3
+
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+CMD_CLOSE_PATH = 7
+
+
+# ---------------------------------------------------------------------------
+# Minimal protobuf writer for the vector_tile.proto messages
+# ---------------------------------------------------------------------------
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        to_write = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(to_write | 0x80)
+        else:
+            out.append(to_write)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _len_field(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(field: int, value: int) -> bytes:
+    return _key(field, 0) + _varint(value)
+
+
+def _packed_field(field: int, values: List[int]) -> bytes:
+    return _len_field(field, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _uint_field(5, value)
+        return _uint_field(6, _zigzag(value))
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack('<d', value)
+    return _len_field(1, str(value).encode('utf-8'))
+
+
+# ---------------------------------------------------------------------------
+# Geometry
+# ---------------------------------------------------------------------------
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of an XYZ tile."""
+    n = 2 ** z
+
+    def lon(tx):
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return lon(x), lat(y + 1), lon(x + 1), lat(y)
+
+
+def _tile_projector(z: int, x: int, y: int):
+    size = TILE_EXTENT * (2 ** z)
+    offset_x = x * TILE_EXTENT
+    offset_y = y * TILE_EXTENT
+
+    def project(coords):
+        projected = np.empty_like(coords)
+        sin_lat = np.sin(np.radians(coords[:, 1]))
+        projected[:, 0] = (coords[:, 0] + 180.0) / 360.0 * size - offset_x
+        projected[:, 1] = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * size - offset_y
+        return projected
+
+    return project
+
+
+def _ring_commands(coords, cursor: List[int], closed: bool) -> List[int]:
+    points = [(int(round(px)), int(round(py))) for px, py in coords]
+    if closed and len(points) > 1 and points[0] == points[-1]:
+        points = points[:-1]
+    deduped = []
+    for point in points:
+        if not deduped or point != deduped[-1]:
+            deduped.append(point)
+    if len(deduped) < (3 if closed else 2):
+        return []
+
+    commands = []
+    cx, cy = cursor
+    first_x, first_y = deduped[0]
+    commands.append((CMD_MOVE_TO & 0x7) | (1 << 3))
+    commands.extend([_zigzag(first_x - cx), _zigzag(first_y - cy)])
+    cx, cy = first_x, first_y
+    commands.append((CMD_LINE_TO & 0x7) | ((len(deduped) - 1) << 3))
+    for px, py in deduped[1:]:
+        commands.extend([_zigzag(px - cx), _zigzag(py - cy)])
+        cx, cy = px, py
+    if closed:
+        commands.append((CMD_CLOSE_PATH & 0x7) | (1 << 3))
+    cursor[0], cursor[1] = cx, cy
+    return commands
+
+
+def _geometry_commands(geometry) -> Tuple[Optional[int], List[int]]:
+    cursor = [0, 0]
+    commands: List[int] = []
+    geom_type = geometry.geom_type
+    if geom_type in ('Polygon', 'MultiPolygon'):
+        polygons = [geometry] if geom_type == 'Polygon' else list(geometry.geoms)
+        for polygon in polygons:
+            if polygon.is_empty:
+                continue
+            # MVT (y down): exterior rings have positive shoelace area, holes negative
+            polygon = orient(polygon, sign=1.0)
+            exterior = _ring_commands(polygon.exterior.coords, cursor, True)
+            if not exterior:
+                continue
+            commands.extend(exterior)
+            for interior in polygon.interiors:
+                commands.extend(_ring_commands(interior.coords, cursor, True))
+        return GEOM_POLYGON, commands
+    if geom_type in ('LineString', 'MultiLineString'):
+        lines = [geometry] if geom_type == 'LineString' else list(geometry.geoms)
+        for line in lines:
+            if not line.is_empty:
+                commands.extend(_ring_commands(line.coords, cursor, False))
+        return GEOM_LINESTRING, commands
+    if geom_type == 'GeometryCollection':
+        # clip_by_rect can yield mixed collections; keep the polygonal parts
+        polygons = [g for g in geometry.geoms if g.geom_type in ('Polygon', 'MultiPolygon')]
+        for polygon in polygons:
+            _, part = _geometry_commands(polygon)
+            commands.extend(part)
+        return GEOM_POLYGON, commands
+    return None, []
+
+
+# ---------------------------------------------------------------------------
+# Tile assembly
+# ---------------------------------------------------------------------------
+
+class _LayerBuilder:
+    def __init__(self, name: str):
+        self.name = name
+        self.features: List[bytes] = []
+        self.keys: Dict[str, int] = {}
+        self.values: Dict[Tuple[type, Any], int] = {}
+
+    def _tag(self, key: str, value: Any) -> Tuple[int, int]:
+        key_index = self.keys.setdefault(key, len(self.keys))
+        value_index = self.values.setdefault((type(value), value), len(self.values))
+        return key_index, value_index
+
+    def add_feature(self, feature_id: int, geom_type: int, commands: List[int], properties: Dict[str, Any]):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.extend(self._tag(key, value))
+        payload = b''
+        if isinstance(feature_id, int) and feature_id >= 0:
+            payload += _uint_field(1, feature_id)
+        if tags:
+            payload += _packed_field(2, tags)
+        payload += _uint_field(3, geom_type)
+        payload += _packed_field(4, commands)
+        self.features.append(payload)
+
+    def encode(self) -> bytes:
+        payload = _uint_field(15, 2) + _len_field(1, self.name.encode('utf-8'))
+        for feature in self.features:
+            payload += _len_field(2, feature)
+        for key in self.keys:
+            payload += _len_field(3, key.encode('utf-8'))
+        for (_, value) in self.values:
+            payload += _len_field(4, _encode_value(value))
+        payload += _uint_field(5, TILE_EXTENT)
+        return payload
+
+
+def build_panel_tile(z: int, x: int, y: int, value_map: Optional[Dict[str, Dict]] = None,
+                     value_fields: Tuple[str, ...] = ('value',)) -> bytes:
+    """
+    Encode the panels intersecting tile z/x/y. `value_map` is keyed by the
+    panel id string (the snapshot `values` layout) and each entry's
+    `value_fields` are copied into the feature properties.
+    """
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+    # Pad the lookup by the clip buffer so features on tile edges join cleanly
+    pad_lon = (max_lon - min_lon) * TILE_BUFFER / TILE_EXTENT
+    pad_lat = (max_lat - min_lat) * TILE_BUFFER / TILE_EXTENT
+    panel_ids = get_panel_spatial_index().query_bbox(
+        min_lon - pad_lon, min_lat - pad_lat, max_lon + pad_lon, max_lat + pad_lat
+    )
+    if not panel_ids:
+        return b''
+
+    registry = get_panel_registry()
+    project = _tile_projector(z, x, y)
+    layer = _LayerBuilder(PANEL_LAYER_NAME)
+    for panel_id in panel_ids:
+        record = registry.get(panel_id)
+        if record is None or not record.valid:
+            continue
+        try:
+            tile_geom = transform(shape(record.geometry), project)
+            clipped = clip_by_rect(tile_geom, -TILE_BUFFER, -TILE_BUFFER,
+                                   TILE_EXTENT + TILE_BUFFER, TILE_EXTENT + TILE_BUFFER)
+        except Exception as e:
+            print(f"[WARN] Could not clip panel {panel_id} to tile {z}/{x}/{y}: {e}")
+            continue
+        if clipped.is_empty:
+            continue
+        geom_type, commands = _geometry_commands(clipped)
+        if geom_type is None or not commands:
+            continue
+
+        properties: Dict[str, Any] = {'panel_id': panel_id}
+        entry = (value_map or {}).get(str(panel_id))
+        if entry:
+            for field in value_fields:
+                if entry.get(field) is not None:
+                    properties[field] = entry[field]
+        layer.add_feature(panel_id, geom_type, commands, properties)
+
+    if not layer.features:
+        return b''
+    return _len_field(3, layer.encode())
+
+
+class TileCache:
+    """Thread-safe LRU of encoded tiles."""
+
+    def __init__(self, max_entries: int = TILE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: Tuple, data: bytes):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+panel_tile_cache = TileCache()
@@ -7,7 +7,11 @@ import ee
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.common.gee import init_gee
-from app.kharda.routes import router as kharda_router
+from app.kharda.routes import router as kharda_router, prewarm_scheduler
+from app.kharda.database import init_database, close_db_connections
+from app.kharda import db_async
+from app.kharda.ingest import shutdown_ingest
+from app.kharda.snapshot_store import start_snapshot_sweeper, stop_snapshot_sweeper
 
 
 def init_solar_gee():
@@ -75,6 +79,37 @@ if solar_backend_dir.exists():
         print(f"Warning: Failed to load solar backend routes: {e}")
 
 
+@app.on_event("startup")
+def startup_db():
+    # Creates missing tables and upgrades older layouts in place
+    try:
+        init_database()
+    except Exception as e:
+        print(f"[WARN] Database initialization failed: {e}")
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # Expires and size-bounds panel_snapshots/ periodically
+    start_snapshot_sweeper()
+    # Keeps the common dashboard windows computed ahead of their expiry
+    prewarm_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    prewarm_scheduler.stop()
+    stop_snapshot_sweeper()
+
+
+@app.on_event("shutdown")
+def shutdown_db():
+    # Commit queued write-backs before the connections go away
+    shutdown_ingest()
+    db_async.shutdown()
+    close_db_connections()
+
+
 @app.get("/")
 def read_root():
     return {"message": "Kharda Solar Farm Backend API is running"}
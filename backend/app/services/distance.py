@@ -5,8 +5,15 @@ from shapely.geometry import shape, LineString
 from shapely.ops import nearest_points
 from app.solar.constants import OVERPASS_ENDPOINTS
 from app.utils.geo_helpers import get_centroid, get_nearest_distance, haversine_distance
+from app.common.singleflight import SingleFlight
+
+# Concurrent identical Overpass queries share one request
+overpass_flights = SingleFlight("overpass")
 
 async def make_overpass_request(query: str, max_retries: int = 3):
+    return await overpass_flights.do((query, max_retries), _make_overpass_request, query, max_retries)
+
+async def _make_overpass_request(query: str, max_retries: int = 3):
     """
     Mirrors the Node.js makeOverpassRequest behavior:
     - Tries multiple Overpass endpoints
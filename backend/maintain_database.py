@@ -0,0 +1,79 @@
+"""
+Periodic maintenance for the time-series store.
+
+1. Retention: raw yearly partitions that ended more than --retention-days ago
+   (TIMESERIES_RAW_RETENTION_DAYS, default 730) are compacted into weekly
+   aggregates and dropped.
+2. Vacuum: the pages freed by dropped partitions are returned to the
+   filesystem with an incremental vacuum, which leaves the live (hot)
+   partitions untouched. --full runs a complete VACUUM instead, which is
+   needed once for databases created before incremental auto-vacuum.
+
+Usage (from backend/):
+    python maintain_database.py [--retention-days N] [--dry-run] [--full]
+"""
+import os
+import sys
+import argparse
+from datetime import date
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.kharda.database import (
+    DB_PATH, TIMESERIES_RAW_RETENTION_DAYS, EPOCH_ORDINAL, get_db, init_database,
+    list_partitions, partition_days, compact_timeseries, reclaim_space
+)
+
+
+def file_size(path: Path) -> int:
+    return sum(
+        os.path.getsize(p) for p in (path, Path(f"{path}-wal"))
+        if os.path.exists(p)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply the time-series retention policy and vacuum')
+    parser.add_argument('--retention-days', type=int, default=TIMESERIES_RAW_RETENTION_DAYS,
+                        help=f'Keep raw rows for years ending within this many days (default {TIMESERIES_RAW_RETENTION_DAYS})')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the partitions that would be compacted')
+    parser.add_argument('--full', action='store_true', help='Run a full VACUUM instead of an incremental one')
+    args = parser.parse_args()
+
+    if not Path(DB_PATH).exists():
+        print(f"ERROR: Database file not found at {DB_PATH}")
+        return 1
+
+    init_database()
+    size_before = file_size(Path(DB_PATH))
+
+    cutoff = date.today().toordinal() - EPOCH_ORDINAL - args.retention_days
+    with get_db() as conn:
+        partitions = list_partitions(conn)
+    for year, compacted in partitions:
+        if compacted:
+            state = "weekly aggregates"
+        elif partition_days(year)[1] < cutoff:
+            state = "raw, past retention"
+        else:
+            state = "raw"
+        print(f"  {year}: {state}")
+
+    if args.dry_run:
+        return 0
+
+    compacted_years = compact_timeseries(args.retention_days)
+    print(f"Compacted {len(compacted_years)} partition(s)")
+
+    print("Running VACUUM..." if args.full else "Running incremental vacuum...")
+    reclaim_space(full=args.full)
+
+    size_after = file_size(Path(DB_PATH))
+    print(f"Database size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
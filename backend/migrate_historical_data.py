@@ -4,7 +4,6 @@ This script fetches data from Google Earth Engine and stores it in the database.
 """
 import os
 import sys
-import json
 import asyncio
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -14,8 +13,7 @@ import time
 sys.path.insert(0, str(Path(__file__).parent))
 
 from app.kharda.database import (
-    init_database, insert_timeseries_data, insert_soiling_data,
-    insert_monthly_lst, update_data_availability, get_data_statistics
+    init_database, insert_monthly_lst, get_data_statistics
 )
 
 from app.kharda.services import (
@@ -24,29 +22,29 @@ from app.kharda.services import (
     get_lst_monthly
 )
 
+from app.kharda.panels import get_panel_registry
+from app.kharda.ingest import get_ingest_queue, shutdown_ingest
 from app.common.gee import init_gee
 
 # Initialize Earth Engine
 init_gee()
 
 # Constants
-POLYGONS_PATH = Path(__file__).parent.parent / "asset" / "solar_panel_polygons.geojson"
 PARAMETERS = ['LST', 'SWIR', 'NDVI', 'NDWI', 'VISIBLE', 'SOILING']
+# parameter -> (GEE fetcher, unit used when a row carries none)
+TIMESERIES_FETCHERS = {
+    'LST': (get_lst_data, '°C'),
+    'SWIR': (get_swir_data, 'reflectance'),
+    'NDVI': (get_ndvi_data, ''),
+    'NDWI': (get_ndwi_data, ''),
+    'VISIBLE': (get_visible_mean_data, 'reflectance'),
+}
 
 
 def load_panel_ids():
     """Load all panel IDs from the GeoJSON file."""
     try:
-        with open(POLYGONS_PATH, 'r') as f:
-            geojson_data = json.load(f)
-        
-        panel_ids = []
-        for feature in geojson_data.get('features', []):
-            panel_id = feature.get('properties', {}).get('panel_id')
-            if panel_id is not None:
-                panel_ids.append(panel_id)
-        
-        return sorted(panel_ids)
+        return sorted(get_panel_registry().panel_ids())
     except Exception as e:
         print(f"Error loading panel IDs: {e}")
         return []
@@ -55,91 +53,29 @@ def load_panel_ids():
 async def migrate_panel_parameter(panel_id: int, parameter: str, start_date: str, end_date: str):
     """Migrate data for a single panel and parameter."""
     try:
-        # Load polygons to get the geometry
-        with open(POLYGONS_PATH, 'r') as f:
-            geojson_data = json.load(f)
-        
-        # Find the polygon for this panel
-        target_polygon = None
-        for feature in geojson_data.get('features', []):
-            if feature.get('properties', {}).get('panel_id') == panel_id:
-                target_polygon = feature
-                break
-        
-        if not target_polygon:
+        # Find the polygon for this panel in the in-memory registry
+        record = get_panel_registry().get(panel_id)
+        if not record:
             print(f"Panel {panel_id} not found in polygons")
             return False
         
-        # Convert to EE geometry
-        import ee
-        coords = target_polygon['geometry']['coordinates'][0]
-        ee_polygon = ee.Geometry.Polygon(coords)
+        # Reuse the cached EE geometry
+        ee_polygon = record.ee_geometry
         
         # Fetch data based on parameter
-        if parameter == 'LST':
-            data = await get_lst_data(ee_polygon, start_date, end_date)
-            if data and data.get('timeseries'):
-                count = 0
-                for entry in data['timeseries']:
-                    insert_timeseries_data(
-                        panel_id, parameter, entry['date'], 
-                        entry['value'], entry.get('unit', '°C')
-                    )
-                    count += 1
-                update_data_availability(panel_id, parameter, start_date, end_date, count)
-                return True
-        
-        elif parameter == 'SWIR':
-            data = await get_swir_data(ee_polygon, start_date, end_date)
+        if parameter in TIMESERIES_FETCHERS:
+            fetcher, default_unit = TIMESERIES_FETCHERS[parameter]
+            data = await fetcher(ee_polygon, start_date, end_date)
             if data and data.get('timeseries'):
-                count = 0
-                for entry in data['timeseries']:
-                    insert_timeseries_data(
-                        panel_id, parameter, entry['date'],
-                        entry['value'], entry.get('unit', 'reflectance')
-                    )
-                    count += 1
-                update_data_availability(panel_id, parameter, start_date, end_date, count)
-                return True
-        
-        elif parameter == 'NDVI':
-            data = await get_ndvi_data(ee_polygon, start_date, end_date)
-            if data and data.get('timeseries'):
-                count = 0
-                for entry in data['timeseries']:
-                    insert_timeseries_data(
-                        panel_id, parameter, entry['date'],
-                        entry['value'], entry.get('unit', '')
-                    )
-                    count += 1
-                update_data_availability(panel_id, parameter, start_date, end_date, count)
-                return True
-        
-        elif parameter == 'NDWI':
-            data = await get_ndwi_data(ee_polygon, start_date, end_date)
-            if data and data.get('timeseries'):
-                count = 0
-                for entry in data['timeseries']:
-                    insert_timeseries_data(
-                        panel_id, parameter, entry['date'],
-                        entry['value'], entry.get('unit', '')
-                    )
-                    count += 1
-                update_data_availability(panel_id, parameter, start_date, end_date, count)
-                return True
-        
-        elif parameter == 'VISIBLE':
-            data = await get_visible_mean_data(ee_polygon, start_date, end_date)
-            if data and data.get('timeseries'):
-                count = 0
-                for entry in data['timeseries']:
-                    insert_timeseries_data(
-                        panel_id, parameter, entry['date'],
-                        entry['value'], entry.get('unit', 'reflectance')
-                    )
-                    count += 1
-                update_data_availability(panel_id, parameter, start_date, end_date, count)
-                return True
+                rows = [
+                    (panel_id, parameter, entry['date'], entry['value'], entry.get('unit', default_unit))
+                    for entry in data['timeseries']
+                ]
+                # Written by the ingest writer while the next panel is fetched
+                return await get_ingest_queue().submit(
+                    timeseries=rows,
+                    availability=[(panel_id, parameter, start_date, end_date, len(rows))],
+                )
         
         elif parameter == 'SOILING':
             # Soiling is calculated per year, so we need to process year by year
@@ -147,7 +83,7 @@ async def migrate_panel_parameter(panel_id: int, parameter: str, start_date: str
             end_dt = datetime.strptime(end_date, '%Y-%m-%d')
             
             current_year = start_dt.year
-            count = 0
+            rows = []
             while current_year <= end_dt.year:
                 year_start = f"{current_year}-01-01"
                 year_end = f"{current_year}-12-31"
@@ -155,22 +91,24 @@ async def migrate_panel_parameter(panel_id: int, parameter: str, start_date: str
                 # Soiling uses baseline from Q1 and current from Q2+
                 data = await get_soiling_data(ee_polygon, year_start, year_end)
                 if data and data.get('soiling_drop_percent') is not None:
-                    insert_soiling_data(
+                    rows.append((
                         panel_id, year_end,
                         data.get('baseline_si', 0),
                         data.get('current_si', 0),
                         data.get('soiling_drop_percent', 0),
                         data.get('status', 'clean')
-                    )
-                    count += 1
+                    ))
                 
                 current_year += 1
                 # Small delay to avoid rate limiting
                 await asyncio.sleep(0.5)
             
-            if count > 0:
-                update_data_availability(panel_id, parameter, start_date, end_date, count)
-                return True
+            # All years are written in one transaction
+            if rows:
+                return await get_ingest_queue().submit(
+                    soiling=rows,
+                    availability=[(panel_id, parameter, start_date, end_date, len(rows))],
+                )
             return False
         
         return False
@@ -277,6 +215,9 @@ async def migrate_all_data(years: int = 5, sample_panels: int = None):
             print(f"   Waiting {delay_between_batches} seconds before next batch...")
             await asyncio.sleep(delay_between_batches)
     
+    # Wait for the queued writes before reporting
+    shutdown_ingest(timeout=None)
+
     # Print summary
     print("\n" + "=" * 60)
     print("Migration Complete!")
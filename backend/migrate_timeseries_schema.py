@@ -0,0 +1,65 @@
+"""
+Convert an existing database to the compact time-series layout in place.
+
+Moves panel_timeseries rows (or an unpartitioned `timeseries` table) into the
+yearly WITHOUT ROWID timeseries_<year> partitions (parameter codes, integer
+days, units stored once per parameter), replaces panel_timeseries with a
+compatibility view and VACUUMs the file to return the freed pages. init_database() performs the same conversion automatically; this
+script is for running it (and the VACUUM) explicitly, e.g. before deploying.
+
+Usage (from backend/):
+    python migrate_timeseries_schema.py [--no-vacuum]
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add backend directory to path so we can import app modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.kharda.database import (
+    DB_PATH, get_db, init_database, migrate_timeseries_schema, reclaim_space
+)
+
+
+def file_size(path: Path) -> int:
+    return sum(
+        os.path.getsize(p) for p in (path, Path(f"{path}-wal"))
+        if os.path.exists(p)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert panel_timeseries to the compact layout')
+    parser.add_argument('--no-vacuum', action='store_true', help='Skip VACUUM after migrating')
+    args = parser.parse_args()
+
+    if not Path(DB_PATH).exists():
+        print(f"ERROR: Database file not found at {DB_PATH}")
+        return 1
+
+    size_before = file_size(Path(DB_PATH))
+    started = time.time()
+    with get_db() as conn:
+        moved = migrate_timeseries_schema(conn.cursor())
+    # Create any tables added since the database was built
+    init_database()
+
+    if moved == 0:
+        print("Database already uses the compact time-series layout.")
+    else:
+        print(f"Moved {moved:,} rows in {time.time() - started:.1f}s")
+
+    if not args.no_vacuum:
+        print("Running VACUUM...")
+        reclaim_space(full=True)
+
+    size_after = file_size(Path(DB_PATH))
+    print(f"Database size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Tests import the backend as `app.*`, as uvicorn does when run from backend/
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """A fresh database in tmp_path, used by every app.kharda.database call in the test."""
+    from app.kharda import database
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "test.db")
+    database.init_database()
+    yield database
+    database.close_db_connections()
@@ -0,0 +1,50 @@
+import pytest
+
+from app.kharda.database import missing_ranges
+
+JAN = ('2024-01-01', '2024-02-01')
+
+
+@pytest.mark.parametrize('intervals, expected', [
+    # Empty coverage: the whole range is missing
+    ([], [JAN]),
+    # Fully covered, exactly and by a wider interval
+    ([JAN], []),
+    ([('2023-12-01', '2024-03-01')], []),
+    # Gap at the start
+    ([('2024-01-10', '2024-02-01')], [('2024-01-01', '2024-01-10')]),
+    # Gap at the end
+    ([('2024-01-01', '2024-01-20')], [('2024-01-20', '2024-02-01')]),
+    # Gap in the middle
+    ([('2024-01-01', '2024-01-10'), ('2024-01-15', '2024-02-01')], [('2024-01-10', '2024-01-15')]),
+    # Gaps at both ends and in the middle
+    ([('2024-01-05', '2024-01-10'), ('2024-01-15', '2024-01-20')],
+     [('2024-01-01', '2024-01-05'), ('2024-01-10', '2024-01-15'), ('2024-01-20', '2024-02-01')]),
+    # Adjacent intervals leave no gap (end is exclusive)
+    ([('2024-01-01', '2024-01-15'), ('2024-01-15', '2024-02-01')], []),
+    # Intervals entirely outside the range are ignored
+    ([('2023-11-01', '2023-12-01'), ('2024-03-01', '2024-04-01')], [JAN]),
+])
+def test_missing_ranges(intervals, expected):
+    assert missing_ranges(intervals, *JAN) == expected
+
+
+def test_add_coverage_merges_overlapping_and_adjacent_intervals(temp_db):
+    temp_db.add_coverage([1, 2], 'LST', '2024-01-01', '2024-01-10')
+    temp_db.add_coverage([1], 'LST', '2024-01-10', '2024-01-20')  # adjacent
+    temp_db.add_coverage([1], 'LST', '2024-01-15', '2024-02-01')  # overlapping
+    temp_db.add_coverage([2], 'LST', '2024-01-15', '2024-01-20')  # disjoint
+    temp_db.add_coverage([1], 'NDVI', '2024-01-01', '2024-01-05')
+
+    coverage = temp_db.get_coverage_bulk([1, 2, 3], 'LST')
+
+    assert coverage == {
+        1: [('2024-01-01', '2024-02-01')],
+        2: [('2024-01-01', '2024-01-10'), ('2024-01-15', '2024-01-20')],
+    }
+    assert missing_ranges(coverage[2], *JAN) == [('2024-01-10', '2024-01-15'), ('2024-01-20', '2024-02-01')]
+
+
+def test_empty_interval_is_not_recorded(temp_db):
+    temp_db.add_coverage([1], 'LST', '2024-01-10', '2024-01-10')
+    assert temp_db.get_coverage_bulk([1], 'LST') == {}
@@ -0,0 +1,19 @@
+from datetime import date
+
+from app.kharda import export
+
+
+def test_compacted_years_are_exported_as_weekly_means(temp_db):
+    temp_db.upsert_timeseries_rows([
+        (1, 'LST', '2020-03-02', 10.0, '°C'),
+        (1, 'LST', '2020-03-04', 20.0, '°C'),
+        (1, 'LST', '2024-03-02', 30.0, '°C'),
+    ])
+    temp_db.compact_timeseries(365, today=date(2024, 6, 1))
+
+    rows = [row for chunk in export.iter_export_chunks('timeseries') for row in chunk]
+
+    assert rows == [
+        (1, 'LST', '2020-03-02', 15.0, '°C', 'week'),
+        (1, 'LST', '2024-03-02', 30.0, '°C', 'day'),
+    ]
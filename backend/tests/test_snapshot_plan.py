@@ -0,0 +1,137 @@
+import pytest
+
+from app.kharda import routes
+
+START, END = '2024-03-01', '2024-04-01'
+# Stored series and snapshot composites are both reflectance (~0.1)
+STORED_SWIR = 0.12
+GEE_SWIR = 0.11
+
+
+class FakeFeatures:
+    """Stands in for a panel ee.FeatureCollection: the panel ids it holds."""
+
+    def __init__(self, ids):
+        self.ids = list(ids)
+
+    def geometry(self):
+        return self
+
+
+class FakeSeries:
+    """Stands in for a stored-series ee.ImageCollection whose composites are `value` everywhere."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def size(self):
+        return self
+
+    def getInfo(self):
+        return 1
+
+    def mean(self):
+        return self
+
+    def median(self):
+        return self
+
+    def rename(self, name):
+        return self
+
+
+@pytest.fixture
+def panel_ids():
+    return [record.panel_id for record in routes.get_panel_registry().records() if record.valid]
+
+
+@pytest.fixture
+def fake_gee(monkeypatch, panel_ids):
+    """The SWIR stored-series definition on GEE, returning GEE_SWIR; records the panel ids reduced."""
+    calls = []
+
+    def reduce_image(image, polygons_fc, scale, band_names=None):
+        calls.append(polygons_fc.ids)
+        return [{'properties': {'panel_id': pid, band_names[0]: image.value}} for pid in polygons_fc.ids]
+
+    monkeypatch.setitem(routes.TIMESERIES_SOURCES, 'SWIR', (lambda geometry, start, end: FakeSeries(GEE_SWIR), 10, 'reflectance'))
+    monkeypatch.setattr(routes, 'reduce_image_to_panels', reduce_image)
+    monkeypatch.setattr(routes, 'load_panel_feature_collection', lambda level=routes.LEVEL_PANEL: (FakeFeatures(panel_ids), panel_ids))
+    monkeypatch.setattr(routes, 'panel_subset_feature_collection', FakeFeatures)
+    return calls
+
+
+@pytest.fixture
+def fake_s2(monkeypatch):
+    """aggregate_s2_snapshots through the single-parameter aggregators; records its parameters and panel ids."""
+    calls = []
+
+    def aggregate_s2(parameters, polygons_fc, start_date, end_date):
+        calls.append((sorted(parameters), polygons_fc.ids))
+        return {parameter: routes.PARAMETER_AGGREGATORS[parameter](polygons_fc, start_date, end_date) for parameter in parameters}
+
+    monkeypatch.setattr(routes, 'aggregate_s2_snapshots', aggregate_s2)
+    return calls
+
+
+def store_swir(database, ids, value):
+    database.upsert_timeseries_rows([
+        (pid, 'SWIR', day, value, 'reflectance') for pid in ids for day in ('2024-03-05', '2024-03-20')
+    ])
+    database.add_coverage(ids, 'SWIR', START, END)
+
+
+def test_stored_sentinel2_series_have_db_reducers():
+    assert set(routes.SNAPSHOT_DB_REDUCERS) == {'SWIR', 'NDWI', 'VISIBLE'}
+    assert set(routes.SNAPSHOT_DB_REDUCERS) <= set(routes.TIMESERIES_SOURCES)
+
+
+def test_covered_panels_come_from_db_on_the_aggregator_scale(temp_db, fake_gee, panel_ids):
+    covered = panel_ids[:-3]
+    store_swir(temp_db, covered, STORED_SWIR)
+
+    payload = routes.compute_parameter_snapshot('SWIR', START, END)
+
+    assert payload['sources'] == {'database': len(covered), 'gee': 3}
+    assert fake_gee == [panel_ids[-3:]]
+    assert {entry['value'] for entry in payload['values'].values()} == {STORED_SWIR, GEE_SWIR}
+    assert payload['values'][str(panel_ids[-1])]['value'] == GEE_SWIR
+    assert payload['value_count'] == len(panel_ids)
+
+
+def test_uncovered_snapshot_reduces_every_panel_on_gee(temp_db, fake_gee, panel_ids):
+    payload = routes.compute_parameter_snapshot('SWIR', START, END)
+
+    assert payload['sources'] == {'database': 0, 'gee': len(panel_ids)}
+    assert fake_gee == [panel_ids]
+    assert {entry['value'] for entry in payload['values'].values()} == {GEE_SWIR}
+
+
+def test_multi_parameter_snapshot_merges_db_and_gee_on_one_scale(temp_db, fake_gee, fake_s2, panel_ids, monkeypatch):
+    covered = panel_ids[:-3]
+    store_swir(temp_db, covered, STORED_SWIR)
+    monkeypatch.setitem(routes.PARAMETER_AGGREGATORS, 'LST', lambda fc, start, end: {'1': {'value': 30.0, 'unit': '°C'}})
+    planned = []
+    plan = routes.plan_parameter_snapshot
+    monkeypatch.setattr(routes, 'plan_parameter_snapshot', lambda parameter, *args: planned.append(parameter) or plan(parameter, *args))
+
+    payloads = routes.compute_parameter_snapshots(['SWIR', 'LST'], START, END)
+
+    assert sorted(planned) == ['LST', 'SWIR']
+    assert fake_s2 == [(['SWIR'], panel_ids[-3:])]
+    swir = payloads['SWIR']
+    assert swir['sources'] == {'database': len(covered), 'gee': 3}
+    assert {entry['value'] for entry in swir['values'].values()} == {STORED_SWIR, GEE_SWIR}
+    assert swir['value_count'] == len(panel_ids)
+    assert payloads['LST']['value_count'] == 1
+
+
+def test_multi_parameter_snapshot_skips_gee_for_fully_covered_parameters(temp_db, fake_gee, fake_s2, panel_ids):
+    store_swir(temp_db, panel_ids, STORED_SWIR)
+
+    payloads = routes.compute_parameter_snapshots(['SWIR'], START, END)
+
+    assert fake_s2 == []
+    assert fake_gee == []
+    assert payloads['SWIR']['sources'] == {'database': len(panel_ids), 'gee': 0}
+    assert {entry['value'] for entry in payloads['SWIR']['values'].values()} == {STORED_SWIR}
@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from app.kharda import routes
+from app.kharda.snapshot_cache import SnapshotEntry, snapshot_memory_cache
+from app.kharda.snapshot_store import SnapshotStore
+
+START, END = '2024-03-01', '2024-04-01'
+KEY = routes.build_snapshot_cache_key('SWIR', START, END)
+
+
+def make_entry(value, age):
+    return SnapshotEntry(('{"value":%d}' % value).encode(), 'then', time.time() - age, 60)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SnapshotStore(tmp_path)
+    monkeypatch.setattr(routes, 'get_snapshot_store', lambda: store)
+    yield store
+    snapshot_memory_cache.discard(KEY)
+
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(routes, 'schedule_snapshot_refresh', lambda *args: scheduled.append(args))
+    return scheduled
+
+
+def test_stale_memory_entry_is_replaced_by_a_fresh_stored_one(store, refreshes):
+    snapshot_memory_cache.put(KEY, make_entry(1, age=120))
+    # Refreshed by another worker
+    store.put(KEY, make_entry(2, age=0))
+
+    entry = asyncio.run(routes.resolve_parameter_snapshot_shared('SWIR', START, END))
+
+    assert entry.body == b'{"value":2}'
+    assert refreshes == []
+    assert snapshot_memory_cache.get(KEY).body == b'{"value":2}'
+
+
+def test_stale_entry_is_served_and_refreshed_when_the_store_has_nothing_fresh(store, refreshes):
+    snapshot_memory_cache.put(KEY, make_entry(1, age=120))
+
+    entry = asyncio.run(routes.resolve_parameter_snapshot_shared('SWIR', START, END))
+
+    assert entry.body == b'{"value":1}'
+    assert refreshes == [('SWIR', START, END, routes.LEVEL_PANEL)]
+
+
+def test_all_panels_lst_is_shared_through_the_store(store, monkeypatch):
+    key = routes.all_panels_lst_cache_key(START, END)
+
+    async def panel_means(parameter, start_date, end_date):
+        return {1: (2, 60.0), 2: (1, 32.0)}
+
+    monkeypatch.setattr(routes.db_async, 'get_panel_means', panel_means)
+    entry = asyncio.run(routes.refresh_all_panels_lst(START, END))
+    # A worker that has not computed it yet sees the stored copy
+    snapshot_memory_cache.discard(key)
+
+    assert asyncio.run(routes.snapshot_expires_at(key)) == entry.expires_at
+    assert store.get(key).payload()['panel_lst'] == {'1': 30.0, '2': 32.0}
+    snapshot_memory_cache.discard(key)
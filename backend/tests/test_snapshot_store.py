@@ -0,0 +1,38 @@
+import os
+import time
+
+from app.kharda.snapshot_cache import SnapshotEntry
+from app.kharda.snapshot_store import SnapshotStore, TMP_MAX_AGE_S
+
+
+def make_entry(value):
+    return SnapshotEntry(('{"value":%d}' % value).encode(), 'now', time.time(), 3600)
+
+
+def test_sweep_keeps_files_whose_index_row_is_not_committed_yet(tmp_path):
+    store = SnapshotStore(tmp_path)
+    store.put('kept', make_entry(1))
+    # put() renames the file into place before inserting its index row
+    (tmp_path / 'pending.json.gz').write_bytes(b'')
+    stale = tmp_path / 'legacy.json'
+    stale.write_text('{}')
+    old = time.time() - TMP_MAX_AGE_S - 1
+    os.utime(stale, (old, old))
+
+    assert store.sweep() == {'expired': 0, 'orphans': 1}
+    assert (tmp_path / 'pending.json.gz').exists()
+    assert not stale.exists()
+    assert store.get('kept').body == b'{"value":1}'
+
+
+def test_put_evicts_least_recently_used_over_budget(tmp_path):
+    store = SnapshotStore(tmp_path, max_bytes=80)
+    store.put('a', make_entry(1))
+    time.sleep(0.01)
+    store.put('b', make_entry(2))
+    time.sleep(0.01)
+    store.put('c', make_entry(3))
+
+    assert store.get('a') is None
+    assert store.get('c') is not None
+    assert store.status()['bytes'] <= 80